@@ -0,0 +1,58 @@
+"""
+运维管理API路由
+需在请求头 X-Admin-Token 中携带 settings.ADMIN_TOKEN
+"""
+import secrets
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.base import get_async_db
+from ..services.async_game_service import async_game_service
+from ..utils.logger import logger
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+def verify_admin_token(x_admin_token: str = Header(default="")):
+    """校验管理令牌，未配置令牌时接口不可用"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+
+@router.get("/leaderboard-index", dependencies=[Depends(verify_admin_token)])
+async def check_leaderboard_index(
+    repair: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    校验排行榜内存索引与数据库是否一致
+
+    - **repair**: 不一致时是否重新加载索引
+    """
+    report = await async_game_service.check_leaderboard_index(db, repair=repair)
+    if not report["consistent"]:
+        logger.warning("排行榜索引不一致: %s", report)
+    return report
+
+
+@router.get("/flagged-games", dependencies=[Depends(verify_admin_token)])
+async def get_flagged_games(
+    limit: int = 50,
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    异常扫描（python -m app.cli scan-anomalies）标记的记录
+
+    - **limit**: 返回记录数 (默认50，最大500)
+    - **before**: 只返回游戏ID小于该值的记录，用于翻页
+    """
+    if limit < 1 or limit > 500:
+        raise HTTPException(status_code=400, detail="limit必须在1-500之间")
+    return await async_game_service.get_flagged_games(db, limit, before)
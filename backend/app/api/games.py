@@ -1,23 +1,92 @@
 """
 游戏记录和排行榜API路由
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+from datetime import date, datetime, timezone
+from typing import Optional
 
-from ..database.base import get_db
+from operator import attrgetter
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.base import get_async_db
 from ..models.game import Game
-from ..schemas.game import GameCreate, GameUpdate, GameResponse, LeaderBoardEntry
-from ..services.game_service import game_service
+from ..schemas.game import (
+    GAME_RESPONSE_FIELDS, GameCreate, GameUpdate, GameResponse, LeaderBoardEntry,
+    GamePercentileResponse, GameRankResponse, LeaderBoardAroundResponse, ScoreDistributionResponse,
+)
+from ..services.async_game_service import async_game_service
+from ..services.game_service import encode_history_cursor
+from ..services.leaderboard_index import TRACKED_TOP_N
+from ..services.period_leaderboard import PERIODS, is_expired, local_date, period_bounds
+from ..services.replay_format import CONTENT_TYPE as REPLAY_CONTENT_TYPE
+from ..services.replay_store import iter_bytes, open_sqlite_blob, sqlite_file_path
+from ..services.replay_verifier import replay_verifier
+from ..services.response_cache import CachedResponse, response_cache
+from ..services.write_buffer import game_write_buffer
+from ..utils import json_codec
 from ..utils.logger import logger
 from . import websocket
 
 router = APIRouter(prefix="/api", tags=["games"])
 
+# 按 GameResponse 字段顺序取出索引记录的值；列表接口直接编码为 JSON，
+# response_model 仅用于生成 OpenAPI 文档
+_response_values = attrgetter(*GAME_RESPONSE_FIELDS)
+
+
+def _notification_payload(game) -> dict:
+    """构造WebSocket通知中的游戏记录"""
+    return {
+        "id": game.id,
+        "player_name": game.player_name,
+        "score": game.score,
+        "level": game.level,
+        "lines": game.lines,
+        "created_at": game.created_at.isoformat()
+    }
+
+
+# 由回放决定、需要校验的字段
+_SCORED_FIELDS = ("score", "lines", "level")
+
+
+async def _verify_replays(games: list[GameCreate]) -> None:
+    """按 REPLAY_VERIFICATION 重放校验提交的记录，任一记录不通过时返回 422"""
+    if settings.REPLAY_VERIFICATION == "off":
+        return
+    if settings.REPLAY_VERIFICATION == "required" and any(game.replay is None for game in games):
+        raise HTTPException(status_code=422, detail="缺少对局回放")
+
+    results = await asyncio.gather(
+        *(replay_verifier.verify(game) for game in games if game.replay is not None)
+    )
+    errors = [error for error in results if error]
+    if errors:
+        raise HTTPException(status_code=422, detail=f"回放校验失败: {errors[0]}")
+
+
+def _check_scored_update(game_data: GameUpdate) -> None:
+    """REPLAY_VERIFICATION=required 时分数、行数、等级只能来自校验过的回放，不允许直接修改"""
+    if settings.REPLAY_VERIFICATION != "required":
+        return
+    changed = [field for field in _SCORED_FIELDS if getattr(game_data, field) is not None]
+    if changed:
+        raise HTTPException(status_code=422, detail=f"回放校验开启时不能修改: {', '.join(changed)}")
+
+
+async def _tracked_top(db: AsyncSession) -> list:
+    """写入后的排行榜 Top N（读取内存索引），用于计算WebSocket增量推送"""
+    return await async_game_service.get_top_scores(db, limit=TRACKED_TOP_N)
+
 
 @router.post("/games", response_model=GameResponse, status_code=201)
 async def save_game(
     game: GameCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     保存游戏记录
@@ -27,41 +96,78 @@ async def save_game(
     - **level**: 等级 (1-20)
     - **lines**: 消除行数 (≥0)
     - **play_time**: 游戏时长(秒) (≥0)
+    - **replay**: 对局回放 {seed, actions}（可选），服务端重放后分数、消除行数或等级不一致时返回422
+
+    开启组提交（GROUP_COMMIT_ENABLED）时记录经写入缓冲与其他请求合并提交
     """
+    await _verify_replays([game])
     try:
-        saved_game = game_service.save_game_record(db, game)
+        if game_write_buffer.running:
+            saved_game = await game_write_buffer.submit(game)
+        else:
+            saved_game = await async_game_service.save_game_record(db, game)
 
         # 触发WebSocket实时通知(非阻塞)
         try:
-            await websocket.notify_leaderboard_update({
-                "id": saved_game.id,
-                "player_name": saved_game.player_name,
-                "score": saved_game.score,
-                "level": saved_game.level,
-                "lines": saved_game.lines,
-                "created_at": saved_game.created_at.isoformat()
-            })
+            await websocket.notify_leaderboard_update(
+                _notification_payload(saved_game), await _tracked_top(db), changed=[saved_game]
+            )
         except Exception as ws_error:
             # WebSocket失败不应影响游戏保存
-            logger.warning(f"WebSocket通知失败: {ws_error}")
+            logger.warning("WebSocket通知失败: %s", ws_error)
 
         return saved_game
     except Exception as e:
-        logger.error(f"保存游戏记录失败: {str(e)}", exc_info=True)
+        logger.error("保存游戏记录失败: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"保存失败: {str(e)}")
+
+
+@router.post("/games/batch", response_model=list[GameResponse], status_code=201)
+async def save_games_batch(
+    games: list[GameCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    批量保存游戏记录
+
+    - 请求体为游戏记录数组，每项字段同 POST /api/games
+    - 整批校验（含回放校验）通过后在同一事务中写入，任一记录无效则整批拒绝
+    - 写入完成后只推送一次排行榜更新
+    """
+    if not games or len(games) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"记录数必须在1-{settings.BATCH_MAX_SIZE}之间")
+
+    await _verify_replays(games)
+    try:
+        saved_games = await async_game_service.save_game_records(db, games)
+    except Exception as e:
+        logger.error("批量保存游戏记录失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"保存失败: {str(e)}")
 
+    try:
+        await websocket.notify_leaderboard_batch_update(
+            [_notification_payload(game) for game in saved_games], await _tracked_top(db),
+            changed=saved_games
+        )
+    except Exception as ws_error:
+        logger.warning("WebSocket通知失败: %s", ws_error)
+
+    return saved_games
+
 
 @router.get("/games", response_model=list[GameResponse])
 async def get_games(
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取游戏历史记录
 
     - **skip**: 跳过记录数 (默认0)
     - **limit**: 返回记录数 (默认20，最大100)
+    - **after**: 游标，取自上一页响应头 X-Next-Cursor，传入后按游标分页（不可与skip同时使用）
     """
     if skip < 0:
         raise HTTPException(status_code=400, detail="skip不能为负数")
@@ -69,96 +175,337 @@ async def get_games(
     if limit < 1 or limit > 100:
         raise HTTPException(status_code=400, detail="limit必须在1-100之间")
 
+    if after is not None and skip:
+        raise HTTPException(status_code=400, detail="after与skip不能同时使用")
+
     try:
-        games = game_service.get_game_history(db, skip=skip, limit=limit)
-        return games
+        games = await async_game_service.get_game_history(db, skip=skip, limit=limit, after=after)
+        headers = {"X-Next-Cursor": encode_history_cursor(games[-1])} if len(games) == limit else None
+        return Response(
+            content=json_codec.dumps_records(GAME_RESPONSE_FIELDS, games),
+            media_type="application/json",
+            headers=headers,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"获取游戏历史失败: {str(e)}", exc_info=True)
+        logger.error("获取游戏历史失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
+# 已结束周期的快照不再变化，允许客户端与代理长期缓存
+_FROZEN_CACHE_CONTROL = "public, max-age=86400, immutable"
+
+
+async def _check_period_date(db: AsyncSession, period: str, at: date) -> None:
+    """
+    at 须在最早一条记录所在的周期与今天之间
+
+    更早或将来的日期没有记录，也避免极端日期在周期边界计算中溢出
+    """
+    today = local_date(datetime.now(timezone.utc))
+    first = period_bounds(period, await async_game_service.get_first_game_day(db) or today)[0]
+    if not first <= at <= today:
+        raise HTTPException(status_code=400, detail=f"at必须在 {first} 至 {today} 之间")
+
+
+async def _period_leaderboard(
+    request: Request, db: AsyncSession, period: str, at: Optional[date], limit: int
+) -> Response:
+    """
+    日/周/月/赛季排行榜：进行中的周期读取汇总表，已结束的周期读取快照（进程内缓存）；
+    已结束但尚未冻结的周期按排行榜索引的写入版本缓存
+    """
+    day = at or local_date(datetime.now(timezone.utc))
+    start, end = period_bounds(period, day)
+    headers = {"X-Period-Start": start.isoformat(), "X-Period-End": end.isoformat()}
+
+    expired = is_expired(end)
+    if expired:
+        index = await async_game_service.get_leaderboard_index(db)
+        key = ("leaderboard", period, start, limit)
+        entry = response_cache.get(key, index.uid)
+        if entry is not None:
+            return response_cache.respond(request, entry, _FROZEN_CACHE_CONTROL, headers)
+        ended_key, ended_token = ("leaderboard_ended", period, start, limit), (index.uid, index.version)
+        entry = response_cache.get(ended_key, ended_token)
+        if entry is not None:
+            return response_cache.respond(request, entry, headers=headers)
+
+    board = await async_game_service.get_period_leaderboard(db, period, day, limit)
+    body = json_codec.dumps_bytes(board.entries)
+    etag = response_cache.content_etag(body)
+    if board.frozen:
+        entry = response_cache.put(key, index.uid, etag, body)
+        return response_cache.respond(request, entry, _FROZEN_CACHE_CONTROL, headers)
+    if expired:
+        entry = response_cache.put(ended_key, ended_token, etag, body)
+    else:
+        entry = CachedResponse(None, etag, body)
+    return response_cache.respond(request, entry, headers=headers)
+
+
 @router.get("/leaderboard", response_model=list[LeaderBoardEntry])
 async def get_leaderboard(
+    request: Request,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    period: Optional[str] = None,
+    at: Optional[date] = None,
+    distinct_players: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     获取排行榜 Top N
 
     - **limit**: 返回记录数 (默认10，最大50)
+    - **period**: 周期排行榜 day / week / month / season（默认为全部记录）
+    - **at**: 周期内的任意日期（默认今天，按 LEADERBOARD_TIMEZONE），用于查询已结束的周期；
+      不能早于最早一条记录所在的周期，也不能晚于今天
+    - **distinct_players**: 每名玩家只出现一次（各自的最高分记录，同分时先达到者靠前），不可与period同时使用
     - 按分数降序排列
+    - 响应带 ETag，携带 If-None-Match 且排行榜未变化时返回 304；
+      周期排行榜另带 X-Period-Start / X-Period-End（结束日期不含）
     """
-    if limit < 1 or limit > 50:
+    if limit < 1 or limit > TRACKED_TOP_N:
         raise HTTPException(status_code=400, detail="limit必须在1-50之间")
+    if period is not None and period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period必须是 {' / '.join(PERIODS)} 之一")
+    if at is not None and period is None:
+        raise HTTPException(status_code=400, detail="at需要与period同时使用")
+    if distinct_players and period is not None:
+        raise HTTPException(status_code=400, detail="distinct_players不能与period同时使用")
+    if at is not None:
+        await _check_period_date(db, period, at)
 
     try:
-        top_scores = game_service.get_top_scores(db, limit=limit)
-        return top_scores
+        if period is not None:
+            return await _period_leaderboard(request, db, period, at, limit)
+        if distinct_players:
+            body = json_codec.dumps_records(
+                GAME_RESPONSE_FIELDS, await async_game_service.get_top_players(db, limit=limit)
+            )
+            return response_cache.respond(request, CachedResponse(None, response_cache.content_etag(body), body))
+
+        index = await async_game_service.get_leaderboard_index(db)
+        version = index.top_version
+        key, token = ("leaderboard", limit), (index.uid, version)
+        entry = response_cache.get(key, token)
+        if entry is None:
+            body = json_codec.dumps_records(GAME_RESPONSE_FIELDS, map(_response_values, index.top(limit)))
+            # ETag 由内容派生，各 worker 对相同的排行榜返回相同的 ETag
+            entry = response_cache.put(key, token, response_cache.content_etag(body), body)
+        return response_cache.respond(request, entry)
     except Exception as e:
-        logger.error(f"获取排行榜失败: {str(e)}", exc_info=True)
+        logger.error("获取排行榜失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
+@router.get("/leaderboard/around/{game_id}", response_model=LeaderBoardAroundResponse)
+async def get_leaderboard_around(
+    game_id: int,
+    radius: int = 5,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取某条记录附近的排行榜
+
+    - **radius**: 前后各返回的记录数 (默认5，最大50)
+    """
+    if radius < 0 or radius > 50:
+        raise HTTPException(status_code=400, detail="radius必须在0-50之间")
+
+    window = await async_game_service.get_leaderboard_around(db, game_id, radius=radius)
+    if not window:
+        raise HTTPException(status_code=404, detail="游戏记录不存在")
+    return window
+
+
+@router.get("/games/{game_id}/rank", response_model=GameRankResponse)
+async def get_game_rank(
+    game_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取游戏记录的全局名次"""
+    rank = await async_game_service.get_game_rank(db, game_id)
+    if not rank:
+        raise HTTPException(status_code=404, detail="游戏记录不存在")
+    return rank
+
+
+@router.get("/games/{game_id}/percentile", response_model=GamePercentileResponse)
+async def get_game_percentile(
+    game_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取游戏记录分数超过的记录比例（整体及同等级），由分数分布汇总估算，误差在1%以内"""
+    percentile = await async_game_service.get_game_percentile(db, game_id)
+    if not percentile:
+        raise HTTPException(status_code=404, detail="游戏记录不存在")
+    return percentile
+
+
 @router.get("/games/{game_id}", response_model=GameResponse)
 async def get_game(
     game_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """根据ID获取游戏记录"""
-    game = game_service.get_game_by_id(db, game_id)
-    if not game:
+    """
+    根据ID获取游戏记录
+
+    响应带 ETag，携带 If-None-Match 且记录未变化时返回 304
+    """
+    index = await async_game_service.get_leaderboard_index(db)
+    row = index.get(game_id)
+    if row is None:
+        # 索引中没有（如其他 worker 刚写入、事件尚未送达）时读取数据库
+        row = await async_game_service.get_game_row(db, game_id)
+    if row is None:
         raise HTTPException(status_code=404, detail="游戏记录不存在")
-    return game
+
+    # 索引中的记录快照即缓存有效性令牌，记录被更新后快照随之变化
+    key = ("game", game_id)
+    entry = response_cache.get(key, row)
+    if entry is None:
+        body = json_codec.dumps_bytes(dict(zip(GAME_RESPONSE_FIELDS, _response_values(row))))
+        entry = response_cache.put(key, row, response_cache.content_etag(body), body)
+    return response_cache.respond(request, entry)
+
+
+@router.get(
+    "/games/{game_id}/replay",
+    response_class=StreamingResponse,
+    responses={200: {"content": {REPLAY_CONTENT_TYPE: {}}, "description": "编码后的回放"}},
+)
+async def get_game_replay(
+    game_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    下载对局回放
+
+    返回二进制回放（格式见 services/replay_format.py），SQLite 文件数据库下按块流式读取
+    """
+    path = sqlite_file_path(db.bind)
+    if path is not None:
+        # 先打开回放再发出响应头：并发删除时返回 404，而不是内容被截断的 200
+        blob = await asyncio.to_thread(open_sqlite_blob, path, game_id)
+        if blob is None:
+            raise HTTPException(status_code=404, detail="回放不存在")
+        size, body = blob.size, blob
+    else:
+        data = await async_game_service.get_replay(db, game_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="回放不存在")
+        size, body = len(data), iter_bytes(data)
+    return StreamingResponse(body, media_type=REPLAY_CONTENT_TYPE, headers={
+        "Content-Length": str(size),
+        "Content-Disposition": f'attachment; filename="game-{game_id}.trp"',
+    })
 
 
 @router.put("/games/{game_id}", response_model=GameResponse)
 async def update_game(
     game_id: int,
     game_data: GameUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """更新游戏记录"""
+    """更新游戏记录（REPLAY_VERIFICATION=required 时只能修改玩家名和游戏时长）"""
+    _check_scored_update(game_data)
     try:
-        updated_game = game_service.update_game_record(db, game_id, game_data)
+        updated_game = await async_game_service.update_game_record(db, game_id, game_data)
         if not updated_game:
             raise HTTPException(status_code=404, detail="游戏记录不存在")
+
+        try:
+            await websocket.notify_leaderboard_update(
+                _notification_payload(updated_game), await _tracked_top(db), changed=[updated_game]
+            )
+        except Exception as ws_error:
+            logger.warning("WebSocket通知失败: %s", ws_error)
+
         return updated_game
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"更新游戏记录失败: {str(e)}", exc_info=True)
+        logger.error("更新游戏记录失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
 
 
 @router.delete("/games/{game_id}", status_code=204)
 async def delete_game(
     game_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除游戏记录"""
     try:
-        success = game_service.delete_game_record(db, game_id)
+        success = await async_game_service.delete_game_record(db, game_id)
         if not success:
             raise HTTPException(status_code=404, detail="游戏记录不存在")
+
+        try:
+            await websocket.notify_leaderboard_removal(game_id, await _tracked_top(db))
+        except Exception as ws_error:
+            logger.warning("WebSocket通知失败: %s", ws_error)
+
         return None
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"删除游戏记录失败: {str(e)}", exc_info=True)
+        logger.error("删除游戏记录失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
 
 
 @router.get("/players/{player_name}/stats")
 async def get_player_statistics(
     player_name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取玩家统计信息"""
     try:
-        stats = game_service.get_player_stats(db, player_name)
+        stats = await async_game_service.get_player_stats(db, player_name)
         return stats
     except Exception as e:
-        logger.error(f"获取玩家统计失败: {str(e)}", exc_info=True)
+        logger.error("获取玩家统计失败: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
+
+
+@router.get("/stats/distribution", response_model=ScoreDistributionResponse)
+async def get_score_distribution(
+    request: Request,
+    percentiles: str = "50,90,99",
+    bins: int = 20,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取整体及各等级的分数分布
+
+    - **percentiles**: 逗号分隔的分位数 (0-100，默认 50,90,99)
+    - **bins**: 直方图最大分组数 (默认20，最大200)，分组宽度取 1/2/5×10^k，各等级使用相同的分组
+    - 读取分数分布汇总，不扫描 games 表；分位数的相对误差不超过1%
+    - 响应带 ETag，携带 If-None-Match 且分布未变化时返回 304
+    """
+    if bins < 1 or bins > 200:
+        raise HTTPException(status_code=400, detail="bins必须在1-200之间")
+    try:
+        quantiles = [float(q) for q in percentiles.split(",")]
+    except ValueError:
+        quantiles = []
+    if not quantiles or len(quantiles) > 20 or not all(0 <= q <= 100 for q in quantiles):
+        raise HTTPException(status_code=400, detail="percentiles必须是逗号分隔的0-100之间的数（最多20个）")
+
+    try:
+        # 分布随任意写入变化，按排行榜索引的写入版本缓存（其他 worker 的写入经事件总线同步到索引）
+        index = await async_game_service.get_leaderboard_index(db)
+        key, token = ("distribution", tuple(quantiles), bins), (index.uid, index.version)
+        entry = response_cache.get(key, token)
+        if entry is None:
+            distribution = await async_game_service.get_score_distribution(db, quantiles, bins)
+            body = json_codec.dumps_bytes(distribution)
+            entry = response_cache.put(key, token, response_cache.content_etag(body), body)
+        return response_cache.respond(request, entry)
+    except Exception as e:
+        logger.error("获取分数分布失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
@@ -0,0 +1,16 @@
+"""
+指标API路由
+以 Prometheus 文本格式输出当前 worker 的运行时指标
+"""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..utils.metrics import CONTENT_TYPE, registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 指标"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,66 +1,357 @@
 """
 WebSocket实时通信
+
+客户端可按 limit 订阅排行榜 Top N：握手时下发快照，之后仅当可见的 Top N
+真正发生变化时推送增量（insert/evict 操作）；未订阅的旧客户端仍收到
+leaderboard_update 通知，但同样只在其 Top 10 变化时推送
 """
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
 import json
 import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..utils.logger import logger
+from ..config import settings
+from ..database.base import get_async_db
+from ..services.async_game_service import async_game_service
+from ..services.event_bus import RESYNC_EVENT, EventBus, InProcessEventBus
+from ..services.leaderboard_index import TRACKED_TOP_N, LeaderboardIndex, LeaderboardRow, leaderboard_indexes
+from ..utils import json_codec
+from ..utils.logger import get_logger
+from ..utils.metrics import registry, ws_fanout_duration
 
 router = APIRouter()
+# 连接、推送日志频率高，可通过 LOG_SAMPLING 对 app.websocket 采样
+logger = get_logger("websocket")
+
+# 未指定 limit 的客户端默认关注的排行榜长度
+DEFAULT_SUBSCRIBE_LIMIT = 10
+
+
+def diff_leaderboard(old: Sequence[LeaderboardRow], new: Sequence[LeaderboardRow]) -> List[dict]:
+    """
+    计算从 old 变为 new 所需的增量操作
+
+    先按名次从后往前 evict 不再出现（或内容已变化）的记录，
+    再按新名次从前往后 insert 新出现的记录；客户端依次执行即可得到 new
+    """
+    new_rows = {row.id: row for row in new}
+    kept = {row.id for row in old if new_rows.get(row.id) == row}
+
+    ops = [
+        {"op": "evict", "rank": rank}
+        for rank in range(len(old), 0, -1)
+        if old[rank - 1].id not in kept
+    ]
+    ops.extend(
+        {"op": "insert", "rank": rank, "entry": row._asdict()}
+        for rank, row in enumerate(new, start=1)
+        if row.id not in kept
+    )
+    return ops
+
+
+class ClientConnection:
+    """
+    单个WebSocket客户端
+
+    每个连接拥有有界的发送队列和独立的写协程，发布方只需入队即可返回，
+    慢客户端不会拖慢其他连接；队列满时丢弃最旧的消息（排行榜推送以最新为准）。
+    增量协议的客户端丢失任一增量都会与服务端的排行榜不一致，因此队列满时丢弃其积压的
+    排行榜帧（增量与快照），改为入队一份当前排行榜的快照。
+    队列中保存的是 (是否排行榜帧, 已编码的 JSON 文本帧)
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        self.queue: Deque[Tuple[bool, str]] = deque()
+        self.dropped = 0  # 自上次发送成功以来连续丢弃的消息数
+        self.limit = DEFAULT_SUBSCRIBE_LIMIT  # 关注的排行榜长度
+        self.delta = False  # 是否使用增量协议（显式订阅后开启）
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+
+    def enqueue(self, frame: str, board: bool = False) -> bool:
+        """
+        已编码的消息入队，连接已被判定为过慢时返回 False
+
+        board 表示排行榜增量帧，可被之后的快照整体替代
+        """
+        if self.closed:
+            return False
+        if len(self.queue) >= self.manager.max_queue:
+            if self.delta and self.manager.published_top is not None and (
+                board or any(queued for queued, _ in self.queue)
+            ):
+                return self._resync(frame, board)
+            self.queue.popleft()
+            if not self._count_dropped(1):
+                return False
+        self.queue.append((board, frame))
+        self._wakeup.set()
+        return True
+
+    def _resync(self, frame: str, board: bool) -> bool:
+        """丢弃积压的排行榜帧，入队当前排行榜的快照（已包含 frame 的变化）"""
+        queued = [item for item in self.queue if not item[0]]
+        dropped = len(self.queue) - len(queued) + board
+        if not board:
+            queued.append((False, frame))
+        queued.append((True, self.manager.snapshot_frame(self.limit)))
+        overflow = len(queued) - self.manager.max_queue
+        if overflow > 0:
+            del queued[:overflow]
+            dropped += overflow
+        self.queue = deque(queued)
+        if not self._count_dropped(dropped):
+            return False
+        self._wakeup.set()
+        return True
+
+    def _count_dropped(self, count: int) -> bool:
+        """记录丢弃的消息数，连续丢弃过多时断开连接并返回 False"""
+        self.dropped += count
+        self.manager.dropped_messages += count
+        if self.dropped > self.manager.max_dropped:
+            self.manager.evict(self, "积压消息过多")
+            return False
+        return True
+
+    async def _run(self):
+        """写协程：依次发送队列中的消息"""
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queue and not self.closed:
+                _, frame = self.queue.popleft()
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(frame), self.manager.send_timeout)
+                except asyncio.TimeoutError:
+                    self.manager.evict(self, "发送超时")
+                    return
+                except Exception as e:
+                    logger.error("发送消息失败: %s", e)
+                    self.manager.disconnect(self.websocket)
+                    return
+                self.dropped = 0
+
+    def stop(self):
+        """停止写协程并清空队列"""
+        self.closed = True
+        self.queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
 
 
 class ConnectionManager:
     """WebSocket连接管理器"""
 
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(
+        self,
+        max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+        send_timeout: float = settings.WS_SEND_TIMEOUT,
+        max_dropped: int = settings.WS_MAX_DROPPED_MESSAGES,
+    ):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        # 按 (是否增量协议, limit) 分组的订阅者，同组共用一个消息帧
+        self.subscriptions: Dict[Tuple[bool, int], Set[ClientConnection]] = defaultdict(set)
+        # 最近一次发布的排行榜 Top N，作为计算增量的基准
+        self.published_top: Optional[List[LeaderboardRow]] = None
+        # 按 limit 缓存的 published_top 快照帧，发布新的排行榜时清空
+        self._snapshot_frames: Dict[int, str] = {}
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.max_dropped = max_dropped
+        self.dropped_messages = 0
+        self.evicted_connections = 0
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket连接建立. 当前连接数: {len(self.active_connections)}")
+        client = ClientConnection(websocket, self)
+        self.active_connections[websocket] = client
+        self.subscriptions[(client.delta, client.limit)].add(client)
+        client.start()
+        logger.info("WebSocket连接建立. 当前连接数: %d", len(self.active_connections))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket断开. 当前连接数: {len(self.active_connections)}")
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        self._unsubscribe(client)
+        client.stop()
+        logger.info("WebSocket断开. 当前连接数: %d", len(self.active_connections))
+
+    def subscribe(self, websocket: WebSocket, limit: int, delta: bool = True):
+        """修改客户端关注的排行榜长度与推送协议"""
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        self._unsubscribe(client)
+        client.limit, client.delta = limit, delta
+        self.subscriptions[(delta, limit)].add(client)
+
+    def _unsubscribe(self, client: ClientConnection):
+        key = (client.delta, client.limit)
+        group = self.subscriptions.get(key)
+        if group is not None:
+            group.discard(client)
+            if not group:
+                del self.subscriptions[key]
+
+    def reset_leaderboard(self):
+        """清空已发布的排行榜基准（服务启动时调用）"""
+        self.published_top = None
+        self._snapshot_frames.clear()
+
+    def snapshot_frame(self, limit: int) -> str:
+        """已发布排行榜前 limit 名的 leaderboard_snapshot 帧"""
+        frame = self._snapshot_frames.get(limit)
+        if frame is None:
+            frame = self._snapshot_frames[limit] = json_codec.dumps(
+                {"type": "leaderboard_snapshot", "limit": limit, "entries": _snapshot_entries(self.published_top, limit)}
+            )
+        return frame
+
+    def publish_leaderboard(self, top: Sequence[LeaderboardRow], legacy_message: dict) -> int:
+        """
+        发布最新的排行榜 Top N，返回推送的客户端数
+
+        对每个订阅分组计算其可见 Top N 的变化，无变化的分组不推送；
+        增量协议的分组收到 leaderboard_delta，旧协议的分组收到 legacy_message
+        """
+        old, self.published_top = self.published_top, list(top)
+        self._snapshot_frames.clear()
+        if old is None:
+            # 尚无基准：此前没有客户端拿到过快照，无需推送
+            return 0
+
+        start = time.perf_counter()
+        diffs: Dict[int, List[dict]] = {}
+        legacy_frame = None
+        pushed = 0
+        for (delta, limit), clients in list(self.subscriptions.items()):
+            if limit not in diffs:
+                diffs[limit] = diff_leaderboard(old[:limit], self.published_top[:limit])
+            ops = diffs[limit]
+            if not ops:
+                continue
+
+            if delta:
+                frame = json_codec.dumps({"type": "leaderboard_delta", "limit": limit, "ops": ops})
+            else:
+                if legacy_frame is None:
+                    legacy_frame = json_codec.dumps(legacy_message)
+                frame = legacy_frame
+            for client in list(clients):
+                client.enqueue(frame, delta)
+            pushed += len(clients)
+        if pushed:
+            ws_fanout_duration.observe(time.perf_counter() - start, "leaderboard")
+        return pushed
+
+    def evict(self, client: ClientConnection, reason: str):
+        """断开跟不上推送速度的客户端"""
+        if client.closed:
+            return
+        self.evicted_connections += 1
+        logger.warning("断开慢速WebSocket客户端: %s", reason)
+        self.disconnect(client.websocket)
+        # 关闭握手同样可能阻塞，交给后台任务处理
+        asyncio.ensure_future(self._close_quietly(client.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass
 
     async def broadcast(self, message: dict):
-        """向所有连接的客户端广播消息"""
+        """
+        向所有连接的客户端广播消息
+
+        消息只编码一次，所有连接共享同一个文本帧；只入队，不等待发送完成
+        """
         if not self.active_connections:
             return
+        self.broadcast_frame(json_codec.dumps(message))
 
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"广播消息失败: {e}")
-                disconnected.append(connection)
-
-        # 清理断开的连接
-        for connection in disconnected:
-            self.disconnect(connection)
+    def broadcast_frame(self, frame: str):
+        """向所有连接的客户端广播已编码的文本帧"""
+        start = time.perf_counter()
+        for client in list(self.active_connections.values()):
+            client.enqueue(frame)
+        ws_fanout_duration.observe(time.perf_counter() - start, "broadcast")
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """向特定客户端发送消息"""
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            logger.error(f"发送个人消息失败: {e}")
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.enqueue(json_codec.dumps(message))
 
 
 # 创建全局连接管理器
 manager = ConnectionManager()
 
+registry.callback("ws_active_connections", "当前WebSocket连接数", lambda: len(manager.active_connections))
+registry.callback(
+    "ws_dropped_messages_total", "因发送队列已满丢弃的消息数", lambda: manager.dropped_messages, "counter"
+)
+registry.callback(
+    "ws_evicted_connections_total", "被断开的慢速客户端数", lambda: manager.evicted_connections, "counter"
+)
+
+
+async def _current_top(db: AsyncSession) -> List[LeaderboardRow]:
+    """获取当前排行榜基准，首次使用时从排行榜索引读取"""
+    if manager.published_top is None:
+        manager.published_top = await async_game_service.get_top_scores(db, limit=TRACKED_TOP_N)
+        # 释放连接，避免长连接期间一直占用数据库连接
+        await db.close()
+    return manager.published_top
+
+
+async def _send_snapshot(websocket: WebSocket, db: AsyncSession, limit: int):
+    """下发排行榜快照"""
+    top = await _current_top(db)
+    await manager.send_personal_message({
+        "type": "leaderboard_snapshot",
+        "limit": limit,
+        "entries": _snapshot_entries(top, limit)
+    }, websocket)
+
+
+def _snapshot_entries(top: Sequence[LeaderboardRow], limit: int) -> List[dict]:
+    return [row._asdict() for row in top[:limit]]
+
+
+def _clamp_limit(limit) -> int:
+    try:
+        return min(max(int(limit), 1), TRACKED_TOP_N)
+    except (TypeError, ValueError):
+        return DEFAULT_SUBSCRIBE_LIMIT
+
 
 @router.websocket("/ws/leaderboard")
-async def leaderboard_websocket(websocket: WebSocket):
+async def leaderboard_websocket(
+    websocket: WebSocket,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     实时排行榜WebSocket端点
 
-    连接后,当有新的高分记录时,服务器会自动推送更新
+    连接后下发排行榜快照（leaderboard_snapshot），之后排行榜变化时推送更新。
+    通过查询参数 ?limit=N 或消息 {"type": "subscribe", "limit": N} 订阅 Top N 增量推送
+    （leaderboard_delta），仅当可见的 Top N 变化时推送
     """
     await manager.connect(websocket)
 
@@ -71,6 +362,10 @@ async def leaderboard_websocket(websocket: WebSocket):
             "message": "已连接到实时排行榜"
         }, websocket)
 
+        if limit is not None:
+            manager.subscribe(websocket, _clamp_limit(limit))
+        await _send_snapshot(websocket, db, _clamp_limit(limit or DEFAULT_SUBSCRIBE_LIMIT))
+
         # 保持连接并处理客户端消息
         while True:
             data = await websocket.receive_text()
@@ -83,29 +378,150 @@ async def leaderboard_websocket(websocket: WebSocket):
                         "type": "pong",
                         "timestamp": message.get("timestamp")
                     }, websocket)
+                elif message.get("type") == "subscribe":
+                    subscribe_limit = _clamp_limit(message.get("limit", DEFAULT_SUBSCRIBE_LIMIT))
+                    manager.subscribe(websocket, subscribe_limit)
+                    await _send_snapshot(websocket, db, subscribe_limit)
             except json.JSONDecodeError:
-                logger.warning(f"无效的JSON消息: {data}")
+                logger.warning("无效的JSON消息: %s", data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         logger.info("WebSocket客户端主动断开")
     except Exception as e:
-        logger.error(f"WebSocket错误: {e}", exc_info=True)
+        logger.error("WebSocket错误: %s", e, exc_info=True)
         manager.disconnect(websocket)
 
 
-async def notify_leaderboard_update(game_data: dict):
+def _encode_row(game) -> list:
+    """将记录编码为可跨进程传输的 JSON 数组"""
+    return [
+        game.id, game.player_name, game.score, game.level,
+        game.lines, game.play_time, game.created_at.isoformat(),
+    ]
+
+
+def _decode_row(values: list) -> LeaderboardRow:
+    *fields, created_at = values
+    return LeaderboardRow(*fields, datetime.fromisoformat(created_at))
+
+
+def _leaderboard_event(
+    message: dict,
+    top: Optional[Sequence[LeaderboardRow]],
+    changed: Sequence = (),
+    removed: Sequence[int] = (),
+) -> dict:
+    """
+    构造排行榜事件
+
+    top 为写入方计算的 Top N；changed / removed 为本次写入的记录，
+    其他 worker 据此同步各自的排行榜内存索引
+    """
+    return {
+        "type": "leaderboard",
+        "message": message,
+        "top": None if top is None else [_encode_row(row) for row in top],
+        "changed": [_encode_row(game) for game in changed],
+        "removed": list(removed),
+    }
+
+
+def _apply_to_index(event: dict) -> Optional[LeaderboardIndex]:
+    """将其他 worker 的写入同步到本进程的排行榜内存索引，返回该索引（尚未加载时返回 None）"""
+    index = leaderboard_indexes.peek(_index_bind) if _index_bind is not None else None
+    if index is None:
+        # 索引尚未加载，首次访问时会从数据库读取最新数据
+        return None
+    for values in event["changed"]:
+        index.add(_decode_row(values))
+    for game_id in event["removed"]:
+        index.remove(game_id)
+    return index
+
+
+def handle_events(events: List[dict], remote: bool) -> None:
+    """处理事件总线投递的事件（本进程发布的或其他 worker 发来的）"""
+    for event in events:
+        if event == RESYNC_EVENT:
+            # 漏收了其他 worker 的事件，丢弃本进程的索引，下次访问时从数据库重新加载
+            if _index_bind is not None:
+                logger.warning("事件总线漏收事件，重新加载排行榜索引")
+                leaderboard_indexes.reset(_index_bind)
+            continue
+        if event.get("type") != "leaderboard":
+            continue
+        index = _apply_to_index(event) if remote else None
+        message = event["message"]
+        if event["top"] is None:
+            if manager.active_connections:
+                manager.broadcast_frame(json_codec.dumps(message))
+            continue
+        # 写入方的 Top N 可能还不包含本进程最近的写入，同步后以本进程的索引为准
+        if index is not None and index.top_cached:
+            top = index.top(TRACKED_TOP_N)
+        else:
+            top = [_decode_row(row) for row in event["top"]]
+        pushed = manager.publish_leaderboard(top, message)
+        if pushed:
+            logger.info("推送排行榜更新: %s, %d 个客户端", message.get("data"), pushed)
+
+
+# 默认只在本进程投递；多 worker 部署时由 start_event_bus 替换为跨进程的总线
+event_bus: EventBus = InProcessEventBus(handle_events)
+_index_bind = None
+
+
+async def start_event_bus(bus: EventBus, bind=None) -> None:
+    """启动事件总线，bind 为本进程排行榜索引对应的数据库引擎"""
+    global event_bus, _index_bind
+    await bus.start(handle_events)
+    event_bus, _index_bind = bus, bind
+
+
+async def stop_event_bus() -> None:
+    """停止事件总线并恢复为进程内投递"""
+    global event_bus, _index_bind
+    bus, event_bus, _index_bind = event_bus, InProcessEventBus(handle_events), None
+    await bus.stop()
+
+
+async def notify_leaderboard_update(
+    game_data: dict, top: Optional[Sequence[LeaderboardRow]] = None, changed: Sequence = ()
+):
     """
     通知排行榜更新
 
-    当有新的游戏记录保存时调用此函数
+    当有游戏记录保存、修改时调用此函数；传入写入后的 Top N 时仅推送给可见排行榜发生变化的客户端。
+    事件经事件总线发布，所有 worker 上的客户端都会收到
+    """
+    message = {"type": "leaderboard_update", "data": game_data}
+    event_bus.publish(_leaderboard_event(message, top, changed))
+
+
+async def notify_leaderboard_batch_update(
+    games: List[dict], top: Optional[Sequence[LeaderboardRow]] = None, changed: Sequence = ()
+):
     """
-    await manager.broadcast({
-        "type": "leaderboard_update",
-        "data": game_data
-    })
-    logger.info(f"广播排行榜更新: {game_data.get('player_name')} - {game_data.get('score')}分")
+    通知排行榜批量更新
+
+    批量导入时只推送一次: 旧协议消息的 data 为本批最高分记录, count 为本批记录数
+    """
+    if not games:
+        return
+    best = max(games, key=lambda g: g["score"])
+    message = {"type": "leaderboard_update", "data": best, "count": len(games)}
+    event_bus.publish(_leaderboard_event(message, top, changed))
+
+
+async def notify_leaderboard_removal(game_id: int, top: Sequence[LeaderboardRow]):
+    """通知排行榜记录删除，仅推送给可见排行榜发生变化的客户端"""
+    message = {"type": "leaderboard_update", "data": {"id": game_id, "deleted": True}}
+    event_bus.publish(_leaderboard_event(message, top, removed=[game_id]))
 
 
 # 导出管理器和通知函数,供其他模块使用
-__all__ = ['manager', 'notify_leaderboard_update']
+__all__ = [
+    'manager', 'diff_leaderboard', 'handle_events', 'start_event_bus', 'stop_event_bus',
+    'notify_leaderboard_update', 'notify_leaderboard_batch_update', 'notify_leaderboard_removal',
+]
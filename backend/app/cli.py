@@ -0,0 +1,123 @@
+"""
+命令行运维工具
+
+用法:
+    python -m app.cli rebuild-player-stats
+    python -m app.cli rebuild-leaderboards
+    python -m app.cli rebuild-score-histogram
+    python -m app.cli generate-games --rows 10000000 --seed 42
+    python -m app.cli scan-anomalies [--full]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from .config import settings
+from .database.base import SessionLocal, create_db_engine, engine
+from .database.dataset import load_games
+from .services.anomaly_scan import AnomalyScanner
+from .services.game_service import game_service
+
+
+def rebuild_player_stats(args: argparse.Namespace) -> None:
+    """根据 games 表重建玩家统计汇总"""
+    with SessionLocal() as db:
+        players = game_service.rebuild_player_stats(db)
+    print(f"✅ 玩家统计汇总重建完成: {players} 名玩家")
+
+
+def rebuild_leaderboards(args: argparse.Namespace) -> None:
+    """根据 games 表重建周期排行榜汇总"""
+    with SessionLocal() as db:
+        rows = game_service.rebuild_period_leaderboards(db)
+    print(f"✅ 周期排行榜汇总重建完成: {rows} 条")
+
+
+def rebuild_score_histogram(args: argparse.Namespace) -> None:
+    """根据 games 表重建分数分布汇总"""
+    with SessionLocal() as db:
+        buckets = game_service.rebuild_score_histogram(db)
+    print(f"✅ 分数分布汇总重建完成: {buckets} 个分桶")
+
+
+def generate_games(args: argparse.Namespace) -> None:
+    """生成合成游戏记录并批量写入"""
+    target = create_db_engine(args.database_url) if args.database_url else engine
+    started = time.perf_counter()
+
+    def progress(written: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(f"\r已写入 {written}/{args.rows} 条记录 ({written / elapsed:,.0f} 条/秒)", end="", flush=True)
+
+    try:
+        written = load_games(
+            target, args.rows, seed=args.seed, players=args.players,
+            start=datetime.fromisoformat(args.start), days=args.days,
+            chunk_size=args.chunk_size, rebuild_indexes=not args.keep_indexes, progress=progress,
+        )
+    finally:
+        if target is not engine:
+            target.dispose()
+    print(f"\n✅ 合成数据生成完成: {written} 条记录, 耗时 {time.perf_counter() - started:.1f}s（含索引重建）")
+
+
+def scan_anomalies(args: argparse.Namespace) -> None:
+    """扫描游戏记录并标记异常"""
+    target = create_db_engine(args.database_url) if args.database_url else engine
+    scanner = AnomalyScanner(chunk_size=args.chunk_size)
+    started = time.perf_counter()
+
+    def progress(scanned: int, flagged: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(f"\r已扫描 {scanned} 条记录，标记 {flagged} 条 ({scanned / elapsed:,.0f} 条/秒)", end="", flush=True)
+
+    try:
+        result = scanner.scan(target, full=args.full, progress=progress)
+    finally:
+        if target is not engine:
+            target.dispose()
+    print(f"\n✅ 异常扫描完成（#{result.scan_id}）: 扫描 {result.rows} 条，标记 {result.flagged} 条，"
+          f"耗时 {time.perf_counter() - started:.1f}s")
+    for name, count in result.reasons.items():
+        if count:
+            print(f"   {name}: {count}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="俄罗斯方块游戏后端运维工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-player-stats", help="根据 games 表重建玩家统计汇总")
+    rebuild.set_defaults(func=rebuild_player_stats)
+
+    leaderboards = subparsers.add_parser(
+        "rebuild-leaderboards", help="根据 games 表重建日/周/月/赛季排行榜汇总（修改时区或赛季长度后使用）"
+    )
+    leaderboards.set_defaults(func=rebuild_leaderboards)
+
+    histogram = subparsers.add_parser("rebuild-score-histogram", help="根据 games 表重建分数分布汇总")
+    histogram.set_defaults(func=rebuild_score_histogram)
+
+    generate = subparsers.add_parser("generate-games", help="生成合成游戏记录（基准测试与容量规划）")
+    generate.add_argument("--rows", type=int, required=True, help="生成的记录数")
+    generate.add_argument("--seed", type=int, default=0, help="随机种子，相同参数生成相同数据")
+    generate.add_argument("--players", type=int, help="玩家数（默认 rows/50，至少 100）")
+    generate.add_argument("--start", default="2026-01-01", help="最早的 created_at")
+    generate.add_argument("--days", type=float, default=180, help="created_at 分布的天数")
+    generate.add_argument("--chunk-size", type=int, default=100_000, help="每次批量插入与提交的记录数")
+    generate.add_argument("--keep-indexes", action="store_true", help="写入期间保留索引（追加少量数据时使用）")
+    generate.add_argument("--database-url", help="目标数据库（默认 DATABASE_URL）")
+    generate.set_defaults(func=generate_games)
+
+    scan = subparsers.add_parser("scan-anomalies", help="扫描游戏记录，标记不可能出现的分数（需要 numpy）")
+    scan.add_argument("--full", action="store_true", help="清空已有标记后全量扫描（默认只扫描新增记录）")
+    scan.add_argument("--chunk-size", type=int, default=settings.ANOMALY_SCAN_CHUNK_SIZE, help="每次读入的记录数")
+    scan.add_argument("--database-url", help="目标数据库（默认 DATABASE_URL）")
+    scan.set_defaults(func=scan_anomalies)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,19 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./data.db"
 
+    # 连接池配置（文件数据库；内存数据库固定使用单连接）
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+
+    # SQLite 性能配置（每个新连接建立时通过 PRAGMA 应用）
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL 模式下读不阻塞写、写不阻塞读
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL 下 NORMAL 可保证一致性，仅掉电时可能丢失最后的事务
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取的字节数，0 表示关闭
+    SQLITE_CACHE_SIZE: int = -64 * 1024  # 页缓存大小，负数表示 KiB
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 遇到锁时的等待时间
+    SQLITE_TEMP_STORE: str = "MEMORY"  # 临时表和排序使用内存
+
     # CORS 配置
     ALLOWED_ORIGINS: list[str] = [
         "http://localhost:5173",
@@ -24,6 +37,89 @@ class Settings(BaseSettings):
         "http://localhost:3000"
     ]
 
+    # 管理接口令牌（为空时禁用 /api/admin 接口）
+    ADMIN_TOKEN: str = ""
+
+    # JSON 编码器: auto（有 orjson 时使用 orjson）/ orjson / json
+    JSON_ENCODER: str = "auto"
+
+    # WebSocket 推送配置
+    WS_SEND_QUEUE_SIZE: int = 32  # 每个连接的待发送消息上限，超出后丢弃最旧的消息
+    WS_SEND_TIMEOUT: float = 5.0  # 单条消息发送超时(秒)，超时的连接被断开
+    WS_MAX_DROPPED_MESSAGES: int = 100  # 连续丢弃消息数上限，超出后断开该连接
+
+    # 响应缓存最大条目数（排行榜与单条游戏记录）
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+
+    # 批量导入单次最大记录数
+    BATCH_MAX_SIZE: int = 1000
+
+    # 是否采集运行时指标并开放 /metrics
+    METRICS_ENABLED: bool = True
+
+    # 日志配置
+    LOG_LEVEL: str = "INFO"
+    # 日志文件目录，为空时只输出到控制台
+    LOG_DIR: str = "logs"
+    # 是否输出 JSON Lines
+    LOG_JSON: bool = False
+    # 日志轮转方式：date（每天零点）、size（按大小）或 none
+    LOG_ROTATION: str = "date"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 7
+    # 按 logger 名称配置采样率（0-1），如 {"app.websocket": 0.1}，只作用于 INFO 及以下
+    LOG_SAMPLING: dict[str, float] = {}
+
+    # 速率限制（令牌桶）：未单独配置的路由使用默认限制
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: str = "200/minute"
+    # 按 "METHOD path" 单独配置的限制
+    RATE_LIMIT_ROUTES: dict[str, str] = {
+        "POST /api/games": "30/minute",
+        "POST /api/games/batch": "5/minute",
+    }
+    # 最多跟踪的客户端键数，超过后淘汰最久未访问的
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # 令牌桶存储：memory://（进程内）或 shm://name（多 worker 共享内存）
+    RATE_LIMIT_STORAGE: str = "memory://"
+
+    # 跨 worker 事件总线：memory://（单进程）或 sqlite:///path.db（同机多进程共享事件日志）
+    EVENT_BUS_URL: str = "memory://"
+    # 事件批量发送的最长等待时间（毫秒）与每批最大事件数
+    EVENT_BUS_FLUSH_MS: float = 2.0
+    EVENT_BUS_MAX_BATCH: int = 100
+    # SQLite 事件日志的轮询间隔（毫秒）与保留时间（秒）
+    EVENT_BUS_POLL_MS: float = 10.0
+    EVENT_BUS_RETENTION_S: float = 60.0
+    # 发送失败后的重试间隔（毫秒）；待发送事件超过上限时丢弃最旧的事件，并通知其他进程重新同步
+    EVENT_BUS_RETRY_MS: float = 100.0
+    EVENT_BUS_MAX_PENDING: int = 10000
+
+    # 组提交：POST /api/games 的记录合并到同一事务写入
+    GROUP_COMMIT_ENABLED: bool = False
+    # 每批最长等待时间（毫秒），即组提交带来的额外延迟上限
+    GROUP_COMMIT_MAX_DELAY_MS: float = 5.0
+    # 每批最大记录数，达到后立即提交
+    GROUP_COMMIT_MAX_BATCH: int = 200
+
+    # 回放校验：off（不校验）、optional（附带回放时校验）或 required（必须附带回放）
+    REPLAY_VERIFICATION: str = "optional"
+    # 回放进程池大小，0 表示在 API 进程内直接重放
+    REPLAY_WORKERS: int = 2
+    # 单局操作序列最大长度
+    REPLAY_MAX_ACTIONS: int = 100000
+
+    # 异常扫描（python -m app.cli scan-anomalies，需要 numpy）
+    ANOMALY_SCAN_CHUNK_SIZE: int = 200_000  # 每次读入内存的记录数
+    ANOMALY_MAX_LINES_PER_SECOND: float = 1.0  # 每秒消除行数上限（约每秒 3.75 个方块）
+    ANOMALY_JUMP_FACTOR: float = 10.0  # 分数超过该玩家此前最高分的倍数
+    ANOMALY_JUMP_MIN_GAMES: int = 5  # 玩家至少已有的对局数，才判断分数突增
+    ANOMALY_JUMP_MIN_SCORE: int = 10000  # 低于该分数的记录不判断分数突增
+
+    # 周期排行榜：周期边界所在的时区（IANA 名称）与每个赛季的月数（12 的约数）
+    LEADERBOARD_TIMEZONE: str = "UTC"
+    LEADERBOARD_SEASON_MONTHS: int = 3
+
     # 游戏配置
     LINES_PER_LEVEL: int = 20
     INITIAL_SPEED: int = 1000
@@ -1,19 +1,122 @@
 """
 数据库基础模块
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
 from ..config import settings
 
+# 同步驱动对应的异步驱动
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def to_async_url(url: str) -> str:
+    """将同步数据库 URL 转换为对应异步驱动的 URL"""
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        return url
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"不支持异步访问的数据库: {parsed.get_backend_name()}")
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def is_sqlite_memory(url: str) -> bool:
+    """判断是否为 SQLite 内存数据库"""
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def sqlite_pragmas(memory: bool = False) -> list[str]:
+    """根据配置生成连接初始化时执行的 PRAGMA 语句"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA temp_store = {settings.SQLITE_TEMP_STORE}",
+    ]
+    if not memory:
+        # 内存数据库不支持 WAL，也无需内存映射
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        pragmas.append(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+    return pragmas
+
+
+def _engine_options(url: str) -> dict:
+    """按数据库类型生成连接池参数"""
+    if is_sqlite_memory(url):
+        # 内存数据库每个连接都是独立的库，必须共享同一个连接
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+    if make_url(url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}  # SQLite 特有配置
+    return options
+
+
+def _merge_options(url: str, kwargs: dict) -> dict:
+    """合并默认连接池参数与调用方参数，调用方指定连接池类型时不再传入池大小参数"""
+    options = {**_engine_options(url), **kwargs}
+    if "poolclass" in kwargs:
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+    return options
+
+
+def _install_sqlite_pragmas(sync_engine: Engine, url: str) -> None:
+    """在每个新建连接上应用 SQLite 性能配置"""
+    if make_url(url).get_backend_name() != "sqlite":
+        return
+    pragmas = sqlite_pragmas(memory=is_sqlite_memory(url))
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str, **kwargs) -> Engine:
+    """创建应用性能配置的同步引擎"""
+    db_engine = create_engine(url, **_merge_options(url, kwargs))
+    _install_sqlite_pragmas(db_engine, url)
+    return db_engine
+
+
+def create_async_db_engine(url: str, **kwargs) -> AsyncEngine:
+    """创建应用性能配置的异步引擎"""
+    db_engine = create_async_engine(to_async_url(url), **_merge_options(url, kwargs))
+    _install_sqlite_pragmas(db_engine.sync_engine, url)
+    return db_engine
+
+
 # 创建基础模型类 (使用 SQLAlchemy 2.0 推荐方式)
 Base = declarative_base()
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}  # SQLite 特有配置
+# 创建异步数据库引擎：应用启动初始化与请求处理共用，查询不阻塞事件循环
+async_engine = create_async_db_engine(settings.DATABASE_URL)
+
+# 创建异步会话工厂（提交后不过期对象，避免在协程中触发隐式加载）
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
 )
 
+# 创建同步数据库引擎（仅供命令行工具等同步场景使用，首次连接时才打开数据库）
+engine = create_db_engine(settings.DATABASE_URL)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -25,3 +128,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,141 @@
+"""
+合成游戏数据生成
+
+用于基准测试与容量规划，按固定随机种子生成可复现的游戏记录：
+- 玩家活跃度服从 Zipf 分布（少数玩家贡献大量对局）
+- 每名玩家有固定的水平，决定消除行数、每行得分与速度；等级由行数推出，分数按前端的计分规则随等级增长，
+  生成的记录都满足异常扫描（services/anomaly_scan.py）的规则
+- created_at 按泊松到达分布在 days 天内，且与 id 同序
+
+写入时先删除 Game 上声明的索引，分块通过 Core 批量插入后重建索引、刷新统计信息并重建玩家统计与周期排行榜汇总
+"""
+import bisect
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.game import Game
+from .init_db import create_schema
+
+# 生成规则的版本，规则变化导致同样参数生成的数据不同时递增（基准测试按版本缓存数据库）
+DATASET_VERSION = 2
+
+# 前端计分规则：一次消除 1-4 行的基础分（再乘以等级）
+LINE_SCORES = (100, 300, 500, 800)
+MAX_LEVEL = 20
+
+
+def _level_weighted_lines(lines: int) -> int:
+    """sum(每行消除时的等级)，等级每 LINES_PER_LEVEL 行升一级，最高 MAX_LEVEL"""
+    per_level = settings.LINES_PER_LEVEL
+    full = min(lines // per_level, MAX_LEVEL - 1)
+    return per_level * full * (full + 1) // 2 + (lines - per_level * full) * (full + 1)
+
+
+def generate_rows(
+    rows: int,
+    seed: int = 0,
+    players: Optional[int] = None,
+    start: datetime = datetime(2026, 1, 1),
+    days: float = 180,
+    chunk_size: int = 100_000,
+) -> Iterator[List[dict]]:
+    """按块生成游戏记录，同样的参数总是得到同样的数据"""
+    rng = random.Random(seed)
+    players = players or max(100, rows // 50)
+
+    # 玩家活跃度：Zipf(s=1.1) 累积权重；玩家水平：对数行数的均值与每行平均得分
+    cum_weights = list(itertools.accumulate(1 / (k + 1) ** 1.1 for k in range(players)))
+    skills = [rng.gauss(3.0, 0.8) for _ in range(players)]
+    # 水平与活跃度正相关：按水平排序后分配，活跃玩家整体水平更高
+    skills.sort(reverse=True)
+    for i in range(players - 1, 0, -1):
+        # 局部打乱，避免活跃度与水平完全单调
+        j = max(0, i - rng.randrange(1 + players // 10))
+        skills[i], skills[j] = skills[j], skills[i]
+    names = [f"玩家{k:06d}" for k in range(players)]
+
+    mean_gap = days * 86400 / max(rows, 1)
+    elapsed = 0.0
+    total = cum_weights[-1]
+    for offset in range(0, rows, chunk_size):
+        chunk = []
+        for _ in range(min(chunk_size, rows - offset)):
+            player = bisect.bisect_left(cum_weights, rng.random() * total)
+            skill = skills[player]
+            lines = min(2000, int(rng.lognormvariate(skill, 0.6)))
+            # 水平越高，一次消除多行的比例越高：每行平均得分介于单行(100)与四行(200)之间
+            tetris_rate = 1 / (1 + math.exp(-(skill - 3.5) * 1.5))
+            per_line = LINE_SCORES[0] + (LINE_SCORES[3] / 4 - LINE_SCORES[0]) * min(1.0, max(0.0, tetris_rate + rng.gauss(0, 0.1)))
+            level = min(MAX_LEVEL, lines // settings.LINES_PER_LEVEL + 1)
+            elapsed += rng.expovariate(1) * mean_gap
+            chunk.append({
+                "player_name": names[player],
+                # 每次消除的得分都是 100 的整数倍，取整后仍在单行与四行消除的得分区间内
+                "score": round(per_line * _level_weighted_lines(lines) / 100) * 100,
+                "level": level,
+                "lines": lines,
+                "play_time": int(20 + lines * rng.uniform(2.5, 6.0) / (1 + skill / 10)),
+                "created_at": start + timedelta(seconds=elapsed),
+            })
+        yield chunk
+
+
+def load_games(
+    engine: Engine,
+    rows: int,
+    seed: int = 0,
+    players: Optional[int] = None,
+    start: datetime = datetime(2026, 1, 1),
+    days: float = 180,
+    chunk_size: int = 100_000,
+    rebuild_indexes: bool = True,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    向 games 表追加 rows 条合成记录，返回写入的记录数
+
+    rebuild_indexes=True 时写入期间删除 Game 的索引，完成后统一重建（比逐行维护索引快得多）
+    """
+    from ..services.game_service import game_service
+
+    with engine.begin() as conn:
+        create_schema(conn)
+
+    sqlite = engine.dialect.name == "sqlite"
+    indexes = list(Game.__table__.indexes) if rebuild_indexes else []
+    written = 0
+    with engine.connect() as conn:
+        if sqlite:
+            # 仅作用于本连接：批量导入可在中途失败后重新生成，无需每次提交都落盘
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+        conn.commit()
+        try:
+            for chunk in generate_rows(rows, seed, players, start, days, chunk_size):
+                conn.execute(insert(Game), chunk)
+                conn.commit()
+                written += len(chunk)
+                if progress is not None:
+                    progress(written)
+        finally:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            if sqlite:
+                conn.exec_driver_sql("ANALYZE")
+                conn.exec_driver_sql(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+            conn.commit()
+
+    with Session(engine) as db:
+        game_service.rebuild_player_stats(db)
+        game_service.rebuild_period_leaderboards(db)
+        game_service.rebuild_score_histogram(db)
+    return written
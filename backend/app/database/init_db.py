@@ -1,25 +1,97 @@
 """
 数据库初始化模块
-应用启动时自动创建表
+应用启动时自动创建表（使用与请求处理共享的数据库引擎）
 """
-from sqlalchemy import create_engine
-from .base import Base
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session
+from .base import Base, AsyncSessionLocal, async_engine
 from ..models.game import Game
+from ..models.game_flag import AnomalyScan, GameFlag  # noqa: F401  注册异常扫描相关表
+from ..models.game_replay import GameReplayBlob  # noqa: F401  注册 game_replays 表
+from ..models.leaderboard_rollup import LeaderboardRollup, LeaderboardSnapshot  # noqa: F401
+from ..models.player_stats import PlayerStats
+from ..models.score_histogram import ScoreHistogram
 
+# 新建（或新增列）时需要根据已有游戏记录回填的汇总表
+_BACKFILLED_TABLES = (
+    PlayerStats.__tablename__, LeaderboardRollup.__tablename__, ScoreHistogram.__tablename__,
+)
+
+# 已被模型中的新索引取代的旧索引：(表名, 索引名)
+_OBSOLETE_INDEXES = (
+    (Game.__tablename__, "idx_player_name"),  # 由 idx_player_score 取代
+)
+
+
+def create_schema(connection) -> set:
+    """创建缺失的表、列和索引，返回需要回填的汇总表中本次新建或新增了列的表名"""
+    inspector = inspect(connection)
+    missing = {name for name in _BACKFILLED_TABLES if not inspector.has_table(name)}
+    Base.metadata.create_all(bind=connection)
+    altered = ensure_columns(connection)
+    ensure_indexes(connection)
+    drop_obsolete_indexes(connection)
+    return missing | (altered & set(_BACKFILLED_TABLES))
 
-def init_database():
-    """初始化数据库表"""
-    from ..config import settings
 
-    engine = create_engine(settings.DATABASE_URL)
-    Base.metadata.create_all(bind=engine)
+async def init_database():
+    """初始化数据库表"""
+    async with async_engine.begin() as conn:
+        created = await conn.run_sync(create_schema)
+    if created:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(backfill_summaries, created)
     print("✅ 数据库表创建成功")
 
 
-def drop_database():
-    """删除所有表（仅用于测试）"""
-    from ..config import settings
+def ensure_columns(bind) -> set:
+    """为已存在的表补建模型中新增的列（新增列均可为空），返回补建了列的表名"""
+    inspector = inspect(bind)
+    altered = set()
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=bind.dialect)
+                bind.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                altered.add(table.name)
+    return altered
+
+
+def drop_obsolete_indexes(bind):
+    """删除已被新索引取代的旧索引，减少写入时的索引维护"""
+    inspector = inspect(bind)
+    for table, name in _OBSOLETE_INDEXES:
+        if name in {index["name"] for index in inspector.get_indexes(table)}:
+            bind.exec_driver_sql(f"DROP INDEX {name}")
 
-    engine = create_engine(settings.DATABASE_URL)
-    Base.metadata.drop_all(bind=engine)
+
+def ensure_indexes(bind):
+    """为已存在的表补建模型中新增的索引（create_all 不会修改已有表）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def backfill_summaries(db: Session, created: set):
+    """新建（或升级）player_stats / leaderboard_rollups / score_histogram 汇总表时，根据已有的游戏记录回填"""
+    from ..services.game_service import game_service
+
+    if db.scalar(select(Game.id).limit(1)) is None:
+        return
+    if PlayerStats.__tablename__ in created:
+        players = game_service.rebuild_player_stats(db)
+        print(f"✅ 玩家统计汇总回填完成: {players} 名玩家")
+    if LeaderboardRollup.__tablename__ in created:
+        rows = game_service.rebuild_period_leaderboards(db)
+        print(f"✅ 周期排行榜汇总回填完成: {rows} 条")
+    if ScoreHistogram.__tablename__ in created:
+        buckets = game_service.rebuild_score_histogram(db)
+        print(f"✅ 分数分布汇总回填完成: {buckets} 个分桶")
+
+
+async def drop_database():
+    """删除所有表（仅用于测试）"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
     print("⚠️  数据库表已删除")
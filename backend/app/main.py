@@ -6,21 +6,47 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .config import settings
+from .database.base import AsyncSessionLocal, async_engine
 from .database.init_db import init_database
-from .utils.logger import logger
-from .api import games, websocket
+from .middleware import MetricsMiddleware, RateLimitMiddleware
+from .services.async_game_service import async_game_service
+from .services.event_bus import create_event_bus
+from .services.replay_verifier import replay_verifier
+from .services.response_cache import response_cache
+from .services.write_buffer import game_write_buffer
+from .utils.logger import logger, setup_logging, shutdown_logging
+from .utils.metrics import install_sql_metrics
+from .api import admin, games, metrics, websocket
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
+    setup_logging()
     logger.info("🚀 应用启动中...")
-    init_database()
+    await init_database()
     logger.info("✅ 数据库初始化完成")
+    # 先开始接收其他 worker 的事件再加载索引，加载期间的写入不会漏掉
+    await websocket.start_event_bus(create_event_bus(settings.EVENT_BUS_URL), async_engine)
+    async with AsyncSessionLocal() as db:
+        indexed = await async_game_service.load_leaderboard_index(db)
+    logger.info("✅ 排行榜索引加载完成: %d 条记录", indexed)
+    websocket.manager.reset_leaderboard()
+    response_cache.clear()
+    if settings.GROUP_COMMIT_ENABLED:
+        game_write_buffer.start(AsyncSessionLocal)
+        logger.info("✅ 组提交写入已开启")
+    if settings.REPLAY_VERIFICATION != "off":
+        replay_verifier.start()
     yield
     # 关闭时执行
+    await game_write_buffer.stop()
+    replay_verifier.stop()
+    await websocket.stop_event_bus()
+    await async_engine.dispose()
     logger.info("👋 应用关闭")
+    shutdown_logging()
 
 
 # 创建FastAPI应用实例
@@ -32,6 +58,14 @@ app = FastAPI(
 )
 
 
+# 速率限制中间件（在 CORS 内层，429 响应同样带有 CORS 头）
+app.add_middleware(RateLimitMiddleware)
+
+# 请求指标中间件（在速率限制外层，被拒绝的请求同样计数）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    install_sql_metrics()
+
 # CORS中间件配置
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +73,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Period-Start", "X-Period-End"],
 )
 
 
@@ -57,6 +92,9 @@ async def root():
 # 注册路由
 app.include_router(games.router)
 app.include_router(websocket.router)
+app.include_router(admin.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
 """
 中间件模块
 """
-from .rate_limit import limiter
+from .metrics import MetricsMiddleware
+from .rate_limit import (
+    MemoryBucketStore, RateLimitMiddleware, SharedMemoryBucketStore,
+    create_rate_limit_store, parse_rate,
+)
 
-__all__ = ['limiter']
+__all__ = [
+    'MetricsMiddleware', 'RateLimitMiddleware', 'MemoryBucketStore', 'SharedMemoryBucketStore',
+    'create_rate_limit_store', 'parse_rate',
+]
@@ -0,0 +1,36 @@
+"""
+请求指标中间件
+"""
+import time
+
+from ..utils.metrics import http_request_duration, http_requests
+
+
+class MetricsMiddleware:
+    """按路由模板记录HTTP请求数与耗时的 ASGI 中间件"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 scope 中带有 route，用路由模板作标签，避免路径参数造成标签爆炸
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method, path)
+            http_requests.inc(method, path, str(status[0]))
@@ -1,33 +1,246 @@
 """
 API速率限制中间件
+
+原生 ASGI 中间件，按 (路由, 客户端地址) 维护令牌桶：
+- 每个桶只保存 (令牌数, 上次更新时间, 补满时间)，每次检查 O(1)
+- 路由按 "METHOD path" 精确匹配 RATE_LIMIT_ROUTES，其余请求使用 RATE_LIMIT_DEFAULT
+- 键数量有上限，按最近访问顺序淘汰；已补满的空闲桶与新建桶等价，顺带清理
+- 可选共享内存存储（shm://name），多个 worker 共用同一组令牌桶
 """
-from fastapi import Request
-from fastapi.responses import JSONResponse
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..config import settings
+from ..utils import json_codec
 from ..utils.logger import logger
 
-# 创建速率限制器
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200/minute"],  # 默认限制:每分钟200次请求
-    storage_uri="memory://",  # 使用内存存储(生产环境建议用Redis)
-)
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
 
 
-def custom_rate_limit_handler(request: Request, exc: RateLimitExceeded):
-    """自定义速率限制错误处理器"""
-    logger.warning(f"速率限制触发: {request.client.host if request.client else 'unknown'}")
-    return JSONResponse(
-        status_code=429,
-        content={
-            "error": "速率限制",
-            "message": "请求过于频繁,请稍后重试",
-            "retry_after": getattr(exc, 'retry_after', 60)
-        }
-    )
+class RateLimit(NamedTuple):
+    """令牌桶参数：容量（突发上限）与每秒补充的令牌数"""
+    capacity: float
+    rate: float
+
+
+def parse_rate(value: str) -> RateLimit:
+    """解析 "10/minute"、"5/10seconds" 形式的限制字符串"""
+    match = _RATE_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"无效的速率限制: {value}")
+    count, multiplier, period = match.groups()
+    seconds = _PERIODS[period] * int(multiplier or 1)
+    return RateLimit(float(count), int(count) / seconds)
+
+
+def _take(tokens: float, last: float, now: float, limit: RateLimit) -> Tuple[bool, float, float]:
+    """补充令牌后尝试取出一个，返回 (是否允许, 剩余令牌数, 需要等待的秒数)"""
+    tokens = min(limit.capacity, tokens + (now - last) * limit.rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / limit.rate
+
+
+class MemoryBucketStore:
+    """进程内令牌桶存储"""
+
+    def __init__(self, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [令牌数, 上次更新时间, 补满时间]，按最近访问排序
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        """消耗一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            bucket = buckets[key] = [limit.capacity, now, now]
+        else:
+            buckets.move_to_end(key)
+
+        allowed, tokens, retry_after = _take(bucket[0], bucket[1], now, limit)
+        bucket[0], bucket[1] = tokens, now
+        bucket[2] = now + (limit.capacity - tokens) / limit.rate
+        return allowed, retry_after
+
+    def _evict(self, now: float) -> None:
+        """新建桶前淘汰最久未访问的桶：达到上限时强制淘汰，否则最多清理两个已补满的空闲桶"""
+        buckets = self._buckets
+        while len(buckets) >= self.max_keys:
+            buckets.popitem(last=False)
+        for _ in range(2):
+            if not buckets:
+                break
+            key, bucket = next(iter(buckets.items()))
+            if bucket[2] > now:
+                break
+            del buckets[key]
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+
+class SharedMemoryBucketStore:
+    """
+    共享内存令牌桶存储
+
+    固定大小的开放寻址哈希表，映射到 /dev/shm 下的文件，多个进程通过文件锁互斥访问。
+    每个槽位保存 (键哈希, 令牌数, 上次更新时间, 补满时间)；探测范围内没有空位时
+    复用已补满的槽位或最久未访问的槽位，内存占用固定。
+    临界区只有一次探测和写入（几微秒），hit 在事件循环中直接以阻塞方式获取文件锁
+    """
+
+    _SLOT = struct.Struct("<Qddd")
+    _PROBES = 8
 
+    def __init__(self, name: str, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+        import fcntl
 
-# 设置自定义错误处理器
-_rate_limit_exceeded_handler = custom_rate_limit_handler
+        self._fcntl = fcntl
+        self.slots = max_keys
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.path = os.path.join(directory, name)
+        size = self.slots * self._SLOT.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            self._lock()
+            try:
+                os.ftruncate(self._fd, size)
+            finally:
+                self._unlock()
+        self._map = mmap.mmap(self._fd, size)
+
+    def _lock(self) -> None:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+
+    def _unlock(self) -> None:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # 0 表示空槽位
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") | 1
+
+    def hit(self, key: str, limit: RateLimit, now: float) -> Tuple[bool, float]:
+        """消耗一个令牌，返回 (是否允许, 需要等待的秒数)"""
+        key_hash = self._hash(key)
+        slot_size, unpack, pack = self._SLOT.size, self._SLOT.unpack_from, self._SLOT.pack_into
+        self._lock()
+        try:
+            target, tokens, last = None, limit.capacity, now
+            reusable, oldest, oldest_last = None, None, math.inf
+            for probe in range(self._PROBES):
+                offset = ((key_hash + probe) % self.slots) * slot_size
+                slot_hash, slot_tokens, slot_last, full_at = unpack(self._map, offset)
+                if slot_hash == key_hash:
+                    target, tokens, last = offset, slot_tokens, slot_last
+                    break
+                if reusable is None and (slot_hash == 0 or full_at <= now):
+                    reusable = offset
+                if slot_last < oldest_last:
+                    oldest, oldest_last = offset, slot_last
+            if target is None:
+                target = reusable if reusable is not None else oldest
+
+            allowed, tokens, retry_after = _take(tokens, last, now, limit)
+            full_at = now + (limit.capacity - tokens) / limit.rate
+            pack(self._map, target, key_hash, tokens, now, full_at)
+        finally:
+            self._unlock()
+        return allowed, retry_after
+
+    def clear(self) -> None:
+        self._lock()
+        try:
+            self._map[:] = bytes(len(self._map))
+        finally:
+            self._unlock()
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+def create_rate_limit_store(url: str = settings.RATE_LIMIT_STORAGE, max_keys: int = settings.RATE_LIMIT_MAX_KEYS):
+    """根据 URL 创建令牌桶存储：memory:// 或 shm://name"""
+    if not url or url == "memory://":
+        return MemoryBucketStore(max_keys)
+    if url.startswith("shm://"):
+        return SharedMemoryBucketStore(url[len("shm://"):], max_keys)
+    raise ValueError(f"不支持的速率限制存储: {url}")
+
+
+class RateLimitMiddleware:
+    """令牌桶速率限制中间件"""
+
+    def __init__(
+        self,
+        app,
+        routes: Optional[Dict[str, str]] = None,
+        default: Optional[str] = settings.RATE_LIMIT_DEFAULT,
+        store=None,
+        enabled: bool = settings.RATE_LIMIT_ENABLED,
+    ):
+        self.app = app
+        self.enabled = enabled
+        routes = settings.RATE_LIMIT_ROUTES if routes is None else routes
+        # (method, path) -> (桶键前缀, 限制)
+        self.routes: Dict[Tuple[str, str], Tuple[str, RateLimit]] = {}
+        for route, value in routes.items():
+            method, path = route.split(None, 1)
+            self.routes[(method.upper(), path)] = (route, parse_rate(value))
+        self.default = ("*", parse_rate(default)) if default else None
+        self.store = store if store is not None else create_rate_limit_store()
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.routes.get((scope["method"], scope["path"]), self.default)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        prefix, limit = rule
+        client = scope.get("client")
+        host = client[0] if client else "unknown"
+        allowed, retry_after = self.store.hit(f"{prefix}|{host}", limit, time.monotonic())
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        self.rejected += 1
+        logger.warning("速率限制触发: %s %s", host, prefix)
+        await self._reject(send, math.ceil(retry_after))
+
+    async def _reject(self, send, retry_after: int) -> None:
+        body = json_codec.dumps_bytes({
+            "error": "速率限制",
+            "message": "请求过于频繁,请稍后重试",
+            "retry_after": retry_after,
+        })
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -18,10 +18,11 @@ class Game(Base):
     play_time = Column(Integer, nullable=False, comment="游戏时长(秒)")
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, comment="创建时间")
 
-    # 复合索引，优化排行榜和玩家统计查询
+    # 复合索引，优化排行榜、历史记录游标分页和玩家统计（含玩家最高分记录）查询
     __table_args__ = (
         Index('idx_score_created', 'score', 'created_at'),
-        Index('idx_player_name', 'player_name'),
+        Index('idx_created_id', 'created_at', 'id'),
+        Index('idx_player_score', 'player_name', 'score'),
     )
 
     def __repr__(self):
@@ -0,0 +1,36 @@
+"""
+异常扫描结果数据库模型
+标记单独存放，games 表结构与写入路径不受影响
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer
+from ..database.base import Base
+
+
+class GameFlag(Base):
+    """被异常扫描标记的游戏记录"""
+    __tablename__ = 'game_flags'
+
+    game_id = Column(Integer, ForeignKey('games.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    reasons = Column(Integer, nullable=False, comment="命中规则的位掩码（见 services/anomaly_scan.py）")
+    scan_id = Column(Integer, nullable=False, comment="标记该记录的扫描")
+
+    def __repr__(self):
+        return f"<GameFlag(game_id={self.game_id}, reasons={self.reasons})>"
+
+
+class AnomalyScan(Base):
+    """异常扫描运行记录，最大的 last_game_id 即增量扫描的起点"""
+    __tablename__ = 'anomaly_scans'
+
+    id = Column(Integer, primary_key=True)
+    full = Column(Boolean, nullable=False, default=False, comment="是否为全量扫描")
+    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, comment="开始时间")
+    finished_at = Column(DateTime, nullable=True, comment="完成时间，中断的扫描为空")
+    last_game_id = Column(Integer, nullable=False, default=0, comment="已扫描到的最大游戏ID")
+    rows_scanned = Column(Integer, nullable=False, default=0, comment="扫描记录数")
+    rows_flagged = Column(Integer, nullable=False, default=0, comment="标记记录数")
+
+    def __repr__(self):
+        return f"<AnomalyScan(id={self.id}, last_game_id={self.last_game_id})>"
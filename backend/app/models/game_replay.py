@@ -0,0 +1,18 @@
+"""
+对局回放数据库模型
+回放单独存放，排行榜与历史记录扫描 games 表时不会读到回放数据
+"""
+from sqlalchemy import Column, ForeignKey, Integer, LargeBinary
+from ..database.base import Base
+
+
+class GameReplayBlob(Base):
+    """对局回放模型（编码格式见 services/replay_format.py）"""
+    __tablename__ = 'game_replays'
+
+    # INTEGER 主键即 SQLite 的 rowid，可按游戏ID直接打开 BLOB 增量读取
+    game_id = Column(Integer, ForeignKey('games.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    data = Column(LargeBinary, nullable=False, comment="编码后的回放")
+
+    def __repr__(self):
+        return f"<GameReplayBlob(game_id={self.game_id}, size={len(self.data or b'')})>"
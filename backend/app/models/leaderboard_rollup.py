@@ -0,0 +1,40 @@
+"""
+周期排行榜数据库模型
+进行中的周期保存前 N 名汇总（与 games 表在同一事务中维护），已结束的周期冻结为快照
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, String, Text
+from ..database.base import Base
+
+
+class LeaderboardRollup(Base):
+    """周期排行榜汇总：每个周期只保留前 N 名（见 services/period_leaderboard.py）"""
+    __tablename__ = 'leaderboard_rollups'
+
+    period = Column(String(10), primary_key=True, comment="周期类型：day / week / month / season")
+    period_start = Column(Date, primary_key=True, comment="周期开始日期（LEADERBOARD_TIMEZONE 本地日期）")
+    game_id = Column(Integer, ForeignKey('games.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    score = Column(Integer, nullable=False, comment="分数（排序键）")
+    created_at = Column(DateTime, nullable=False, comment="创建时间（同分时的排序键）")
+
+    # 修改、删除记录时按游戏ID查找其所在的周期
+    __table_args__ = (
+        Index('idx_rollup_game', 'game_id'),
+    )
+
+    def __repr__(self):
+        return f"<LeaderboardRollup(period={self.period}, start={self.period_start}, game_id={self.game_id})>"
+
+
+class LeaderboardSnapshot(Base):
+    """已结束周期的排行榜快照，冻结后不再变化"""
+    __tablename__ = 'leaderboard_snapshots'
+
+    period = Column(String(10), primary_key=True, comment="周期类型")
+    period_start = Column(Date, primary_key=True, comment="周期开始日期")
+    entries = Column(Text, nullable=False, comment="前 N 名记录的 JSON 数组（GameResponse 字段）")
+    frozen_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, comment="冻结时间")
+
+    def __repr__(self):
+        return f"<LeaderboardSnapshot(period={self.period}, start={self.period_start})>"
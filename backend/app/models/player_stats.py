@@ -0,0 +1,29 @@
+"""
+玩家统计汇总数据库模型
+与 games 表在同一事务中增量维护，统计查询只需一次主键查找
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, String
+from ..database.base import Base
+
+
+class PlayerStats(Base):
+    """玩家统计汇总模型"""
+    __tablename__ = 'player_stats'
+
+    player_name = Column(String(50), primary_key=True, comment="玩家名称")
+    total_games = Column(Integer, nullable=False, default=0, comment="游戏局数")
+    highest_score = Column(Integer, nullable=False, default=0, comment="最高分")
+    total_play_time = Column(Integer, nullable=False, default=0, comment="总游戏时长(秒)")
+    level_sum = Column(Integer, nullable=False, default=0, comment="等级之和，用于计算平均等级")
+    highest_level = Column(Integer, nullable=False, default=0, comment="最高等级")
+    # 最高分对应的记录：同分时取最早创建的一条（ID 较小者优先）
+    best_game_id = Column(Integer, nullable=True, comment="最高分记录ID")
+    best_created_at = Column(DateTime, nullable=True, comment="最高分记录的创建时间")
+
+    # 每名玩家只出现一次的排行榜：按最高分降序、先达到者优先
+    __table_args__ = (
+        Index('idx_player_best', highest_score.desc(), best_created_at, best_game_id),
+    )
+
+    def __repr__(self):
+        return f"<PlayerStats(player={self.player_name}, games={self.total_games})>"
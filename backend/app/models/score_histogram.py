@@ -0,0 +1,18 @@
+"""
+分数分布汇总数据库模型
+与 games 表在同一事务中增量维护，分布与百分位查询无需扫描 games 表
+"""
+from sqlalchemy import Column, Integer
+from ..database.base import Base
+
+
+class ScoreHistogram(Base):
+    """各等级每个分数桶的记录数（分桶规则见 services/score_sketch.py）"""
+    __tablename__ = 'score_histogram'
+
+    level = Column(Integer, primary_key=True, autoincrement=False, comment="等级")
+    bucket = Column(Integer, primary_key=True, autoincrement=False, comment="分数桶号")
+    count = Column(Integer, nullable=False, default=0, comment="记录数")
+
+    def __repr__(self):
+        return f"<ScoreHistogram(level={self.level}, bucket={self.bucket}, count={self.count})>"
@@ -1,11 +1,13 @@
 """
 游戏记录相关的Pydantic模式
 """
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
 from typing import Optional
 import re
 
+from ..config import settings
+
 
 class GameBase(BaseModel):
     """游戏记录基础字段"""
@@ -24,9 +26,38 @@ class GameBase(BaseModel):
         return v.strip()
 
 
+class GameReplay(BaseModel):
+    """对局回放：方块序列种子与操作序列"""
+    seed: int = Field(..., ge=0, le=0xFFFFFFFF, description="方块序列随机种子（32位无符号整数）")
+    actions: str = Field(
+        ..., max_length=settings.REPLAY_MAX_ACTIONS, pattern=r"^[LRDHU]*$",
+        description="操作序列：L左移 R右移 D下移 H硬降 U旋转",
+    )
+    timestamps: Optional[list[int]] = Field(
+        None, description="各操作距开局的毫秒数（非递减），与 actions 一一对应，随回放一起保存"
+    )
+
+    @model_validator(mode='after')
+    def validate_timestamps(self) -> 'GameReplay':
+        """验证时间戳与操作一一对应且非递减"""
+        if self.timestamps is None:
+            return self
+        if len(self.timestamps) != len(self.actions):
+            raise ValueError('timestamps 与 actions 长度不一致')
+        previous = 0
+        for timestamp in self.timestamps:
+            if timestamp < previous:
+                raise ValueError('timestamps 必须为非负且非递减')
+            previous = timestamp
+        return self
+
+
 class GameCreate(GameBase):
     """创建游戏记录的请求模式"""
-    pass
+    # 只用于校验，不写入 games 表
+    replay: Optional[GameReplay] = Field(
+        None, exclude=True, description="对局回放，提供时服务端重放并校验分数、消除行数与等级，并随记录保存"
+    )
 
 
 class GameUpdate(BaseModel):
@@ -47,6 +78,63 @@ class GameResponse(GameBase):
         from_attributes = True  # 从ORM模型自动生成
 
 
+# GameResponse 的字段顺序，列表接口按此顺序直接编码列元组（不逐行构造模型）
+GAME_RESPONSE_FIELDS = tuple(GameResponse.model_fields)
+
+
 class LeaderBoardEntry(GameResponse):
     """排行榜条目"""
     pass
+
+
+class RankedLeaderBoardEntry(LeaderBoardEntry):
+    """带名次的排行榜条目"""
+    rank: int = Field(description="全局名次（从1开始）")
+
+
+class GameRankResponse(BaseModel):
+    """游戏记录名次"""
+    game_id: int
+    score: int
+    rank: int = Field(description="全局名次（从1开始）")
+    total: int = Field(description="排行榜记录总数")
+
+
+class LeaderBoardAroundResponse(GameRankResponse):
+    """游戏记录附近的排行榜窗口"""
+    entries: list[RankedLeaderBoardEntry]
+
+
+class GamePercentileResponse(BaseModel):
+    """游戏记录分数超过的记录比例（由分数分布汇总估算）"""
+    game_id: int
+    score: int
+    level: int
+    percentile: float = Field(description="分数低于该记录的记录占比（百分数）")
+    total: int = Field(description="记录总数")
+    level_percentile: float = Field(description="同等级记录中分数低于该记录的占比（百分数）")
+    level_total: int = Field(description="同等级记录总数")
+
+
+class HistogramBin(BaseModel):
+    """直方图分组 [start, end)"""
+    start: int
+    end: int
+    count: int
+
+
+class ScoreDistribution(BaseModel):
+    """分数分布"""
+    total: int = Field(description="记录总数")
+    percentiles: dict[str, Optional[int]] = Field(description="分位数，如 p50 / p90 / p99；没有记录时为 null")
+    histogram: list[HistogramBin]
+
+
+class LevelScoreDistribution(ScoreDistribution):
+    """单个等级的分数分布"""
+    level: int
+
+
+class ScoreDistributionResponse(ScoreDistribution):
+    """整体及各等级的分数分布"""
+    levels: list[LevelScoreDistribution]
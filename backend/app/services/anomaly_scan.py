@@ -0,0 +1,253 @@
+"""
+游戏记录异常扫描
+
+按主键顺序分块读取 games 表，每块转换为 NumPy 列数组后整体判断，
+命中规则的记录写入 game_flags 表（reasons 为规则位掩码）：
+
+- LEVEL：等级与消除行数不符（等级由行数唯一确定）
+- SCORE_LINES：分数不可能由该行数得到。每消除一行至少得 100 × 当时等级（单行消除），
+  至多得 200 × 当时等级（四行消除），且总是 100 的整数倍
+- LINE_RATE：每秒消除行数超过 ANOMALY_MAX_LINES_PER_SECOND
+- SCORE_RATE：每秒得分超过以该速率全部四行消除、且一直处于最终等级时的得分
+- PLAYER_JUMP：分数超过该玩家此前最高分的 ANOMALY_JUMP_FACTOR 倍
+
+内存占用只与块大小和玩家数有关（每名玩家保留对局数与最高分），与表的行数无关。
+每块的标记与扫描进度在同一事务中提交，增量扫描从上次扫描到的最大ID之后继续，
+更新过的旧记录不会被重新扫描，需要时使用全量扫描
+
+numpy 为可选依赖，只有异常扫描需要
+"""
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖
+    np = None
+
+from ..config import settings
+from ..database.init_db import create_schema
+from ..models.game import Game
+from ..models.game_flag import AnomalyScan, GameFlag
+
+FLAG_LEVEL = 1
+FLAG_SCORE_LINES = 2
+FLAG_LINE_RATE = 4
+FLAG_SCORE_RATE = 8
+FLAG_PLAYER_JUMP = 16
+
+FLAG_NAMES = {
+    FLAG_LEVEL: "level",
+    FLAG_SCORE_LINES: "score_lines",
+    FLAG_LINE_RATE: "line_rate",
+    FLAG_SCORE_RATE: "score_rate",
+    FLAG_PLAYER_JUMP: "player_jump",
+}
+
+MAX_LEVEL = 20
+
+_SCAN_COLUMNS = (Game.id, Game.player_name, Game.score, Game.level, Game.lines, Game.play_time)
+# 增量扫描时按玩家查询历史状态，每次 IN 查询的玩家数
+_STATE_QUERY_BATCH = 500
+
+# 玩家状态：(此前对局数, 此前最高分)
+PlayerState = Tuple[int, int]
+
+
+def flag_names(reasons: int) -> List[str]:
+    """位掩码转换为规则名称列表"""
+    return [name for flag, name in FLAG_NAMES.items() if reasons & flag]
+
+
+class ScanResult(NamedTuple):
+    """扫描结果"""
+    scan_id: int
+    rows: int
+    flagged: int
+    last_game_id: int
+    reasons: Dict[str, int]  # 各规则命中的记录数
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("异常扫描需要 numpy：pip install numpy")
+
+
+def level_weighted_lines(lines: "np.ndarray") -> "np.ndarray":
+    """sum(每行消除时的等级)，等级每 LINES_PER_LEVEL 行升一级，最高 MAX_LEVEL（向量化）"""
+    per_level = settings.LINES_PER_LEVEL
+    full = np.minimum(lines // per_level, MAX_LEVEL - 1)
+    return per_level * full * (full + 1) // 2 + (lines - per_level * full) * (full + 1)
+
+
+class AnomalyScanner:
+    """游戏记录异常扫描"""
+
+    def __init__(
+        self,
+        chunk_size: int = settings.ANOMALY_SCAN_CHUNK_SIZE,
+        max_lines_per_second: float = settings.ANOMALY_MAX_LINES_PER_SECOND,
+        jump_factor: float = settings.ANOMALY_JUMP_FACTOR,
+        jump_min_games: int = settings.ANOMALY_JUMP_MIN_GAMES,
+        jump_min_score: int = settings.ANOMALY_JUMP_MIN_SCORE,
+    ):
+        self.chunk_size = chunk_size
+        self.max_lines_per_second = max_lines_per_second
+        self.jump_factor = jump_factor
+        self.jump_min_games = jump_min_games
+        self.jump_min_score = jump_min_score
+
+    def rule_flags(self, score, level, lines, play_time) -> "np.ndarray":
+        """逐行规则（不依赖其他记录）"""
+        flags = np.zeros(len(score), dtype=np.int64)
+        expected_level = np.minimum(lines // settings.LINES_PER_LEVEL + 1, MAX_LEVEL)
+        flags[level != expected_level] |= FLAG_LEVEL
+
+        weighted = level_weighted_lines(lines)
+        impossible = (score < 100 * weighted) | (score > 200 * weighted) | (score % 100 != 0)
+        flags[impossible] |= FLAG_SCORE_LINES
+
+        max_lines = play_time * self.max_lines_per_second
+        flags[lines > max_lines] |= FLAG_LINE_RATE
+        flags[score > max_lines * 200 * level] |= FLAG_SCORE_RATE
+        return flags
+
+    def jump_flags(self, ids, names, score, state: Dict[str, PlayerState]) -> "np.ndarray":
+        """
+        分数突增：与该玩家此前（按ID顺序）的最高分比较，并更新 state
+
+        按 (玩家, ID) 排序后，给每组分数加上 组号 × 偏移量 再求累计最大值，
+        前面组的值总小于后面组，累计最大值不会跨组，从而得到组内的前缀最高分
+        """
+        flags = np.zeros(len(ids), dtype=np.int64)
+        if not len(ids):
+            return flags
+        players, group = np.unique(names, return_inverse=True)
+        initial = [state.get(name, (0, 0)) for name in players]
+        initial_games = np.array([games for games, _ in initial], dtype=np.int64)
+        initial_best = np.array([best for _, best in initial], dtype=np.int64)
+
+        order = np.lexsort((ids, group))
+        group, score = group[order], score[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        ends = np.r_[starts[1:], len(group)] - 1
+        position = np.arange(len(group)) - np.repeat(starts, np.diff(np.r_[starts, len(group)]))
+
+        offset = group * (int(score.max()) + 1)
+        running = np.maximum.accumulate(score + offset) - offset
+        previous = np.empty_like(running)
+        previous[0] = 0
+        previous[1:] = running[:-1]
+        previous[starts] = 0
+        previous_best = np.maximum(previous, initial_best[group])
+        games_before = position + initial_games[group]
+
+        jump = (
+            (games_before >= self.jump_min_games)
+            & (score >= self.jump_min_score)
+            & (score > self.jump_factor * np.maximum(previous_best, 1))
+        )
+        flags[order[jump]] = FLAG_PLAYER_JUMP
+
+        last_games = games_before[ends] + 1
+        last_best = np.maximum(running[ends], initial_best)
+        for name, games, best in zip(players.tolist(), last_games.tolist(), last_best.tolist()):
+            state[name] = (games, best)
+        return flags
+
+    def _load_state(self, conn: Connection, names, before_id: int, state: Dict[str, PlayerState]) -> None:
+        """增量扫描时补充本次扫描之前的玩家状态"""
+        missing = [name for name in set(names.tolist()) if name not in state]
+        for start in range(0, len(missing), _STATE_QUERY_BATCH):
+            batch = missing[start:start + _STATE_QUERY_BATCH]
+            for name in batch:
+                state[name] = (0, 0)
+            rows = conn.execute(
+                select(Game.player_name, func.count(), func.max(Game.score))
+                .where(Game.id <= before_id, Game.player_name.in_(batch))
+                .group_by(Game.player_name)
+            )
+            for name, games, best in rows:
+                state[name] = (games, best)
+
+    def scan(
+        self,
+        engine: Engine,
+        full: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> ScanResult:
+        """
+        扫描 games 表并写入标记
+
+        full=True 时清空已有标记后从头扫描，否则只扫描上次扫描之后新增的记录；
+        progress(已扫描, 已标记) 在每块提交后调用
+        """
+        _require_numpy()
+        with engine.begin() as conn:
+            create_schema(conn)
+
+        state: Dict[str, PlayerState] = {}
+        counts = dict.fromkeys(FLAG_NAMES.values(), 0)
+        scanned = flagged = 0
+        with engine.connect() as conn:
+            if full:
+                conn.execute(delete(GameFlag))
+                baseline = 0
+            else:
+                baseline = conn.scalar(select(func.coalesce(func.max(AnomalyScan.last_game_id), 0)))
+            scan_id = conn.execute(
+                insert(AnomalyScan).values(full=full, last_game_id=baseline).returning(AnomalyScan.id)
+            ).scalar_one()
+            conn.commit()
+
+            last_id = baseline
+            while True:
+                rows = conn.execute(
+                    select(*_SCAN_COLUMNS).where(Game.id > last_id).order_by(Game.id).limit(self.chunk_size)
+                ).all()
+                if not rows:
+                    break
+                ids, names, score, level, lines, play_time = zip(*rows)
+                ids = np.array(ids, dtype=np.int64)
+                names = np.array(names, dtype=object)
+                score = np.array(score, dtype=np.int64)
+
+                if baseline:
+                    self._load_state(conn, names, baseline, state)
+                reasons = self.rule_flags(
+                    score, np.array(level, dtype=np.int64),
+                    np.array(lines, dtype=np.int64), np.array(play_time, dtype=np.int64),
+                ) | self.jump_flags(ids, names, score, state)
+
+                hits = np.flatnonzero(reasons)
+                if len(hits):
+                    conn.execute(insert(GameFlag), [
+                        {"game_id": game_id, "reasons": value, "scan_id": scan_id}
+                        for game_id, value in zip(ids[hits].tolist(), reasons[hits].tolist())
+                    ])
+                    for flag, name in FLAG_NAMES.items():
+                        counts[name] += int(np.count_nonzero(reasons[hits] & flag))
+
+                last_id = int(ids[-1])
+                scanned += len(ids)
+                flagged += len(hits)
+                conn.execute(
+                    update(AnomalyScan).where(AnomalyScan.id == scan_id)
+                    .values(last_game_id=last_id, rows_scanned=scanned, rows_flagged=flagged)
+                )
+                conn.commit()
+                if progress is not None:
+                    progress(scanned, flagged)
+
+            conn.execute(
+                update(AnomalyScan).where(AnomalyScan.id == scan_id)
+                .values(finished_at=datetime.now(timezone.utc))
+            )
+            conn.commit()
+        return ScanResult(scan_id, scanned, flagged, last_id, counts)
+
+
+anomaly_scanner = AnomalyScanner()
@@ -0,0 +1,122 @@
+"""
+游戏业务逻辑服务（异步版本）
+
+通过 AsyncSession.run_sync 复用 GameService 的同步实现：
+SQL 在异步驱动中执行，等待数据库期间事件循环可以处理其他请求和 WebSocket 连接
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.game import Game
+from ..schemas.game import GameCreate, GameUpdate
+from .game_service import GameService, game_service
+from .leaderboard_index import LeaderboardIndex, LeaderboardRow, leaderboard_indexes
+from .period_leaderboard import PeriodLeaderboard
+
+
+class AsyncGameService:
+    """游戏业务服务类（异步）"""
+
+    def __init__(self, service: GameService):
+        self._service = service
+
+    async def save_game_record(self, db: AsyncSession, game_data: GameCreate) -> Game:
+        """保存游戏记录到数据库"""
+        return await db.run_sync(self._service.save_game_record, game_data)
+
+    async def save_game_records(self, db: AsyncSession, games_data: List[GameCreate]) -> List[LeaderboardRow]:
+        """批量保存游戏记录"""
+        return await db.run_sync(self._service.save_game_records, games_data)
+
+    async def get_game_history(
+        self, db: AsyncSession, skip: int = 0, limit: int = 20, after: Optional[str] = None
+    ) -> List[Row]:
+        """获取游戏历史记录"""
+        return await db.run_sync(self._service.get_game_history, skip, limit, after)
+
+    async def get_top_scores(self, db: AsyncSession, limit: int = 10) -> List[LeaderboardRow]:
+        """获取排行榜前 N 名"""
+        return await db.run_sync(self._service.get_top_scores, limit)
+
+    async def get_top_players(self, db: AsyncSession, limit: int = 10) -> List[Row]:
+        """获取每名玩家只出现一次的排行榜"""
+        return await db.run_sync(self._service.get_top_players, limit)
+
+    async def get_period_leaderboard(
+        self, db: AsyncSession, period: str, day: date, limit: int = 10
+    ) -> PeriodLeaderboard:
+        """获取日/周/月/赛季排行榜"""
+        return await db.run_sync(self._service.get_period_leaderboard, period, day, limit)
+
+    async def get_first_game_day(self, db: AsyncSession) -> Optional[date]:
+        """获取最早一条记录的本地日期"""
+        return await db.run_sync(self._service.get_first_game_day)
+
+    async def get_game_row(self, db: AsyncSession, game_id: int) -> Optional[LeaderboardRow]:
+        """按ID获取记录快照（索引中没有时读取数据库）"""
+        return await db.run_sync(self._service.get_game_row, game_id)
+
+    async def get_game_rank(self, db: AsyncSession, game_id: int) -> Optional[dict]:
+        """获取记录的全局名次"""
+        return await db.run_sync(self._service.get_game_rank, game_id)
+
+    async def get_leaderboard_around(self, db: AsyncSession, game_id: int, radius: int = 5) -> Optional[dict]:
+        """获取记录附近的排行榜窗口"""
+        return await db.run_sync(self._service.get_leaderboard_around, game_id, radius)
+
+    async def get_game_by_id(self, db: AsyncSession, game_id: int) -> Optional[Game]:
+        """根据ID获取游戏记录"""
+        return await db.run_sync(self._service.get_game_by_id, game_id)
+
+    async def get_replay(self, db: AsyncSession, game_id: int) -> Optional[bytes]:
+        """读取整段回放"""
+        return await db.run_sync(self._service.get_replay, game_id)
+
+    async def is_high_score(self, db: AsyncSession, score: int) -> bool:
+        """判断是否为高分（进入前10）"""
+        return await db.run_sync(self._service.is_high_score, score)
+
+    async def update_game_record(self, db: AsyncSession, game_id: int, game_data: GameUpdate) -> Optional[Game]:
+        """更新游戏记录"""
+        return await db.run_sync(self._service.update_game_record, game_id, game_data)
+
+    async def delete_game_record(self, db: AsyncSession, game_id: int) -> bool:
+        """删除游戏记录"""
+        return await db.run_sync(self._service.delete_game_record, game_id)
+
+    async def get_player_stats(self, db: AsyncSession, player_name: str) -> dict:
+        """获取玩家统计信息"""
+        return await db.run_sync(self._service.get_player_stats, player_name)
+
+    async def get_score_distribution(self, db: AsyncSession, quantiles: List[float], bins: int = 20) -> dict:
+        """获取整体及各等级的分数分布"""
+        return await db.run_sync(self._service.get_score_distribution, quantiles, bins)
+
+    async def get_game_percentile(self, db: AsyncSession, game_id: int) -> Optional[dict]:
+        """获取记录分数超过的记录比例"""
+        return await db.run_sync(self._service.get_game_percentile, game_id)
+
+    async def get_leaderboard_index(self, db: AsyncSession) -> LeaderboardIndex:
+        """获取排行榜内存索引，已加载且前列缓存完整时直接返回，无需进入同步上下文"""
+        index = leaderboard_indexes.peek(db.bind)
+        if index is None or index.needs_refill:
+            index = await db.run_sync(leaderboard_indexes.get)
+        return index
+
+    async def load_leaderboard_index(self, db: AsyncSession) -> int:
+        """（重新）加载排行榜内存索引"""
+        return await db.run_sync(self._service.load_leaderboard_index)
+
+    async def check_leaderboard_index(self, db: AsyncSession, repair: bool = False) -> dict:
+        """校验排行榜内存索引与 games 表是否一致"""
+        return await db.run_sync(self._service.check_leaderboard_index, repair)
+
+    async def get_flagged_games(self, db: AsyncSession, limit: int = 50, before: Optional[int] = None) -> List[dict]:
+        """异常扫描标记的记录"""
+        return await db.run_sync(self._service.get_flagged_games, limit, before)
+
+
+async_game_service = AsyncGameService(game_service)
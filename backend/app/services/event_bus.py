@@ -0,0 +1,289 @@
+"""
+跨进程事件总线
+
+多个 uvicorn worker 各自持有 WebSocket 连接，某个 worker 上的写入需要推送给所有 worker 的客户端。
+发布的事件立即交给本进程的处理函数，同时按批（EVENT_BUS_FLUSH_MS 毫秒或 EVENT_BUS_MAX_BATCH 条）
+写入传输层，其他进程收到整批后再交给各自的处理函数。
+
+后端：
+- memory://            仅本进程（单 worker 部署，无传输开销）
+- sqlite:///path.db    同一台机器上的多进程，事件批次写入共享的 SQLite 事件日志并轮询读取
+
+发送失败的批次放回队首，每隔 EVENT_BUS_RETRY_MS 毫秒重试；待发送事件超过 EVENT_BUS_MAX_PENDING 条时
+丢弃最旧的事件，并在队首插入 resync 事件。接收方发现漏收（resync 事件或事件日志中的 id 不连续）时
+处理函数会收到 resync 事件，应从数据库重新加载依赖事件维护的状态。
+
+新增后端（如 Redis pub/sub）只需继承 EventBus，实现 _open / _close / _send_batch，
+并在收到其他进程的批次时调用 _deliver
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import secrets
+import sqlite3
+import time
+from typing import Any, Callable, List, Optional
+
+from ..config import settings
+from ..utils import json_codec
+from ..utils.logger import logger
+
+# 处理函数：handler(events, remote)，remote 表示事件来自其他进程
+EventHandler = Callable[[List[dict], bool], None]
+
+# 接收方可能漏收了事件，需要重新同步
+RESYNC_EVENT = {"type": "resync"}
+
+
+class EventBus(ABC):
+    """事件总线基类，负责本地投递与批量发送"""
+
+    def __init__(
+        self,
+        handler: Optional[EventHandler] = None,
+        flush_interval_ms: float = settings.EVENT_BUS_FLUSH_MS,
+        max_batch: int = settings.EVENT_BUS_MAX_BATCH,
+        retry_interval_ms: float = settings.EVENT_BUS_RETRY_MS,
+        max_pending: int = settings.EVENT_BUS_MAX_PENDING,
+    ):
+        self.handler = handler
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval_ms / 1000
+        self.max_pending = max_pending
+        # 进程标识，用于跳过自己发出的批次
+        self.node_id = secrets.token_hex(8)
+        self._pending: List[dict] = []
+        self._has_pending: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.batches_sent = 0
+        self.send_failures = 0
+        self.dropped = 0
+
+    @property
+    def remote(self) -> bool:
+        """是否需要向其他进程发送事件"""
+        return True
+
+    async def start(self, handler: Optional[EventHandler] = None) -> None:
+        """启动总线（需在事件循环中调用）"""
+        if handler is not None:
+            self.handler = handler
+        if not self.remote or self._flusher is not None:
+            return
+        await self._open()
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """停止总线，未发送的事件先全部发出"""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+        self._flusher = None
+        if self._pending and not await self._send(self._pending):
+            logger.warning("事件总线关闭，丢弃 %d 条未发送的事件", len(self._pending))
+        self._pending = []
+        await self._close()
+
+    def publish(self, event: dict) -> None:
+        """发布事件：立即在本进程处理，并排队发送给其他进程"""
+        self.published += 1
+        if self.handler is not None:
+            self.handler([event], False)
+        if self._flusher is None:
+            return
+        self._pending.append(event)
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = self._pending, []
+            self._has_pending.clear()
+            self._full.clear()
+            if not await self._send(batch):
+                self._requeue(batch)
+                await asyncio.sleep(self.retry_interval)
+
+    async def _send(self, batch: List[dict]) -> bool:
+        """发送一个批次，返回是否成功"""
+        try:
+            await self._send_batch(batch)
+        except Exception as e:
+            # 传输失败只影响其他进程的推送，不影响本进程和写入请求
+            self.send_failures += 1
+            logger.warning("事件总线发送失败，%d 条事件稍后重试: %s", len(batch), e)
+            return False
+        self.batches_sent += 1
+        return True
+
+    def _requeue(self, batch: List[dict]) -> None:
+        """将发送失败的批次放回队首；超过上限时丢弃最旧的事件，并让其他进程重新同步"""
+        self._pending[:0] = batch
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess + 1]
+            self._pending.insert(0, RESYNC_EVENT)
+            self.dropped += excess + 1
+            logger.warning("事件总线待发送事件超过上限，丢弃最旧的 %d 条事件", excess + 1)
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    def _deliver(self, events: List[dict]) -> None:
+        """交付其他进程发来的一批事件"""
+        self.received += len(events)
+        if self.handler is None:
+            return
+        try:
+            self.handler(events, True)
+        except Exception as e:
+            logger.warning("事件总线处理失败: %s", e)
+
+    async def _open(self) -> None:
+        pass
+
+    async def _close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def _send_batch(self, batch: List[dict]) -> None:
+        """把一批事件发送给其他进程，失败时抛出异常（批次会被重试）"""
+
+
+class InProcessEventBus(EventBus):
+    """进程内事件总线，只做本地投递"""
+
+    @property
+    def remote(self) -> bool:
+        return False
+
+    async def _send_batch(self, batch: List[dict]) -> None:
+        # remote 为 False，总线不会启动发送协程，没有需要发送的批次
+        pass
+
+
+class SQLiteEventBus(EventBus):
+    """
+    基于共享 SQLite 事件日志的多进程事件总线
+
+    每个批次写入一行（JSON 数组），各进程定期读取比上次更新的行；
+    超过 EVENT_BUS_RETENTION_S 秒的行在写入时顺带清理。
+    行 id 由 AUTOINCREMENT 连续分配，读到的 id 不连续说明中间的行在读取前已被清理，此时投递 resync 事件
+    """
+
+    def __init__(
+        self,
+        path: str,
+        handler: Optional[EventHandler] = None,
+        poll_interval_ms: float = settings.EVENT_BUS_POLL_MS,
+        retention_s: float = settings.EVENT_BUS_RETENTION_S,
+        **kwargs: Any,
+    ):
+        super().__init__(handler, **kwargs)
+        self.path = path
+        self.poll_interval = poll_interval_ms / 1000
+        self.retention = retention_s
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._last_id = 0
+        self._last_prune = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def _open_sync(self) -> None:
+        self._writer = self._connect()
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "payload BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._reader = self._connect()
+        # 只接收启动之后的事件；以最后分配的 id 为起点（旧行可能已全部清理）
+        row = self._reader.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        self._last_id = row[0] if row else 0
+
+    async def _open(self) -> None:
+        await asyncio.to_thread(self._open_sync)
+        self._poller = asyncio.create_task(self._poll_loop())
+
+    async def _close(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        for conn in (self._writer, self._reader):
+            if conn is not None:
+                conn.close()
+        self._writer = self._reader = None
+
+    def _write_sync(self, payload: bytes) -> None:
+        now = time.time()
+        self._writer.execute(
+            "INSERT INTO events (origin, payload, created_at) VALUES (?, ?, ?)",
+            (self.node_id, payload, now),
+        )
+        if now - self._last_prune > self.retention:
+            self._last_prune = now
+            self._writer.execute("DELETE FROM events WHERE created_at < ?", (now - self.retention,))
+
+    async def _send_batch(self, batch: List[dict]) -> None:
+        await asyncio.to_thread(self._write_sync, json_codec.dumps_bytes(batch))
+
+    def _read_sync(self) -> list:
+        return self._reader.execute(
+            "SELECT id, origin, payload FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._poll_once()
+
+    async def _poll_once(self) -> None:
+        try:
+            rows = await asyncio.to_thread(self._read_sync)
+        except sqlite3.Error as e:
+            logger.warning("读取事件日志失败: %s", e)
+            return
+        for row_id, origin, payload in rows:
+            if row_id != self._last_id + 1:
+                logger.warning("事件日志缺少 %d 条记录，重新同步", row_id - self._last_id - 1)
+                self._deliver([RESYNC_EVENT])
+            self._last_id = row_id
+            if origin != self.node_id:
+                self._deliver(json.loads(payload))
+
+
+def create_event_bus(url: str = settings.EVENT_BUS_URL, **kwargs: Any) -> EventBus:
+    """根据 URL 创建事件总线"""
+    if not url or url == "memory://":
+        return InProcessEventBus(**kwargs)
+    if url.startswith("sqlite:///"):
+        return SQLiteEventBus(url[len("sqlite:///"):], **kwargs)
+    raise ValueError(f"不支持的事件总线: {url}")
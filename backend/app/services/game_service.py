@@ -1,13 +1,49 @@
 """
 游戏业务逻辑服务
 """
-from datetime import datetime
-from typing import List, Optional
+import base64
+import binascii
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import Row, and_, case, delete, desc, func, insert, or_, select, tuple_, update
 
 from ..models.game import Game
-from ..schemas.game import GameCreate, GameUpdate, GameResponse
+from ..models.game_flag import GameFlag
+from ..models.game_replay import GameReplayBlob
+from ..models.player_stats import PlayerStats
+from ..models.score_histogram import ScoreHistogram
+from ..schemas.game import GAME_RESPONSE_FIELDS, GameCreate, GameReplay, GameUpdate, GameResponse
+from .anomaly_scan import flag_names
+from .leaderboard_index import LeaderboardIndex, LeaderboardRow, leaderboard_indexes, load_row
+from .period_leaderboard import PeriodLeaderboard, period_leaderboards
+from .replay_format import encode_replay
+from .score_sketch import ScoreSketch, bin_width, bucket_of, fraction_below, merge_sketches
+
+
+# 历史记录查询的列，顺序与 GameResponse 字段一致
+_HISTORY_COLUMNS = tuple(getattr(Game, name) for name in GAME_RESPONSE_FIELDS)
+
+
+def encode_history_cursor(game) -> str:
+    """将记录的 (created_at, id) 编码为不透明游标"""
+    raw = f"{game.created_at.isoformat()}|{game.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _encode_replay(replay: GameReplay) -> bytes:
+    return encode_replay(replay.seed, replay.actions, replay.timestamps)
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, game_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(game_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
 
 
 class GameService:
@@ -18,32 +54,183 @@ class GameService:
         try:
             game = Game(**game_data.model_dump())
             db.add(game)
+            db.flush()
+            if game_data.replay is not None:
+                db.add(GameReplayBlob(game_id=game.id, data=_encode_replay(game_data.replay)))
+            period_leaderboards.add(db, [game])
+            self._update_score_histogram(db, added=[(game.level, game.score)])
+            self._add_player_stats(
+                db, game.player_name, 1, game.score, game.play_time, game.level, game.level,
+                game.id, game.created_at,
+            )
             db.commit()
             db.refresh(game)
+            leaderboard_indexes.get(db).add(game)
             return game
         except Exception as e:
             db.rollback()
             raise
 
-    def get_game_history(self, db: Session, skip: int = 0, limit: int = 20) -> List[Game]:
-        """获取游戏历史记录"""
-        return db.query(Game)\
-            .order_by(desc(Game.created_at))\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
-
-    def get_top_scores(self, db: Session, limit: int = 10) -> List[Game]:
-        """获取排行榜前 N 名"""
-        return db.query(Game)\
-            .order_by(desc(Game.score), desc(Game.created_at))\
-            .limit(limit)\
-            .all()
+    def save_game_records(self, db: Session, games_data: List[GameCreate]) -> List[LeaderboardRow]:
+        """
+        批量保存游戏记录
+
+        单条 executemany 风格的 INSERT ... RETURNING 写入全部记录，附带的回放同样批量写入，
+        玩家统计按玩家合并后累加，周期排行榜汇总一次合并整批，整批在同一事务中提交
+        """
+        rows = [game_data.model_dump() for game_data in games_data]
+        try:
+            inserted = db.execute(
+                insert(Game).returning(Game.id, Game.created_at, sort_by_parameter_order=True),
+                rows
+            ).all()
+            replays = [
+                {"game_id": game_id, "data": _encode_replay(game_data.replay)}
+                for (game_id, _), game_data in zip(inserted, games_data)
+                if game_data.replay is not None
+            ]
+            if replays:
+                db.execute(insert(GameReplayBlob), replays)
+
+            saved = [
+                LeaderboardRow(
+                    game_id, row["player_name"], row["score"], row["level"],
+                    row["lines"], row["play_time"], created_at,
+                )
+                for (game_id, created_at), row in zip(inserted, rows)
+            ]
+            period_leaderboards.add(db, saved)
+            self._update_score_histogram(db, added=[(game.level, game.score) for game in saved])
+
+            totals = {}
+            for game in saved:
+                games, high_score, play_time, level_sum, high_level, best_id, best_at = totals.get(
+                    game.player_name, (0, -1, 0, 0, 0, None, None)
+                )
+                # 同分时保留批内较早的记录
+                best = game.score > high_score
+                totals[game.player_name] = (
+                    games + 1,
+                    game.score if best else high_score,
+                    play_time + game.play_time,
+                    level_sum + game.level,
+                    max(high_level, game.level),
+                    game.id if best else best_id,
+                    game.created_at if best else best_at,
+                )
+            for player_name, values in totals.items():
+                self._add_player_stats(db, player_name, *values)
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise
+
+        index = leaderboard_indexes.get(db)
+        for game in saved:
+            index.add(game)
+        return saved
+
+    def get_game_history(
+        self, db: Session, skip: int = 0, limit: int = 20, after: Optional[str] = None
+    ) -> List[Row]:
+        """
+        获取游戏历史记录
+
+        传入 after 游标时按 (created_at, id) 键集分页，走 idx_created_id 索引，
+        任意深度的分页开销与第一页相同；否则沿用 skip 偏移分页。
+        只查询列元组（顺序同 GAME_RESPONSE_FIELDS），不构造 ORM 对象
+        """
+        stmt = select(*_HISTORY_COLUMNS).order_by(desc(Game.created_at), desc(Game.id))
+        if after is not None:
+            created_at, game_id = decode_history_cursor(after)
+            stmt = stmt.where(tuple_(Game.created_at, Game.id) < tuple_(created_at, game_id))
+        else:
+            stmt = stmt.offset(skip)
+
+        return db.execute(stmt.limit(limit)).all()
+
+    def get_top_scores(self, db: Session, limit: int = 10) -> List[LeaderboardRow]:
+        """获取排行榜前 N 名（读取内存索引）"""
+        return leaderboard_indexes.get(db).top(limit)
+
+    def get_period_leaderboard(self, db: Session, period: str, day: date, limit: int = 10) -> PeriodLeaderboard:
+        """获取包含本地日期 day 的日/周/月/赛季排行榜（读取周期汇总或快照）"""
+        return period_leaderboards.get(db, period, day, limit)
+
+    def get_first_game_day(self, db: Session) -> Optional[date]:
+        """最早一条记录的本地日期（LEADERBOARD_TIMEZONE），没有记录时返回 None"""
+        return period_leaderboards.first_day(db)
+
+    def get_top_players(self, db: Session, limit: int = 10) -> List[Row]:
+        """
+        每名玩家只出现一次的排行榜（各自的最高分记录）
+
+        按 player_stats 的 idx_player_best 索引顺序读取前 limit 名玩家，再按主键取出记录；
+        同分时先达到该分数的玩家靠前。列顺序同 GAME_RESPONSE_FIELDS
+        """
+        return db.execute(
+            select(*_HISTORY_COLUMNS)
+            .select_from(PlayerStats)
+            .join(Game, Game.id == PlayerStats.best_game_id)
+            .order_by(desc(PlayerStats.highest_score), PlayerStats.best_created_at, PlayerStats.best_game_id)
+            .limit(limit)
+        ).all()
+
+    def _indexed_row(self, db: Session, game_id: int) -> Tuple[LeaderboardIndex, Optional[LeaderboardRow]]:
+        """
+        从排行榜索引获取记录快照
+
+        索引只缓存排名靠前的记录，其他记录读取 games 表；索引中缺少该记录或排序键已过期时
+        （其他 worker 的写入事件尚未送达或已丢失）顺带补入索引
+        """
+        index = leaderboard_indexes.get(db)
+        row = index.get(game_id)
+        if row is None:
+            row = load_row(db, game_id)
+            if row is not None:
+                index.refresh(row)
+        return index, row
+
+    def get_game_row(self, db: Session, game_id: int) -> Optional[LeaderboardRow]:
+        """按ID获取记录快照（索引优先，索引中没有时读取数据库），不存在时返回 None"""
+        return self._indexed_row(db, game_id)[1]
+
+    def get_game_rank(self, db: Session, game_id: int) -> Optional[dict]:
+        """获取记录的全局名次，记录不存在时返回 None（索引中没有时先从数据库补入）"""
+        index, row = self._indexed_row(db, game_id)
+        rank = None if row is None else index.rank(game_id)
+        if rank is None:
+            return None
+        return {"game_id": game_id, "score": row.score, "rank": rank, "total": len(index)}
+
+    def get_leaderboard_around(self, db: Session, game_id: int, radius: int = 5) -> Optional[dict]:
+        """获取记录前后各 radius 名的排行榜窗口，记录不存在时返回 None（索引中没有时先从数据库补入）"""
+        index, row = self._indexed_row(db, game_id)
+        rank = None if row is None else index.rank(game_id)
+        if rank is None:
+            return None
+        first = max(rank - radius, 1)
+        entries = [
+            {**row._asdict(), "rank": first + offset}
+            for offset, row in enumerate(index.range(first, rank + radius, db))
+        ]
+        return {
+            "game_id": game_id,
+            "score": entries[rank - first]["score"],
+            "rank": rank,
+            "total": len(index),
+            "entries": entries,
+        }
 
     def get_game_by_id(self, db: Session, game_id: int) -> Optional[Game]:
         """根据ID获取游戏记录"""
         return db.query(Game).filter(Game.id == game_id).first()
 
+    def get_replay(self, db: Session, game_id: int) -> Optional[bytes]:
+        """读取整段回放"""
+        return db.scalar(select(GameReplayBlob.data).where(GameReplayBlob.game_id == game_id))
+
     def calculate_play_time(self, start_time: datetime, end_time: datetime) -> int:
         """计算游戏时长（秒）"""
         delta = end_time - start_time
@@ -64,12 +251,22 @@ class GameService:
             if not game:
                 return None
 
+            old = (game.player_name, game.score, game.level, game.play_time)
             update_data = game_data.model_dump(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(game, field, value)
 
+            db.flush()
+            period_leaderboards.update(db, game)
+            self._update_score_histogram(db, added=[(game.level, game.score)], removed=[(old[2], old[1])])
+            self._remove_player_stats(db, *old)
+            self._add_player_stats(
+                db, game.player_name, 1, game.score, game.play_time, game.level, game.level,
+                game.id, game.created_at,
+            )
             db.commit()
             db.refresh(game)
+            leaderboard_indexes.get(db).add(game)
             return game
         except Exception as e:
             db.rollback()
@@ -82,18 +279,25 @@ class GameService:
             if not game:
                 return False
 
+            db.execute(delete(GameReplayBlob).where(GameReplayBlob.game_id == game_id))
+            db.execute(delete(GameFlag).where(GameFlag.game_id == game_id))
+            period_leaderboards.remove(db, game_id)
             db.delete(game)
+            db.flush()
+            self._remove_player_stats(db, game.player_name, game.score, game.level, game.play_time)
+            self._update_score_histogram(db, removed=[(game.level, game.score)])
             db.commit()
+            leaderboard_indexes.get(db).remove(game_id)
             return True
         except Exception as e:
             db.rollback()
             raise
 
     def get_player_stats(self, db: Session, player_name: str) -> dict:
-        """获取玩家统计信息"""
-        games = db.query(Game).filter(Game.player_name == player_name).all()
+        """获取玩家统计信息（读取 player_stats 汇总表）"""
+        stats = db.get(PlayerStats, player_name, populate_existing=True)
 
-        if not games:
+        if not stats or not stats.total_games:
             return {
                 "total_games": 0,
                 "highest_score": 0,
@@ -103,12 +307,297 @@ class GameService:
             }
 
         return {
-            "total_games": len(games),
-            "highest_score": max(g.score for g in games),
-            "total_play_time": sum(g.play_time for g in games),
-            "average_level": sum(g.level for g in games) // len(games),
-            "highest_level": max(g.level for g in games)
+            "total_games": stats.total_games,
+            "highest_score": stats.highest_score,
+            "total_play_time": stats.total_play_time,
+            "average_level": stats.level_sum // stats.total_games,
+            "highest_level": stats.highest_level
         }
 
+    def _add_player_stats(
+        self, db: Session, player_name: str, games: int, highest_score: int,
+        play_time: int, level_sum: int, highest_level: int,
+        best_game_id: int, best_created_at: datetime,
+    ) -> None:
+        """
+        将新记录累加到玩家统计汇总（由调用方提交事务）
+
+        使用 UPDATE ... SET x = x + n 原子累加，避免并发写入时丢失更新；
+        best_game_id / best_created_at 为其中分数最高的记录，与现有最高分相同时创建较早（再按ID）者优先
+        """
+        better = or_(
+            PlayerStats.highest_score < highest_score,
+            and_(
+                PlayerStats.highest_score == highest_score,
+                or_(
+                    PlayerStats.best_created_at.is_(None),
+                    PlayerStats.best_created_at > best_created_at,
+                    and_(PlayerStats.best_created_at == best_created_at, PlayerStats.best_game_id > best_game_id),
+                ),
+            ),
+        )
+        result = db.execute(
+            update(PlayerStats)
+            .where(PlayerStats.player_name == player_name)
+            .values(
+                total_games=PlayerStats.total_games + games,
+                highest_score=case(
+                    (PlayerStats.highest_score < highest_score, highest_score),
+                    else_=PlayerStats.highest_score
+                ),
+                total_play_time=PlayerStats.total_play_time + play_time,
+                level_sum=PlayerStats.level_sum + level_sum,
+                highest_level=case(
+                    (PlayerStats.highest_level < highest_level, highest_level),
+                    else_=PlayerStats.highest_level
+                ),
+                best_game_id=case((better, best_game_id), else_=PlayerStats.best_game_id),
+                best_created_at=case((better, best_created_at), else_=PlayerStats.best_created_at),
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(PlayerStats).values(
+                player_name=player_name,
+                total_games=games,
+                highest_score=highest_score,
+                total_play_time=play_time,
+                level_sum=level_sum,
+                highest_level=highest_level,
+                best_game_id=best_game_id,
+                best_created_at=best_created_at,
+            ))
+
+    def _remove_player_stats(
+        self, db: Session, player_name: str, score: int, level: int, play_time: int
+    ) -> None:
+        """
+        从玩家统计汇总中扣除一条已删除（或修改前）的记录（由调用方提交事务）
+
+        调用前对 games 的删除/修改须已 flush；仅当扣除的是最高分或最高等级时，
+        才重新查询该玩家的最高分记录（idx_player_score 索引）或最高等级
+        """
+        db.execute(
+            update(PlayerStats)
+            .where(PlayerStats.player_name == player_name)
+            .values(
+                total_games=PlayerStats.total_games - 1,
+                total_play_time=PlayerStats.total_play_time - play_time,
+                level_sum=PlayerStats.level_sum - level,
+            )
+        )
+        stats = db.execute(
+            select(PlayerStats.total_games, PlayerStats.highest_score, PlayerStats.highest_level)
+            .where(PlayerStats.player_name == player_name)
+        ).first()
+        if stats is None:
+            return
+
+        if stats.total_games <= 0:
+            db.execute(delete(PlayerStats).where(PlayerStats.player_name == player_name))
+            return
+
+        values = {}
+        if score >= stats.highest_score:
+            best = db.execute(
+                select(Game.id, Game.score, Game.created_at)
+                .where(Game.player_name == player_name)
+                .order_by(desc(Game.score), Game.created_at, Game.id)
+                .limit(1)
+            ).one()
+            values.update(highest_score=best.score, best_game_id=best.id, best_created_at=best.created_at)
+        if level >= stats.highest_level:
+            values["highest_level"] = db.scalar(
+                select(func.max(Game.level)).where(Game.player_name == player_name)
+            )
+        if values:
+            db.execute(update(PlayerStats).where(PlayerStats.player_name == player_name).values(**values))
+
+    def rebuild_player_stats(self, db: Session) -> int:
+        """根据 games 表全量重建玩家统计汇总，返回玩家数"""
+        totals = select(
+            Game.player_name,
+            func.count().label("total_games"),
+            func.max(Game.score).label("highest_score"),
+            func.sum(Game.play_time).label("total_play_time"),
+            func.sum(Game.level).label("level_sum"),
+            func.max(Game.level).label("highest_level"),
+        ).group_by(Game.player_name).subquery()
+        # 每名玩家的最高分记录，排序规则与 _add_player_stats 一致
+        ranked = select(
+            Game.player_name, Game.id, Game.created_at,
+            func.row_number().over(
+                partition_by=Game.player_name, order_by=(desc(Game.score), Game.created_at, Game.id)
+            ).label("position"),
+        ).subquery()
+        try:
+            db.execute(delete(PlayerStats))
+            db.execute(insert(PlayerStats).from_select(
+                ["player_name", "total_games", "highest_score", "total_play_time", "level_sum", "highest_level",
+                 "best_game_id", "best_created_at"],
+                select(
+                    totals.c.player_name, totals.c.total_games, totals.c.highest_score,
+                    totals.c.total_play_time, totals.c.level_sum, totals.c.highest_level,
+                    ranked.c.id, ranked.c.created_at,
+                ).join(ranked, and_(ranked.c.player_name == totals.c.player_name, ranked.c.position == 1))
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return db.scalar(select(func.count()).select_from(PlayerStats))
+
+    def rebuild_period_leaderboards(self, db: Session) -> int:
+        """根据 games 表重建各类型当前周期的排行榜汇总，返回汇总行数"""
+        try:
+            rows = period_leaderboards.rebuild(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return rows
+
+    def _update_score_histogram(
+        self, db: Session,
+        added: Iterable[Tuple[int, int]] = (), removed: Iterable[Tuple[int, int]] = (),
+    ) -> None:
+        """
+        按新增/移除记录的 (等级, 分数) 增减分数分布汇总（由调用方提交事务）
+
+        同一分桶的增减先合并，修改记录但分桶不变时不写入；计数降为 0 的分桶被删除
+        """
+        deltas = Counter((level, bucket_of(score)) for level, score in added)
+        deltas.subtract((level, bucket_of(score)) for level, score in removed)
+        for (level, bucket), delta in deltas.items():
+            if not delta:
+                continue
+            key = (ScoreHistogram.level == level, ScoreHistogram.bucket == bucket)
+            result = db.execute(
+                update(ScoreHistogram).where(*key).values(count=ScoreHistogram.count + delta)
+            )
+            if result.rowcount == 0:
+                db.execute(insert(ScoreHistogram).values(level=level, bucket=bucket, count=delta))
+            elif delta < 0:
+                db.execute(delete(ScoreHistogram).where(*key, ScoreHistogram.count <= 0))
+
+    def rebuild_score_histogram(self, db: Session) -> int:
+        """根据 games 表全量重建分数分布汇总，返回分桶数"""
+        deltas = Counter()
+        for level, score, count in db.execute(
+            select(Game.level, Game.score, func.count()).group_by(Game.level, Game.score)
+        ):
+            deltas[level, bucket_of(score)] += count
+        try:
+            db.execute(delete(ScoreHistogram))
+            if deltas:
+                db.execute(insert(ScoreHistogram), [
+                    {"level": level, "bucket": bucket, "count": count}
+                    for (level, bucket), count in deltas.items()
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return len(deltas)
+
+    def get_score_sketches(self, db: Session) -> Dict[int, ScoreSketch]:
+        """读取分数分布汇总，返回 等级 -> 分布"""
+        sketches: Dict[int, ScoreSketch] = {}
+        for level, bucket, count in db.execute(
+            select(ScoreHistogram.level, ScoreHistogram.bucket, ScoreHistogram.count)
+            .where(ScoreHistogram.count > 0)
+        ):
+            sketches.setdefault(level, ScoreSketch()).add_bucket(bucket, count)
+        return sketches
+
+    def get_score_distribution(self, db: Session, quantiles: List[float], bins: int = 20) -> dict:
+        """
+        整体及各等级的分数直方图与分位数（quantiles 取值 0-100）
+
+        各等级使用相同的等宽分组：覆盖整体最高分，最多 bins 组
+        """
+        sketches = self.get_score_sketches(db)
+        overall = merge_sketches(sketches.values())
+        upper = overall.upper_bound()
+        width = bin_width(upper, bins)
+        bins = upper // width + 1
+
+        def describe(sketch: ScoreSketch) -> dict:
+            return {
+                "total": sketch.total,
+                "percentiles": {f"p{q:g}": sketch.quantile(q / 100) for q in quantiles},
+                "histogram": [
+                    {"start": i * width, "end": (i + 1) * width, "count": count}
+                    for i, count in enumerate(sketch.histogram(width, bins))
+                ],
+            }
+
+        return {
+            **describe(overall),
+            "levels": [{"level": level, **describe(sketches[level])} for level in sorted(sketches)],
+        }
+
+    def get_game_percentile(self, db: Session, game_id: int) -> Optional[dict]:
+        """
+        记录分数超过的记录比例（整体及同等级，百分数），记录不存在时返回 None
+
+        一次聚合查询求出整体与同等级的 更低分桶记录数 / 同分桶记录数 / 总数；
+        记录的分数与等级取自排行榜索引，索引中没有时读取数据库
+        """
+        game = self.get_game_row(db, game_id)
+        if game is None:
+            return None
+        bucket = bucket_of(game.score)
+        same_level = ScoreHistogram.level == game.level
+        count = ScoreHistogram.count
+
+        def total(*conditions):
+            return func.coalesce(func.sum(case((and_(*conditions), count), else_=0) if conditions else count), 0)
+
+        counts = db.execute(select(
+            total(ScoreHistogram.bucket < bucket),
+            total(ScoreHistogram.bucket == bucket),
+            total(),
+            total(same_level, ScoreHistogram.bucket < bucket),
+            total(same_level, ScoreHistogram.bucket == bucket),
+            total(same_level),
+        )).one()
+        return {
+            "game_id": game_id,
+            "score": game.score,
+            "level": game.level,
+            "percentile": round(100 * fraction_below(game.score, *counts[:3]), 2),
+            "total": counts[2],
+            "level_percentile": round(100 * fraction_below(game.score, *counts[3:]), 2),
+            "level_total": counts[5],
+        }
+
+    def load_leaderboard_index(self, db: Session) -> int:
+        """（重新）加载排行榜内存索引，返回索引记录数"""
+        return leaderboard_indexes.get(db).load(db)
+
+    def check_leaderboard_index(self, db: Session, repair: bool = False) -> dict:
+        """校验排行榜内存索引与 games 表是否一致，repair=True 时不一致则重新加载"""
+        index = leaderboard_indexes.get(db)
+        report = index.check(db)
+        if repair and not report["consistent"]:
+            index.load(db)
+            report["repaired"] = True
+        return report
+
+    def get_flagged_games(self, db: Session, limit: int = 50, before: Optional[int] = None) -> List[dict]:
+        """异常扫描标记的记录，按游戏ID降序，before 为上一页最后一条的ID"""
+        query = (
+            select(GameFlag.reasons, GameFlag.scan_id, *_HISTORY_COLUMNS)
+            .join(Game, Game.id == GameFlag.game_id)
+            .order_by(desc(GameFlag.game_id))
+            .limit(limit)
+        )
+        if before is not None:
+            query = query.where(GameFlag.game_id < before)
+        return [
+            {**dict(zip(GAME_RESPONSE_FIELDS, values)), "reasons": flag_names(reasons), "scan_id": scan_id}
+            for reasons, scan_id, *values in db.execute(query)
+        ]
+
 
 game_service = GameService()
@@ -0,0 +1,442 @@
+"""
+排行榜内存索引
+在进程内按 (score, created_at, id) 维护有序索引，
+排行榜 Top N、高分判断与名次查询直接读取索引，不再访问数据库。
+每条记录只保存排序键，完整记录只缓存排名靠前的 TOP_CACHE_SIZE 名左右，
+其他记录（如名次附近的窗口）按ID从数据库读取
+"""
+import bisect
+import itertools
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..models.game import Game
+
+
+class LeaderboardRow(NamedTuple):
+    """索引中保存的排行榜记录快照，字段与 GameResponse 一致"""
+    id: int
+    player_name: str
+    score: int
+    level: int
+    lines: int
+    play_time: int
+    created_at: datetime
+
+
+_ROW_COLUMNS = (
+    Game.id, Game.player_name, Game.score, Game.level,
+    Game.lines, Game.play_time, Game.created_at,
+)
+
+SortKey = Tuple[int, datetime, int]
+
+# 排行榜接口可见的最大名次，前 N 名发生变化时递增 top_version
+TRACKED_TOP_N = 50
+# 索引缓存完整记录的名次数，其余记录只保存排序键
+TOP_CACHE_SIZE = 4 * TRACKED_TOP_N
+
+_index_ids = itertools.count(1)
+
+
+def _sort_key(row: LeaderboardRow) -> SortKey:
+    """排序键：升序存储，末尾即为最高分（同分时创建时间越晚越靠前）"""
+    return (row.score, row.created_at, row.id)
+
+
+def load_row(db: Session, game_id: int) -> Optional[LeaderboardRow]:
+    """从 games 表读取记录快照（主键查找），不存在时返回 None"""
+    row = db.execute(select(*_ROW_COLUMNS).where(Game.id == game_id)).first()
+    return None if row is None else LeaderboardRow(*row)
+
+
+def load_rows(db: Session, game_ids: List[int]) -> List[LeaderboardRow]:
+    """从 games 表按ID批量读取记录快照，不存在的ID被忽略"""
+    if not game_ids:
+        return []
+    return [LeaderboardRow(*r) for r in db.execute(select(*_ROW_COLUMNS).where(Game.id.in_(game_ids))).all()]
+
+
+def _to_row(game) -> LeaderboardRow:
+    """从 ORM 对象或查询结果构造快照"""
+    return LeaderboardRow(
+        game.id, game.player_name, game.score, game.level,
+        game.lines, game.play_time, game.created_at,
+    )
+
+
+class SortedKeyList:
+    """
+    分桶有序列表（顺序统计结构）
+
+    键按升序分散在若干长度不超过 2 * load 的桶中，桶长度另用树状数组维护前缀和，
+    插入/删除为 O(log n + load)，按键求位置与按位置取键均为 O(log n)
+    """
+
+    def __init__(self, keys: Optional[List[SortKey]] = None, load: int = 1000):
+        self._load = load
+        self._len = 0
+        self._lists: List[List[SortKey]] = []
+        self._maxes: List[SortKey] = []
+        self._tree: List[int] = []
+        if keys:
+            self._reset(sorted(keys))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        for bucket in self._lists:
+            yield from bucket
+
+    def _reset(self, keys: List[SortKey]) -> None:
+        load = self._load
+        self._lists = [keys[i:i + load] for i in range(0, len(keys), load)]
+        self._maxes = [bucket[-1] for bucket in self._lists]
+        self._len = len(keys)
+        self._build_tree()
+
+    def _build_tree(self) -> None:
+        """按桶长度重建树状数组"""
+        tree = [len(bucket) for bucket in self._lists]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos: int, delta: int) -> None:
+        tree = self._tree
+        while pos < len(tree):
+            tree[pos] += delta
+            pos |= pos + 1
+
+    def _tree_prefix(self, pos: int) -> int:
+        """前 pos 个桶的元素总数"""
+        total = 0
+        tree = self._tree
+        while pos > 0:
+            total += tree[pos - 1]
+            pos &= pos - 1
+        return total
+
+    def _tree_find(self, index: int) -> Tuple[int, int]:
+        """定位第 index 个元素所在的桶及桶内偏移"""
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            nxt = pos + step
+            if nxt <= len(tree) and tree[nxt - 1] <= index:
+                index -= tree[nxt - 1]
+                pos = nxt
+            step >>= 1
+        return pos, index
+
+    def add(self, key: SortKey) -> None:
+        if not self._lists:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            self._build_tree()
+            return
+
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            bisect.insort(self._lists[pos], key)
+        self._len += 1
+
+        bucket = self._lists[pos]
+        if len(bucket) > 2 * self._load:
+            half = len(bucket) // 2
+            self._lists[pos:pos + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+            self._build_tree()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, key: SortKey) -> bool:
+        """删除键，键不存在时返回 False"""
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return False
+        bucket = self._lists[pos]
+        idx = bisect.bisect_left(bucket, key)
+        if idx == len(bucket) or bucket[idx] != key:
+            return False
+
+        del bucket[idx]
+        self._len -= 1
+        if not bucket:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._build_tree()
+        else:
+            self._maxes[pos] = bucket[-1]
+            self._tree_add(pos, -1)
+        return True
+
+    def index(self, key: SortKey) -> int:
+        """返回键在升序序列中的位置（即小于该键的元素个数）"""
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return self._len
+        return self._tree_prefix(pos) + bisect.bisect_left(self._lists[pos], key)
+
+    def slice(self, start: int, stop: int) -> List[SortKey]:
+        """返回升序位置 [start, stop) 的键"""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+        pos, offset = self._tree_find(start)
+        result: List[SortKey] = []
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._lists[pos][offset:offset + remaining]
+            result.extend(chunk)
+            remaining -= len(chunk)
+            pos, offset = pos + 1, 0
+        return result
+
+
+class LeaderboardIndex:
+    """
+    单个数据库对应的有序排行榜索引
+
+    每条记录只保存排序键 (score, created_at, id)，完整记录只缓存排名最前的连续若干名
+    （加载时为 TOP_CACHE_SIZE 名），其他记录按需从数据库读取。
+    删除前列记录会使缓存覆盖的名次减少，不足 TOP_CACHE_SIZE / 2 名时由 refill 从数据库补齐
+    """
+
+    def __init__(self):
+        self._keys = SortedKeyList()
+        self._key_of: Dict[int, SortKey] = {}
+        self._cached: Dict[int, LeaderboardRow] = {}
+        # 已缓存完整记录的名次数：第 1 ~ _covered 名都在 _cached 中
+        self._covered = 0
+        self._lock = threading.RLock()
+        self.loaded = False
+        # 进程内唯一编号，索引被重建后与 top_version 一起区分新旧内容
+        self.uid = next(_index_ids)
+        # 前 TRACKED_TOP_N 名的版本号，只在其内容变化时递增，用于缓存失效和 ETag
+        self.top_version = 0
+        # 任意记录写入或删除时递增，用于整体统计（如分数分布）的缓存失效
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, game_id: int) -> bool:
+        return game_id in self._key_of
+
+    @property
+    def needs_refill(self) -> bool:
+        """缓存覆盖的名次是否不足，需要从数据库补齐"""
+        return self._covered < min(TOP_CACHE_SIZE // 2, len(self._keys))
+
+    @property
+    def top_cached(self) -> bool:
+        """前 TRACKED_TOP_N 名的完整记录是否都在缓存中"""
+        return self._covered >= min(TRACKED_TOP_N, len(self._keys))
+
+    def load(self, db: Session) -> int:
+        """从 games 表全量加载排序键并缓存前列记录，返回记录数"""
+        keys = SortedKeyList([tuple(r) for r in db.execute(select(Game.score, Game.created_at, Game.id)).all()])
+        with self._lock:
+            self._keys = keys
+            self._key_of = {key[2]: key for key in keys}
+            self._cached = {}
+            self._covered = 0
+            self.refill(db)
+            self.loaded = True
+            self.top_version += 1
+            self.version += 1
+        return len(keys)
+
+    def refill(self, db: Session) -> None:
+        """从数据库读取前 TOP_CACHE_SIZE 名中尚未缓存的记录"""
+        with self._lock:
+            total = len(self._keys)
+            keys = self._keys.slice(total - TOP_CACHE_SIZE, total - self._covered)
+            for row in load_rows(db, [key[2] for key in keys]):
+                if self._key_of.get(row.id) == _sort_key(row):
+                    self._cached[row.id] = row
+            covered = self._covered
+            for key in reversed(keys):
+                if key[2] not in self._cached:
+                    break
+                covered += 1
+            self._covered = covered
+
+    def get(self, game_id: int) -> Optional[LeaderboardRow]:
+        """按ID获取缓存的记录快照（只有排名靠前的记录），未缓存时返回 None"""
+        return self._cached.get(game_id)
+
+    def add(self, game) -> None:
+        """插入或替换一条记录"""
+        row = _to_row(game)
+        with self._lock:
+            touched = self._discard(row.id)
+            key = _sort_key(row)
+            self._keys.add(key)
+            self._key_of[row.id] = key
+            rank = self._rank_of(key)
+            if rank <= self._covered + 1:
+                self._cached[row.id] = row
+                self._covered += 1
+                if self._covered > 2 * TOP_CACHE_SIZE:
+                    self._trim()
+            self.version += 1
+            if touched or rank <= TRACKED_TOP_N:
+                self.top_version += 1
+
+    def refresh(self, game) -> None:
+        """记录不在索引中或排序键已变化时写入索引"""
+        row = _to_row(game)
+        if self._key_of.get(row.id) != _sort_key(row):
+            self.add(row)
+
+    def remove(self, game_id: int) -> None:
+        """移除一条记录（不存在时忽略）"""
+        with self._lock:
+            if game_id in self._key_of:
+                self.version += 1
+            if self._discard(game_id):
+                self.top_version += 1
+
+    def _discard(self, game_id: int) -> bool:
+        """移除记录，返回被移除的记录是否位于前 TRACKED_TOP_N 名"""
+        key = self._key_of.pop(game_id, None)
+        if key is None:
+            return False
+        rank = self._rank_of(key)
+        self._keys.remove(key)
+        if self._cached.pop(game_id, None) is not None:
+            self._covered -= 1
+        return rank <= TRACKED_TOP_N
+
+    def _trim(self) -> None:
+        """缓存超过 2 * TOP_CACHE_SIZE 名时丢弃第 TOP_CACHE_SIZE 名之后的记录"""
+        total = len(self._keys)
+        for key in self._keys.slice(total - self._covered, total - TOP_CACHE_SIZE):
+            del self._cached[key[2]]
+        self._covered = TOP_CACHE_SIZE
+
+    def _rank_of(self, key: SortKey) -> int:
+        return len(self._keys) - self._keys.index(key)
+
+    def top(self, limit: int) -> List[LeaderboardRow]:
+        """按分数降序返回前 limit 条记录（limit 不超过 TRACKED_TOP_N，读取缓存）"""
+        return self.range(1, limit)
+
+    def rank(self, game_id: int) -> Optional[int]:
+        """返回记录的全局名次（从 1 开始），记录不存在时返回 None"""
+        with self._lock:
+            key = self._key_of.get(game_id)
+            return None if key is None else self._rank_of(key)
+
+    def range(self, first: int, last: int, db: Optional[Session] = None) -> List[LeaderboardRow]:
+        """
+        按分数降序返回名次 [first, last] 内的记录
+
+        未缓存的记录通过 db 从 games 表读取；不传 db 时只返回缓存中的记录
+        """
+        with self._lock:
+            total = len(self._keys)
+            ids = [key[2] for key in reversed(self._keys.slice(total - last, total - first + 1))]
+            rows = [self._cached.get(game_id) for game_id in ids]
+        missing = [game_id for game_id, row in zip(ids, rows) if row is None]
+        if missing and db is not None:
+            loaded = {row.id: row for row in load_rows(db, missing)}
+            rows = [row or loaded.get(game_id) for game_id, row in zip(ids, rows)]
+        return [row for row in rows if row is not None]
+
+    def check(self, db: Session) -> dict:
+        """与 games 表比对，返回一致性报告"""
+        stored = {
+            game_id: (score, created_at)
+            for game_id, score, created_at in db.execute(
+                select(Game.id, Game.score, Game.created_at)
+            ).all()
+        }
+        with self._lock:
+            indexed = {game_id: (score, created_at) for game_id, (score, created_at, _) in self._key_of.items()}
+            keys = list(self._keys)
+            ordered = len(keys) == len(self._key_of) and all(
+                keys[i] < keys[i + 1] for i in range(len(keys) - 1)
+            )
+
+        missing = sorted(stored.keys() - indexed.keys())
+        unexpected = sorted(indexed.keys() - stored.keys())
+        mismatched = sorted(
+            game_id for game_id in stored.keys() & indexed.keys()
+            if stored[game_id] != indexed[game_id]
+        )
+        return {
+            "consistent": ordered and not (missing or unexpected or mismatched),
+            "stored": len(stored),
+            "indexed": len(indexed),
+            "ordered": ordered,
+            "missing": missing[:20],
+            "unexpected": unexpected[:20],
+            "mismatched": mismatched[:20],
+        }
+
+
+def _bind_key(bind) -> str:
+    """以去掉驱动名的数据库 URL 区分索引，同一数据库的同步/异步引擎共享同一份索引"""
+    engine = getattr(bind, "engine", bind)
+    url = engine.url
+    return url.set(drivername=url.get_backend_name()).render_as_string(hide_password=False)
+
+
+class LeaderboardIndexRegistry:
+    """按数据库维护排行榜索引，首次访问时懒加载"""
+
+    def __init__(self):
+        self._indexes: Dict[str, LeaderboardIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> LeaderboardIndex:
+        """获取会话所在数据库的索引，未加载时从数据库加载"""
+        key = _bind_key(db.get_bind())
+        index = self._indexes.get(key)
+        if index is not None and index.loaded and not index.needs_refill:
+            return index
+
+        with self._lock:
+            index = self._indexes.setdefault(key, LeaderboardIndex())
+        with index._lock:
+            if not index.loaded:
+                index.load(db)
+            elif index.needs_refill:
+                index.refill(db)
+        return index
+
+    def peek(self, bind) -> Optional[LeaderboardIndex]:
+        """获取已加载的索引，不触发加载"""
+        index = self._indexes.get(_bind_key(bind))
+        return index if index is not None and index.loaded else None
+
+    def reset(self, bind) -> None:
+        """丢弃某个数据库的索引，下次访问时重新加载"""
+        with self._lock:
+            self._indexes.pop(_bind_key(bind), None)
+
+
+leaderboard_indexes = LeaderboardIndexRegistry()
+
+
+# games 表被重建或删除时，旧索引随之失效
+@event.listens_for(Game.__table__, "after_create")
+@event.listens_for(Game.__table__, "after_drop")
+def _reset_index_on_ddl(target, connection, **kw):
+    leaderboard_indexes.reset(connection)
@@ -0,0 +1,386 @@
+"""
+周期排行榜（日 / 周 / 月 / 赛季）
+
+每个周期的前 TRACKED_TOP_N 名保存在 leaderboard_rollups 表中，与 games 表在同一事务中维护：
+写入时与所在周期的现有名次合并（见 _merge），修改、删除在榜记录时就地调整，
+只按名次键集从 games 表读取一条候选记录补位；查询时按 (period, period_start) 主键前缀读取 N 行，
+不需要按 created_at 范围扫描 games 表再按分数排序（没有索引支持这种查询）。
+排序与全局排行榜一致：分数降序，同分时创建时间越晚越靠前
+
+周期按 LEADERBOARD_TIMEZONE 的本地日期划分：周从周一开始，赛季每 LEADERBOARD_SEASON_MONTHS
+个月一期（从 1 月开始）。已结束的周期在同类型的新周期写入第一条记录时冻结为
+leaderboard_snapshots 中的快照，此后不再变化（包括其中的记录被修改或删除），汇总行随之删除。
+冻结之前查询已结束的周期只读计算，不写入数据库（快照只由写入路径生成）
+"""
+import json
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import bindparam, delete, desc, func, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.game import Game
+from ..models.leaderboard_rollup import LeaderboardRollup, LeaderboardSnapshot
+from ..schemas.game import GAME_RESPONSE_FIELDS
+from ..utils import json_codec
+from .leaderboard_index import TRACKED_TOP_N
+
+PERIODS = ("day", "week", "month", "season")
+
+_ENTRY_COLUMNS = tuple(getattr(Game, name) for name in GAME_RESPONSE_FIELDS)
+
+# 各周期的汇总行数与最低分；每次写入都会执行，预先构造语句以省去构造与缓存键计算的开销
+_GROUP_STATS = (
+    select(
+        LeaderboardRollup.period, LeaderboardRollup.period_start,
+        func.count(), func.min(LeaderboardRollup.score),
+    )
+    .where(tuple_(LeaderboardRollup.period, LeaderboardRollup.period_start).in_(bindparam("groups", expanding=True)))
+    .group_by(LeaderboardRollup.period, LeaderboardRollup.period_start)
+)
+
+# 周期中名次最低的若干行（可能被挤出的行）
+_LOWEST_ROWS = (
+    select(LeaderboardRollup.game_id, LeaderboardRollup.score, LeaderboardRollup.created_at)
+    .where(LeaderboardRollup.period == bindparam("period"), LeaderboardRollup.period_start == bindparam("start"))
+    .order_by(LeaderboardRollup.score, LeaderboardRollup.created_at, LeaderboardRollup.game_id)
+    .limit(bindparam("overflow"))
+)
+
+# 汇总行：(游戏ID, 分数, 创建时间)
+RollupRow = Tuple[int, int, datetime]
+GroupKey = Tuple[str, date]
+
+
+class PeriodLeaderboard(NamedTuple):
+    """周期排行榜查询结果"""
+    period: str
+    start: date
+    end: date  # 不含
+    frozen: bool  # 是否读取自快照（内容不再变化）
+    entries: List[dict]
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> tzinfo:
+    return ZoneInfo(name)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """数据库中的时间不带时区，按 UTC 处理"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def local_date(value: datetime) -> date:
+    """时间点在 LEADERBOARD_TIMEZONE 中的本地日期"""
+    return _as_utc(value).astimezone(_zone(settings.LEADERBOARD_TIMEZONE)).date()
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def period_bounds(period: str, day: date) -> Tuple[date, date]:
+    """包含本地日期 day 的周期 [开始, 结束)，无效的周期类型抛出 ValueError"""
+    if period == "day":
+        return day, day + timedelta(days=1)
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = day.replace(day=1)
+        return start, _add_months(start, 1)
+    if period == "season":
+        months = settings.LEADERBOARD_SEASON_MONTHS
+        if months < 1 or 12 % months:
+            raise ValueError(f"LEADERBOARD_SEASON_MONTHS 必须是 12 的约数: {months}")
+        start = date(day.year, (day.month - 1) // months * months + 1, 1)
+        return start, _add_months(start, months)
+    raise ValueError(f"无效的周期: {period}")
+
+
+def _utc_boundary(day: date) -> datetime:
+    """本地日期零点对应的 UTC 时间（不带时区，与 games.created_at 比较）"""
+    local = datetime.combine(day, time(), tzinfo=_zone(settings.LEADERBOARD_TIMEZONE))
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def is_expired(end: date, now: Optional[datetime] = None) -> bool:
+    """周期是否已经结束"""
+    return _utc_boundary(end) <= _as_utc(now or datetime.now(timezone.utc)).replace(tzinfo=None)
+
+
+def _rank_key(row: RollupRow) -> Tuple[int, datetime, int]:
+    game_id, score, created_at = row
+    return score, created_at, game_id
+
+
+def _rollup_row(game) -> RollupRow:
+    return game.id, game.score, _as_utc(game.created_at).replace(tzinfo=None)
+
+
+class PeriodLeaderboards:
+    """周期排行榜汇总的维护与查询（由调用方提交事务）"""
+
+    def __init__(self, top_n: int = TRACKED_TOP_N):
+        self.top_n = top_n
+
+    def add(self, db: Session, games: Iterable) -> None:
+        """新记录写入后合并进所在周期的汇总（games 须已 flush，带有 id 与 created_at）"""
+        candidates: Dict[GroupKey, List[RollupRow]] = {}
+        for game in games:
+            for key in self._groups_for(game, PERIODS):
+                candidates.setdefault(key, []).append(_rollup_row(game))
+        if candidates:
+            self._merge(db, candidates)
+
+    def update(self, db: Session, game) -> None:
+        """记录修改后（已 flush）更新汇总：原本在榜的周期就地调整名次，其余未冻结的周期按新分数合并"""
+        listed = self._groups_of(db, game.id)
+        row = _rollup_row(game)
+        for period, start in listed:
+            self._rerank(db, period, start, row)
+        candidates = {
+            key: [row] for key in self._groups_for(game, PERIODS)
+            if key not in listed and not self._is_frozen(db, *key)
+        }
+        if candidates:
+            self._merge(db, candidates)
+
+    def remove(self, db: Session, game_id: int) -> None:
+        """删除记录前从汇总中移除，并从 games 表取排在最低名次之后的一条记录补足空出的名次"""
+        for period, start in self._groups_of(db, game_id):
+            count, lowest = self._lowest(db, period, start)
+            self._delete_rows(db, period, start, [game_id])
+            if count >= self.top_n:
+                self._insert_next(db, period, start, lowest, exclude=game_id)
+
+    def get(self, db: Session, period: str, day: date, limit: int) -> PeriodLeaderboard:
+        """
+        包含本地日期 day 的周期排行榜前 limit 名
+
+        已结束的周期读取快照；尚未冻结时（结束后还没有新记录写入）只读计算，不写入快照
+        """
+        start, end = period_bounds(period, day)
+        if is_expired(end):
+            entries = self._snapshot(db, period, start)
+            if entries is not None:
+                return PeriodLeaderboard(period, start, end, True, entries[:limit])
+            rows = self._ended_rows(db, period, start)[:limit]
+        else:
+            rows = db.execute(self._rollup_entries(period, start).limit(limit)).all()
+        return PeriodLeaderboard(period, start, end, False, [dict(zip(GAME_RESPONSE_FIELDS, r)) for r in rows])
+
+    def first_day(self, db: Session) -> Optional[date]:
+        """最早一条记录的本地日期（idx_created_id 索引查找），没有记录时返回 None"""
+        first = db.scalar(select(func.min(Game.created_at)))
+        return None if first is None else local_date(first)
+
+    def rebuild(self, db: Session) -> int:
+        """清空汇总并根据 games 表重新计算各类型当前周期的前 N 名，返回汇总行数"""
+        db.execute(delete(LeaderboardRollup))
+        today = local_date(datetime.now(timezone.utc))
+        for period in PERIODS:
+            self._refill(db, period, period_bounds(period, today)[0])
+        return db.scalar(select(func.count()).select_from(LeaderboardRollup))
+
+    def _groups_for(self, game, periods: Iterable[str]) -> List[GroupKey]:
+        """记录所在的各个周期"""
+        day = local_date(game.created_at)
+        return [(period, period_bounds(period, day)[0]) for period in periods]
+
+    def _merge(self, db: Session, candidates: Dict[GroupKey, List[RollupRow]]) -> None:
+        """
+        把候选记录合并进各周期的汇总
+
+        先用一次聚合查询取得各周期的行数与最低分：未满的周期直接插入，已满且候选记录低于最低分时跳过
+        （大多数写入走这两条路径）；合并后超出 N 名的 overflow 行只可能来自候选记录和
+        现有名次最低的 overflow 行，因此只需读出这些行比较
+        """
+        stats = {
+            (period, start): (count, lowest)
+            for period, start, count, lowest in db.execute(_GROUP_STATS, {"groups": list(candidates)})
+        }
+
+        inserts = []
+        for (period, start), rows in candidates.items():
+            count, lowest = stats.get((period, start), (0, None))
+            if not count:
+                # 周期的第一条记录：冻结同类型中更早的周期
+                self._freeze_before(db, period, start)
+            if count >= self.top_n:
+                rows = [row for row in rows if row[1] >= lowest]
+                if not rows:
+                    continue
+            overflow = count + len(rows) - self.top_n
+            if overflow <= 0:
+                kept, existing = rows, {}
+            else:
+                existing = {
+                    row[0]: tuple(row)
+                    for row in db.execute(_LOWEST_ROWS, {"period": period, "start": start, "overflow": overflow})
+                }
+                merged = sorted([*existing.values(), *rows], key=_rank_key)
+                kept = merged[overflow:]
+                evicted = existing.keys() - {row[0] for row in kept}
+                if evicted:
+                    db.execute(delete(LeaderboardRollup).where(
+                        LeaderboardRollup.period == period,
+                        LeaderboardRollup.period_start == start,
+                        LeaderboardRollup.game_id.in_(evicted),
+                    ))
+            inserts.extend(
+                {"period": period, "period_start": start, "game_id": game_id,
+                 "score": score, "created_at": created_at}
+                for game_id, score, created_at in kept if game_id not in existing
+            )
+        if inserts:
+            db.execute(insert(LeaderboardRollup), inserts)
+
+    def _rollup_entries(self, period: str, start: date):
+        """周期汇总对应的记录（按名次排列）"""
+        return (
+            select(*_ENTRY_COLUMNS)
+            .join(LeaderboardRollup, LeaderboardRollup.game_id == Game.id)
+            .where(LeaderboardRollup.period == period, LeaderboardRollup.period_start == start)
+            .order_by(desc(LeaderboardRollup.score), desc(LeaderboardRollup.created_at),
+                      desc(LeaderboardRollup.game_id))
+        )
+
+    def _lowest(self, db: Session, period: str, start: date) -> Tuple[int, RollupRow]:
+        """周期汇总的行数与名次最低的行"""
+        _, _, count, _ = db.execute(_GROUP_STATS, {"groups": [(period, start)]}).one()
+        lowest = db.execute(_LOWEST_ROWS, {"period": period, "start": start, "overflow": 1}).one()
+        return count, tuple(lowest)
+
+    def _rerank(self, db: Session, period: str, start: date, row: RollupRow) -> None:
+        """
+        在榜记录被修改后就地更新分数
+
+        汇总已满且新分数排到原最低名次之后时，汇总之外排名最高的记录可能超过它，
+        只需按键集查询读取一条候选记录比较
+        """
+        count, lowest = self._lowest(db, period, start)
+        db.execute(
+            update(LeaderboardRollup)
+            .where(LeaderboardRollup.period == period, LeaderboardRollup.period_start == start,
+                   LeaderboardRollup.game_id == row[0])
+            .values(score=row[1])
+        )
+        if count < self.top_n or _rank_key(row) >= _rank_key(lowest):
+            return
+        candidate = self._next_below(db, period, start, lowest, exclude=row[0])
+        if candidate is not None and _rank_key(candidate) > _rank_key(row):
+            self._delete_rows(db, period, start, [row[0]])
+            self._insert_rows(db, period, start, [candidate])
+
+    def _next_below(
+        self, db: Session, period: str, start: date, below: RollupRow, exclude: int
+    ) -> Optional[RollupRow]:
+        """
+        周期内排在 below 之后的第一条记录
+
+        按 (score, created_at, id) 键集从 below 往下读取一行（沿 idx_score_created 索引），
+        不需要扫描整个周期再排序
+        """
+        _, end = period_bounds(period, start)
+        game_id, score, created_at = below
+        row = db.execute(
+            select(Game.id, Game.score, Game.created_at)
+            .where(
+                tuple_(Game.score, Game.created_at, Game.id) < tuple_(score, created_at, game_id),
+                Game.created_at >= _utc_boundary(start), Game.created_at < _utc_boundary(end),
+                Game.id != exclude,
+            )
+            .order_by(desc(Game.score), desc(Game.created_at), desc(Game.id))
+            .limit(1)
+        ).first()
+        return None if row is None else tuple(row)
+
+    def _insert_next(self, db: Session, period: str, start: date, below: RollupRow, exclude: int) -> None:
+        candidate = self._next_below(db, period, start, below, exclude)
+        if candidate is not None:
+            self._insert_rows(db, period, start, [candidate])
+
+    def _insert_rows(self, db: Session, period: str, start: date, rows: Iterable[RollupRow]) -> None:
+        db.execute(insert(LeaderboardRollup), [
+            {"period": period, "period_start": start, "game_id": game_id,
+             "score": score, "created_at": created_at}
+            for game_id, score, created_at in rows
+        ])
+
+    def _delete_rows(self, db: Session, period: str, start: date, game_ids: Iterable[int]) -> None:
+        db.execute(delete(LeaderboardRollup).where(
+            LeaderboardRollup.period == period,
+            LeaderboardRollup.period_start == start,
+            LeaderboardRollup.game_id.in_(list(game_ids)),
+        ))
+
+    def _groups_of(self, db: Session, game_id: int) -> List[GroupKey]:
+        return [
+            (period, start) for period, start in db.execute(
+                select(LeaderboardRollup.period, LeaderboardRollup.period_start)
+                .where(LeaderboardRollup.game_id == game_id)
+            )
+        ]
+
+    def _top_from_games(self, db: Session, period: str, start: date, columns) -> list:
+        """从 games 表按 created_at 范围查询周期前 N 名（走 idx_created_id 范围扫描后排序）"""
+        _, end = period_bounds(period, start)
+        stmt = select(*columns).where(
+            Game.created_at >= _utc_boundary(start), Game.created_at < _utc_boundary(end)
+        )
+        return db.execute(
+            stmt.order_by(desc(Game.score), desc(Game.created_at), desc(Game.id)).limit(self.top_n)
+        ).all()
+
+    def _refill(self, db: Session, period: str, start: date) -> None:
+        """根据 games 表重新计算一个周期的汇总（只用于 rebuild，范围查询的开销与周期内的记录数成正比）"""
+        db.execute(delete(LeaderboardRollup).where(
+            LeaderboardRollup.period == period, LeaderboardRollup.period_start == start
+        ))
+        rows = self._top_from_games(db, period, start, (Game.id, Game.score, Game.created_at))
+        if rows:
+            self._insert_rows(db, period, start, rows)
+
+    def _is_frozen(self, db: Session, period: str, start: date) -> bool:
+        return db.get(LeaderboardSnapshot, (period, start)) is not None
+
+    def _snapshot(self, db: Session, period: str, start: date) -> Optional[List[dict]]:
+        entries = db.scalar(select(LeaderboardSnapshot.entries).where(
+            LeaderboardSnapshot.period == period, LeaderboardSnapshot.period_start == start
+        ))
+        return None if entries is None else json.loads(entries)
+
+    def _freeze_before(self, db: Session, period: str, start: date) -> None:
+        """冻结同类型中开始日期早于 start 的周期"""
+        for (older,) in db.execute(
+            select(LeaderboardRollup.period_start).distinct()
+            .where(LeaderboardRollup.period == period, LeaderboardRollup.period_start < start)
+        ).all():
+            self._write_snapshot(db, period, older)
+
+    def _ended_rows(self, db: Session, period: str, start: date) -> list:
+        """已结束周期的前 N 名：读取汇总行，没有汇总行的周期（如汇总表建立之前）从 games 表计算"""
+        has_rollup = db.scalar(select(LeaderboardRollup.game_id).where(
+            LeaderboardRollup.period == period, LeaderboardRollup.period_start == start
+        ).limit(1)) is not None
+        if has_rollup:
+            return db.execute(self._rollup_entries(period, start)).all()
+        return self._top_from_games(db, period, start, _ENTRY_COLUMNS)
+
+    def _write_snapshot(self, db: Session, period: str, start: date) -> None:
+        """写入快照并删除该周期的汇总行"""
+        rows = self._ended_rows(db, period, start)
+        encoded = json_codec.dumps_records(GAME_RESPONSE_FIELDS, rows).decode("utf-8")
+        db.execute(insert(LeaderboardSnapshot).values(period=period, period_start=start, entries=encoded))
+        db.execute(delete(LeaderboardRollup).where(
+            LeaderboardRollup.period == period, LeaderboardRollup.period_start == start
+        ))
+
+
+period_leaderboards = PeriodLeaderboards()
@@ -0,0 +1,392 @@
+"""
+俄罗斯方块回放引擎
+按前端 GameEngine / PieceManager / CollisionDetector / LineClearManager 的规则，
+用提交的随机种子和操作序列重放整局游戏，重新计算分数、消除行数与等级
+
+- 棋盘整体是一个整数位掩码（第 y 行第 x 列对应第 y * COLS + x 位），
+  碰撞判断是一次按位与，满行判断与消除是移位运算
+- 每种方块每个旋转状态在每个合法位置上的掩码在导入时预先算好
+- 操作序列每个字符一个操作：L 左移、R 右移、D 下移一格（按键或自动下落）、
+  H 硬降、U 旋转；回放只关心操作顺序，与操作发生的时间无关
+
+前端 7-Bag 使用 Math.random 打乱，无法重放。回放约定每局使用 32 位种子初始化
+mulberry32 生成器，以 Fisher-Yates 打乱方块袋（从袋尾取出），客户端按同样方式出块
+"""
+import random
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from ..config import settings
+
+COLS = 15
+ROWS = 20
+MAX_LEVEL = 20
+LINE_SCORES = (0, 100, 300, 500, 800)
+PIECE_TYPES = "IOTSZJL"
+ACTIONS = "LRDHU"
+
+# 旋转时依次尝试的横向偏移（墙踢）
+_KICKS = (0, -1, 1, -2, 2)
+
+_FULL_ROW = (1 << COLS) - 1
+_MASK32 = 0xFFFFFFFF
+
+# 与前端 PIECE_SHAPES 一致，顺序同 PIECE_TYPES
+_SHAPES = (
+    (
+        ((1, 1, 1, 1),),
+        ((1,), (1,), (1,), (1,)),
+        ((1, 1, 1, 1),),
+        ((1,), (1,), (1,), (1,)),
+    ),
+    (
+        ((1, 1), (1, 1)),
+    ) * 4,
+    (
+        ((0, 1, 0), (1, 1, 1)),
+        ((1, 0), (1, 1), (1, 0)),
+        ((1, 1, 1), (0, 1, 0)),
+        ((0, 1), (1, 1), (0, 1)),
+    ),
+    (
+        ((0, 1, 1), (1, 1, 0)),
+        ((1, 0), (1, 1), (0, 1)),
+        ((0, 1, 1), (1, 1, 0)),
+        ((1, 0), (1, 1), (0, 1)),
+    ),
+    (
+        ((1, 1, 0), (0, 1, 1)),
+        ((0, 1), (1, 1), (1, 0)),
+        ((1, 1, 0), (0, 1, 1)),
+        ((0, 1), (1, 1), (1, 0)),
+    ),
+    (
+        ((1, 0, 0), (1, 1, 1)),
+        ((1, 1), (1, 0), (1, 0)),
+        ((1, 1, 1), (0, 0, 1)),
+        ((0, 1), (0, 1), (1, 1)),
+    ),
+    (
+        ((0, 0, 1), (1, 1, 1)),
+        ((1, 0), (1, 0), (1, 1)),
+        ((1, 1, 1), (1, 0, 0)),
+        ((1, 1), (0, 1), (0, 1)),
+    ),
+)
+
+
+class _Shape(NamedTuple):
+    """
+    某个旋转状态的预计算数据
+
+    placements[x][y] 为方块放在 (x, y) 时在整块棋盘上的位掩码；横向只收录不越界的位置，
+    纵向多收录一格，该位置与棋盘底部的地板行重叠，下落判断无需再检查边界
+    """
+    width: int
+    height: int
+    placements: Tuple[Tuple[int, ...], ...]
+
+
+def _build_table() -> Tuple[Tuple[_Shape, ...], ...]:
+    table = []
+    for rotations in _SHAPES:
+        shapes = []
+        for cells in rotations:
+            width, height = len(cells[0]), len(cells)
+            packed = 0
+            for i, row in enumerate(cells):
+                packed |= sum(1 << j for j, cell in enumerate(row) if cell) << (i * COLS)
+            placements = tuple(
+                tuple(packed << (y * COLS + x) for y in range(ROWS - height + 2))
+                for x in range(COLS - width + 1)
+            )
+            shapes.append(_Shape(width, height, placements))
+        table.append(tuple(shapes))
+    return tuple(table)
+
+
+_TABLE = _build_table()
+# 出生横坐标：floor((列数 - 首行宽度) / 2)
+_SPAWN_X = tuple((COLS - shapes[0].width) // 2 for shapes in _TABLE)
+# 各行在棋盘整数中的位掩码
+_ROW_MASKS = tuple(_FULL_ROW << (row * COLS) for row in range(ROWS))
+# 空棋盘：第 ROWS 行是始终占满的地板
+_EMPTY_BOARD = _FULL_ROW << (ROWS * COLS)
+
+
+class ReplayResult(NamedTuple):
+    """回放结果"""
+    score: int
+    lines: int
+    level: int
+    pieces: int  # 已出现的方块数（含结束时无法放置的方块）
+    game_over: bool
+    actions: int  # 实际执行的操作数，游戏结束后的操作被忽略
+
+
+def mulberry32(seed: int) -> Iterator[int]:
+    """mulberry32 伪随机数生成器，逐个产出 32 位无符号整数（与 JS 实现逐位一致）"""
+    state = seed & _MASK32
+    while True:
+        state = (state + 0x6D2B79F5) & _MASK32
+        t = ((state ^ (state >> 15)) * (state | 1)) & _MASK32
+        t = ((t + (((t ^ (t >> 7)) * (t | 61)) & _MASK32)) & _MASK32) ^ t
+        yield t ^ (t >> 14)
+
+
+def piece_sequence(seed: int) -> Iterator[int]:
+    """按种子产出方块序列（PIECE_TYPES 下标），每袋 7 种各一个"""
+    rng = mulberry32(seed)
+    while True:
+        bag = list(range(len(PIECE_TYPES)))
+        for i in range(len(bag) - 1, 0, -1):
+            # 等价于 JS 的 Math.floor(rng() / 2**32 * (i + 1))
+            j = (next(rng) * (i + 1)) >> 32
+            bag[i], bag[j] = bag[j], bag[i]
+        while bag:
+            yield bag.pop()
+
+
+def _fits(board: int, shape: _Shape, x: int, y: int) -> bool:
+    """方块能否放在 (x, y)：不越界且不与已固定的格子重叠"""
+    if x < 0 or x >= len(shape.placements) or y >= len(shape.placements[x]):
+        return False
+    return not board & shape.placements[x][y]
+
+
+def _lock(board: int, shape: _Shape, x: int, y: int) -> Tuple[int, int]:
+    """固定方块并消除满行，返回新棋盘与消除行数"""
+    board |= shape.placements[x][y]
+    cleared = 0
+    # 自上而下消除：消除第 row 行只移动其上方的行，下方待检查的行位置不变
+    for row in range(y, y + shape.height):
+        mask = _ROW_MASKS[row]
+        if board & mask == mask:
+            below = row * COLS
+            board = (board >> (below + COLS) << (below + COLS)) | ((board & ((1 << below) - 1)) << COLS)
+            cleared += 1
+    return board, cleared
+
+
+def drop_interval(level: int) -> int:
+    """自动下落间隔（毫秒），与前端 calculateDropInterval 一致"""
+    return int(1000 / (1 + (level - 1) * 0.1))
+
+
+def _level_after(lines: int, level: int) -> int:
+    """消除后的等级，只升不降且不超过 MAX_LEVEL"""
+    new_level = lines // settings.LINES_PER_LEVEL + 1
+    return new_level if level < new_level <= MAX_LEVEL else level
+
+
+def replay(seed: int, actions: Union[str, bytes]) -> ReplayResult:
+    """
+    从空棋盘重放一局游戏
+
+    出块、移动、旋转（含墙踢）、锁定、消行计分与升级规则均与前端一致；
+    出生位置被占用时游戏结束，之后的操作不再执行。遇到未知操作抛出 ValueError
+    """
+    if isinstance(actions, str):
+        actions = actions.encode("ascii", "replace")
+    pieces = piece_sequence(seed)
+    table, spawn_x = _TABLE, _SPAWN_X
+    board = _EMPTY_BOARD
+    score = lines = 0
+    level = 1
+
+    kind = next(pieces)
+    rotation = y = 0
+    shape = table[kind][0]
+    x = spawn_x[kind]
+    column = shape.placements[x]  # 当前横坐标上各纵坐标的掩码
+    count = 1
+
+    done = 0
+    for code in actions:
+        done += 1
+        if code == 68 or code == 72:  # D / H
+            if not board & column[y + 1]:
+                y += 1
+                if code == 68:
+                    continue
+                while not board & column[y + 1]:
+                    y += 1
+            board, cleared = _lock(board, shape, x, y)
+            if cleared:
+                score += LINE_SCORES[min(cleared, 4)] * level
+                lines += cleared
+                level = _level_after(lines, level)
+            kind = next(pieces)
+            rotation = y = 0
+            shape = table[kind][0]
+            x = spawn_x[kind]
+            column = shape.placements[x]
+            count += 1
+            if board & column[0]:
+                return ReplayResult(score, lines, level, count, True, done)
+        elif code == 76:  # L
+            if x and not board & shape.placements[x - 1][y]:
+                x -= 1
+                column = shape.placements[x]
+        elif code == 82:  # R
+            if x + 1 < len(shape.placements) and not board & shape.placements[x + 1][y]:
+                x += 1
+                column = shape.placements[x]
+        elif code == 85:  # U
+            turned = table[kind][(rotation + 1) & 3]
+            for kick in _KICKS:
+                if _fits(board, turned, x + kick, y):
+                    rotation = (rotation + 1) & 3
+                    shape = turned
+                    x += kick
+                    column = shape.placements[x]
+                    break
+        else:
+            raise ValueError(f"未知操作: {chr(code)!r}（位置 {done - 1}）")
+
+    return ReplayResult(score, lines, level, count, False, done)
+
+
+def autoplay(seed: int, max_pieces: int = 200, soft_drops: int = 2) -> str:
+    """
+    生成一局可回放的操作序列（贪心放置：优先消行，其次少留空洞、落点更低）
+
+    用于测试、基准和演示数据；每个方块先旋转、再平移，下移 soft_drops 格后硬降
+    """
+    pieces = piece_sequence(seed)
+    board = _EMPTY_BOARD
+    actions: List[str] = []
+    kind = next(pieces)
+    for _ in range(max_pieces):
+        if not _fits(board, _TABLE[kind][0], _SPAWN_X[kind], 0):
+            break
+        rotation, target = _best_placement(board, kind)
+        shape, x, y = _TABLE[kind][0], _SPAWN_X[kind], 0
+
+        # 按与 replay 相同的规则逐步执行，保证生成的序列与回放一致
+        current = 0
+        for _ in range(rotation):
+            turned = _TABLE[kind][(current + 1) & 3]
+            for kick in _KICKS:
+                if _fits(board, turned, x + kick, y):
+                    current = (current + 1) & 3
+                    shape = turned
+                    x += kick
+                    break
+            actions.append("U")
+        step, move = (1, "R") if target > x else (-1, "L")
+        while x != target and _fits(board, shape, x + step, y):
+            x += step
+            actions.append(move)
+        for _ in range(soft_drops):
+            if not _fits(board, shape, x, y + 1):
+                break
+            y += 1
+            actions.append("D")
+        while _fits(board, shape, x, y + 1):
+            y += 1
+        actions.append("H")
+        board, _ = _lock(board, shape, x, y)
+        kind = next(pieces)
+    return "".join(actions)
+
+
+def autoplay_timed(
+    seed: int, max_pieces: int = 200, think_ms: int = 500, key_ms: int = 120
+) -> Tuple[str, List[int]]:
+    """
+    生成带时间戳的操作序列，模拟真人节奏：方块出现后思考 think_ms 毫秒，
+    之后约每 key_ms 毫秒按一次键（旋转、平移，最后硬降），其间按当前等级的下落间隔插入自动下落 D；
+    思考与按键间隔按种子随机浮动 ±50%，自动下落另有帧间隔带来的 0-16 毫秒误差
+
+    返回 (操作序列, 各操作距开局的毫秒数)，落点选择同 autoplay
+    """
+    rng = random.Random(seed)
+    pieces = piece_sequence(seed)
+    board = _EMPTY_BOARD
+    actions: List[str] = []
+    times: List[int] = []
+    now = lines = 0
+    level = 1
+    next_tick = drop_interval(level)
+    kind = next(pieces)
+    for _ in range(max_pieces):
+        shape, x, y, rotation = _TABLE[kind][0], _SPAWN_X[kind], 0, 0
+        if not _fits(board, shape, x, y):
+            break
+        target_rotation, target = _best_placement(board, kind)
+        key_at = now + int(think_ms * rng.uniform(0.5, 1.5))
+        while True:
+            if next_tick <= key_at:
+                now = next_tick
+                next_tick = now + drop_interval(level) + rng.randrange(17)
+                actions.append("D")
+                times.append(now)
+                if _fits(board, shape, x, y + 1):
+                    y += 1
+                    continue
+                break
+
+            now = key_at
+            key_at += int(key_ms * rng.uniform(0.5, 1.5))
+            if rotation != target_rotation:
+                actions.append("U")
+                times.append(now)
+                turned = _TABLE[kind][(rotation + 1) & 3]
+                for kick in _KICKS:
+                    if _fits(board, turned, x + kick, y):
+                        rotation = (rotation + 1) & 3
+                        shape = turned
+                        x += kick
+                        break
+                else:
+                    target_rotation = rotation  # 转不动时放弃旋转
+            elif x != target:
+                step, move = (1, "R") if target > x else (-1, "L")
+                actions.append(move)
+                times.append(now)
+                if _fits(board, shape, x + step, y):
+                    x += step
+                else:
+                    target = x
+            else:
+                actions.append("H")
+                times.append(now)
+                while _fits(board, shape, x, y + 1):
+                    y += 1
+                next_tick = now + drop_interval(level)  # 硬降重置下落计时
+                break
+
+        board, cleared = _lock(board, shape, x, y)
+        lines += cleared
+        level = _level_after(lines, level)
+        kind = next(pieces)
+    return "".join(actions), times
+
+
+def _best_placement(board: int, kind: int) -> Tuple[int, int]:
+    """在出生行可达的各旋转与横坐标中选出评分最高的落点"""
+    best: Optional[Tuple[float, int, int]] = None
+    for rotation, shape in enumerate(_TABLE[kind]):
+        for x in range(len(shape.placements)):
+            if not _fits(board, shape, x, 0):
+                continue
+            y = 0
+            while _fits(board, shape, x, y + 1):
+                y += 1
+            after, cleared = _lock(board, shape, x, y)
+            value = cleared * 10 - _holes(after) * 4 + y + shape.height * 0.5
+            if best is None or value > best[0]:
+                best = (value, rotation, x)
+    if best is None:
+        return 0, _SPAWN_X[kind]
+    return best[1], best[2]
+
+
+def _holes(board: int) -> int:
+    """被上方格子覆盖的空格数"""
+    covered = holes = 0
+    for row in range(ROWS):
+        cells = (board >> (row * COLS)) & _FULL_ROW
+        holes += (covered & ~cells).bit_count()
+        covered |= cells
+    return holes
@@ -0,0 +1,99 @@
+"""
+回放流式读取
+
+SQLite 文件数据库使用独立的只读连接，通过增量 BLOB I/O（sqlite3 blobopen，Python 3.11+）分块读取，
+Python 3.10 下在同一读事务中用 substr() 分块读取，都不会把整段回放读入内存；
+回放在构造响应之前打开，下载过程中读取的是打开时的版本；
+内存数据库等无法另开连接的情况退化为整段读取后分块返回
+"""
+import sqlite3
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+from sqlalchemy.engine import make_url
+
+from ..config import settings
+from ..models.game_replay import GameReplayBlob
+
+REPLAY_CHUNK_SIZE = 16 * 1024
+
+
+def sqlite_file_path(bind) -> Optional[str]:
+    """SQLite 文件数据库的路径，其他数据库与内存数据库返回 None"""
+    url = make_url(str(getattr(bind, "url", bind)))
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+class SQLiteReplayBlob:
+    """
+    已打开的回放 BLOB（由 open_sqlite_blob 创建），迭代时分块返回内容，结束后关闭连接
+
+    打开时即定位回放并取得长度，之后的读取都在同一读事务（快照）中进行：
+    回放在响应头发出之后被删除，已开始的下载仍返回完整内容
+    """
+
+    def __init__(self, conn: sqlite3.Connection, game_id: int, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._conn: Optional[sqlite3.Connection] = conn
+        self._game_id = game_id
+        table, column = GameReplayBlob.__tablename__, GameReplayBlob.data.key
+        if hasattr(conn, "blobopen"):
+            self._blob = conn.blobopen(table, column, game_id, readonly=True)
+            self.size = len(self._blob)
+        else:
+            # Python 3.10 没有 blobopen：在读事务中用 substr() 分块读取
+            self._blob = None
+            conn.execute("BEGIN")
+            row = conn.execute(f"SELECT length({column}) FROM {table} WHERE rowid = ?", (game_id,)).fetchone()
+            if row is None:
+                raise sqlite3.OperationalError("no such rowid: %d" % game_id)
+            self.size = row[0]
+            self._query = f"SELECT substr({column}, ?, ?) FROM {table} WHERE rowid = ?"
+
+    def __iter__(self) -> Iterator[bytes]:
+        """同步迭代（由 StreamingResponse 在线程池中进行）"""
+        try:
+            if self._blob is not None:
+                while chunk := self._blob.read(self.chunk_size):
+                    yield chunk
+            else:
+                for start in range(1, self.size + 1, self.chunk_size):
+                    yield self._conn.execute(self._query, (start, self.chunk_size, self._game_id)).fetchone()[0]
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        if self._blob is not None:
+            self._blob.close()
+        self._conn.close()
+        self._conn = None
+
+
+def open_sqlite_blob(path: str, game_id: int, chunk_size: int = REPLAY_CHUNK_SIZE) -> Optional[SQLiteReplayBlob]:
+    """
+    用独立的只读连接打开回放（game_replays.game_id 即 rowid），回放不存在时返回 None
+
+    同步调用，应在线程中执行；在构造响应之前打开，回放不存在时可以返回 404 而不是空的 200
+    """
+    conn = sqlite3.connect(
+        f"file:{quote(path)}?mode=ro", uri=True, check_same_thread=False,
+        timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    )
+    try:
+        return SQLiteReplayBlob(conn, game_id, chunk_size)
+    except sqlite3.OperationalError:
+        conn.close()
+        return None
+    except BaseException:
+        conn.close()
+        raise
+
+
+def iter_bytes(data: bytes, chunk_size: int = REPLAY_CHUNK_SIZE) -> Iterator[bytes]:
+    """把已读入内存的回放分块返回"""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
@@ -0,0 +1,71 @@
+"""
+回放校验
+
+在进程池中重放提交的对局（见 replay.replay），比对重算的分数、消除行数与等级，
+回放是纯 CPU 计算，放在独立进程中执行，不占用 API 事件循环，也不受 GIL 限制
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from ..config import settings
+from ..schemas.game import GameCreate
+from ..utils.logger import get_logger
+from ..utils.metrics import registry
+from .replay import ReplayResult, replay
+
+logger = get_logger("replay")
+
+replay_verifications = registry.counter(
+    "replay_verifications_total", "回放校验次数", ("result",)
+)
+
+
+class ReplayVerifier:
+    """回放校验器，workers 为 0 时在当前进程内直接重放（测试与开发环境）"""
+
+    def __init__(self, workers: int = settings.REPLAY_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    def start(self) -> None:
+        """创建进程池，子进程在首次提交任务时启动"""
+        if self._pool is None and self.workers > 0:
+            # 使用 spawn：父进程中已有日志、数据库等线程，fork 可能继承被占用的锁
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def stop(self) -> None:
+        """关闭进程池，未开始的任务被取消"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def replay(self, seed: int, actions: str) -> ReplayResult:
+        """重放一局游戏"""
+        if self._pool is None:
+            return replay(seed, actions)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, replay, seed, actions)
+
+    async def verify(self, game: GameCreate) -> Optional[str]:
+        """校验记录附带的回放，一致时返回 None，否则返回不一致的说明"""
+        result = await self.replay(game.replay.seed, game.replay.actions)
+        mismatched = [
+            f"{field} 提交 {getattr(game, field)}，回放 {getattr(result, field)}"
+            for field in ("score", "lines", "level")
+            if getattr(game, field) != getattr(result, field)
+        ]
+        replay_verifications.inc("mismatch" if mismatched else "ok")
+        if mismatched:
+            logger.warning("回放校验失败: player=%s %s", game.player_name, "; ".join(mismatched))
+            return "; ".join(mismatched)
+        return None
+
+
+replay_verifier = ReplayVerifier()
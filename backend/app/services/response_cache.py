@@ -0,0 +1,100 @@
+"""
+响应缓存
+缓存已序列化的 JSON 响应体，并提供强 ETag 与 If-None-Match / 304 支持；
+ETag 由响应内容的哈希派生，不依赖进程内的版本号，多 worker 部署时各 worker 一致
+
+缓存条目带有有效性令牌（排行榜为索引的 top_version，单条记录为索引中的记录快照），
+令牌不一致即视为失效，因此任何经由服务层的写入都会精确地使相关条目失效
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from ..config import settings
+
+
+class CachedResponse(NamedTuple):
+    """缓存条目"""
+    token: Any
+    etag: str
+    body: bytes
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中 ETag（强比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    """304 响应"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+class ResponseCache:
+    """按 LRU 淘汰的响应缓存"""
+
+    def __init__(self, max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def content_etag(self, body: bytes) -> str:
+        """由响应内容派生的 ETag（多个 worker 对相同内容给出相同的 ETag）"""
+        return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+    def get(self, key: Hashable, token: Any) -> Optional[CachedResponse]:
+        """获取仍然有效的缓存条目"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.token != token:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, token: Any, etag: str, body: bytes) -> CachedResponse:
+        """写入缓存条目"""
+        entry = CachedResponse(token, etag, body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: Hashable) -> None:
+        """删除缓存条目"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def respond(
+        self, request: Request, entry: CachedResponse,
+        cache_control: str = "no-cache", headers: Optional[dict] = None,
+    ) -> Response:
+        """根据 If-None-Match 返回 304 或缓存的响应体"""
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            response = not_modified(entry.etag)
+            response.headers["Cache-Control"] = cache_control
+            return response
+        return Response(
+            content=entry.body,
+            media_type="application/json",
+            headers={**(headers or {}), "ETag": entry.etag, "Cache-Control": cache_control},
+        )
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,119 @@
+"""
+分数分布草图（对数分桶直方图）
+
+HDR 风格分桶：小于 128 的分数每个值一个桶；更大的分数按 2 的幂分段，每段均分为 64 个桶，
+桶宽不超过桶内数值的 1/64，以桶中点估计的分位数相对误差不超过 1/128。
+桶计数可以相加（合并）也可以相减（修改、删除记录），因此按等级分别维护，整体分布为各等级之和
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SUB_BUCKET_BITS = 7
+_EXACT = 1 << SUB_BUCKET_BITS  # 小于该值的分数精确计数
+_HALF = _EXACT >> 1  # 每个 2 的幂分段内的桶数
+
+
+def bucket_of(score: int) -> int:
+    """分数所在的桶号（随分数单调不减）"""
+    if score < _EXACT:
+        return score
+    shift = score.bit_length() - SUB_BUCKET_BITS
+    return _HALF * shift + (score >> shift)
+
+
+def bucket_bounds(bucket: int) -> Tuple[int, int]:
+    """桶内分数的范围 [low, high]"""
+    if bucket < _EXACT:
+        return bucket, bucket
+    shift = bucket // _HALF - 1
+    low = (bucket - _HALF * shift) << shift
+    return low, low + (1 << shift) - 1
+
+
+def bucket_value(bucket: int) -> int:
+    """桶的代表值（中点）"""
+    low, high = bucket_bounds(bucket)
+    return (low + high) // 2
+
+
+class ScoreSketch:
+    """单个分数分布：桶号 -> 记录数"""
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        for bucket, count in (counts or {}).items():
+            self.add_bucket(bucket, count)
+
+    def add(self, score: int, count: int = 1) -> None:
+        self.add_bucket(bucket_of(score), count)
+
+    def add_bucket(self, bucket: int, count: int) -> None:
+        value = self.counts.get(bucket, 0) + count
+        if value > 0:
+            self.counts[bucket] = value
+        else:
+            self.counts.pop(bucket, None)
+        self.total += count
+
+    def merge(self, other: "ScoreSketch") -> "ScoreSketch":
+        """合并另一个分布（原地），返回自身"""
+        for bucket, count in other.counts.items():
+            self.add_bucket(bucket, count)
+        return self
+
+    def quantile(self, q: float) -> Optional[int]:
+        """第 q 分位数（0 <= q <= 1，最近秩法），分布为空时返回 None"""
+        if self.total <= 0:
+            return None
+        target = max(math.ceil(q * self.total), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return bucket_value(bucket)
+        return bucket_value(max(self.counts))
+
+    def fraction_below(self, score: int) -> float:
+        """分数低于 score 的记录比例"""
+        target = bucket_of(score)
+        below = sum(count for bucket, count in self.counts.items() if bucket < target)
+        return fraction_below(score, below, self.counts.get(target, 0), self.total)
+
+    def upper_bound(self) -> int:
+        """最高桶的上界，分布为空时为 0"""
+        return bucket_bounds(max(self.counts))[1] if self.counts else 0
+
+    def histogram(self, width: int, bins: int) -> List[int]:
+        """按 [i * width, (i + 1) * width) 等宽分组的记录数（各桶按中点归组）"""
+        result = [0] * bins
+        for bucket, count in self.counts.items():
+            result[min(bucket_value(bucket) // width, bins - 1)] += count
+        return result
+
+
+def bin_width(upper: int, bins: int) -> int:
+    """覆盖 [0, upper] 最多 bins 个等宽分组时的分组宽度，取不小于 upper / bins 的 1、2、5 × 10^k"""
+    raw = max(-(-(upper + 1) // bins), 1)
+    scale = 10 ** (len(str(raw)) - 1)
+    return next(step * scale for step in (1, 2, 5, 10) if step * scale >= raw)
+
+
+def fraction_below(score: int, below: int, same_bucket: int, total: int) -> float:
+    """
+    分数低于 score 的记录比例
+
+    below 为更低分桶的记录数，same_bucket 为 score 所在分桶的记录数（桶内按均匀分布插值）
+    """
+    if total <= 0:
+        return 0.0
+    low, high = bucket_bounds(bucket_of(score))
+    return (below + same_bucket * (score - low) / (high - low + 1)) / total
+
+
+def merge_sketches(sketches: Iterable[ScoreSketch]) -> ScoreSketch:
+    """合并多个分布为新的分布"""
+    merged = ScoreSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
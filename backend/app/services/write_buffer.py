@@ -0,0 +1,117 @@
+"""
+游戏记录写入缓冲（组提交）
+
+开启后 POST /api/games 不再逐条提交事务：单个写入任务收集最多 GROUP_COMMIT_MAX_DELAY_MS 毫秒
+或 GROUP_COMMIT_MAX_BATCH 条记录，在同一事务中写入后再分别唤醒等待的请求，
+将每条记录一次 fsync 合并为每批一次，并避免并发写入时的 "database is locked"
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from ..config import settings
+from ..schemas.game import GameCreate
+from ..utils.logger import logger
+from .async_game_service import async_game_service
+from .leaderboard_index import LeaderboardRow
+
+_Pending = Tuple[GameCreate, asyncio.Future]
+
+
+class GameWriteBuffer:
+    """组提交写入缓冲"""
+
+    def __init__(
+        self,
+        max_delay_ms: float = settings.GROUP_COMMIT_MAX_DELAY_MS,
+        max_batch: int = settings.GROUP_COMMIT_MAX_BATCH,
+    ):
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self._session_factory: Optional[async_sessionmaker] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.records = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, session_factory: async_sessionmaker) -> None:
+        """启动写入任务（需在事件循环中调用）"""
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止写入任务，已提交的记录会先全部写入"""
+        if not self.running:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, game_data: GameCreate) -> LeaderboardRow:
+        """提交一条记录，所在批次提交后返回写入的记录"""
+        if not self.running:
+            raise RuntimeError("写入缓冲未启动")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((game_data, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[_Pending]) -> None:
+        """在同一事务中写入一批记录并唤醒等待的请求"""
+        try:
+            async with self._session_factory() as db:
+                saved = await async_game_service.save_game_records(db, [game for game, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # 整批失败时逐条重试，使每个请求得到各自的结果
+                logger.warning("组提交失败，逐条重试 %d 条记录: %s", len(batch), e)
+                for item in batch:
+                    await self._flush([item])
+                return
+            future = batch[0][1]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.records += len(saved)
+        for (_, future), row in zip(batch, saved):
+            # 请求可能已被取消（客户端断开），记录仍然保留
+            if not future.done():
+                future.set_result(row)
+
+
+game_write_buffer = GameWriteBuffer()
@@ -0,0 +1,60 @@
+"""
+JSON 编码工具
+按配置选择编码器：orjson（已安装时）或标准库 json，输出紧凑的 UTF-8 文本
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Sequence
+
+from ..config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """标准库 json 无法直接编码的类型"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_dumps_bytes(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _orjson_dumps_bytes(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def _resolve_encoder(name: str) -> Callable[[Any], bytes]:
+    """auto: 有 orjson 则使用 orjson；orjson: 强制使用（未安装时报错）；json: 标准库"""
+    if name == "json" or (name == "auto" and orjson is None):
+        return _json_dumps_bytes
+    if orjson is None:
+        raise RuntimeError("JSON_ENCODER=orjson 但未安装 orjson")
+    return _orjson_dumps_bytes
+
+
+def set_encoder(name: str) -> None:
+    """切换 JSON 编码器（auto/orjson/json）"""
+    global dumps_bytes, encoder_name
+    dumps_bytes = _resolve_encoder(name)
+    encoder_name = "orjson" if dumps_bytes is _orjson_dumps_bytes else "json"
+
+
+def dumps(obj: Any) -> str:
+    """编码为 JSON 文本"""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def dumps_records(fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """将按 fields 顺序排列的值元组编码为 JSON 对象数组"""
+    return dumps_bytes([dict(zip(fields, row)) for row in rows])
+
+
+dumps_bytes: Callable[[Any], bytes]
+encoder_name: str
+set_encoder(settings.JSON_ENCODER)
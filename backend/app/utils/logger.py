@@ -1,28 +1,149 @@
 """
 日志系统配置
+
+导入时只创建 logger，不打开任何文件；应用启动时由 setup_logging 安装队列日志：
+请求与事件循环中的日志调用只把记录放入队列，格式化和磁盘写入在后台监听线程中完成。
+
+- LOG_JSON=true 时输出 JSON Lines
+- LOG_ROTATION 为 date（每天零点轮转）、size（按 LOG_MAX_BYTES 轮转）或 none
+- LOG_SAMPLING 按 logger 名称配置采样率，高频的 INFO/DEBUG 日志只保留一部分，WARNING 及以上不采样
 """
+import itertools
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..config import settings
+from . import json_codec
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json_codec.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """按固定比例采样 INFO 及以下的日志（每 1/rate 条保留 1 条），WARNING 及以上全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.interval = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        return bool(self.interval) and next(self._counter) % self.interval == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队时不格式化日志
+
+    标准 QueueHandler 在调用方线程中格式化消息；这里直接把记录交给监听线程，
+    由监听线程中的 Handler 完成 %-格式化，调用方只付出创建记录和入队的开销。
+    因此日志参数应为不可变值（字符串、数字等）
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取 app 下的子 logger（如 get_logger("websocket") 即 app.websocket），可单独配置采样"""
+    return logger.getChild(name)
+
+
+def _file_handler(log_dir: str, rotation: str) -> logging.Handler:
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, "app.log")
+    # delay=True: 第一条日志写入时才打开文件
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT,
+            encoding="utf-8", delay=True,
+        )
+    if rotation == "date":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when="midnight", backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8", delay=True,
+        )
+    if rotation == "none":
+        return logging.FileHandler(path, encoding="utf-8", delay=True)
+    raise ValueError(f"无效的日志轮转方式: {rotation}")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_installed: List[logging.Handler] = []
+_filters: Dict[str, logging.Filter] = {}
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    log_dir: Optional[str] = settings.LOG_DIR,
+    json_lines: bool = settings.LOG_JSON,
+    rotation: str = settings.LOG_ROTATION,
+    sampling: Optional[Dict[str, float]] = None,
+) -> logging.handlers.QueueListener:
+    """安装队列日志并启动后台监听线程（重复调用时先关闭上一次的配置）"""
+    shutdown_logging()
+
+    formatter = JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_dir:
+        handlers.append(_file_handler(log_dir, rotation))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    _installed.append(queue_handler)
 
+    sampling = settings.LOG_SAMPLING if sampling is None else sampling
+    for name, rate in sampling.items():
+        sampling_filter = SamplingFilter(rate)
+        logging.getLogger(name).addFilter(sampling_filter)
+        _filters[name] = sampling_filter
 
-def setup_logger():
-    """配置日志系统"""
-    # 创建 logs 目录
-    os.makedirs("logs", exist_ok=True)
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
 
-    # 配置日志格式
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f"logs/app_{datetime.now().strftime('%Y%m%d')}.log", encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
 
-    return logging.getLogger(__name__)
+def shutdown_logging() -> None:
+    """停止监听线程（队列中剩余的日志会先写完）并移除安装的 Handler"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+    _installed.clear()
+    for name, sampling_filter in _filters.items():
+        logging.getLogger(name).removeFilter(sampling_filter)
+    _filters.clear()
 
 
-# 初始化日志
-logger = setup_logger()
+# 应用日志的根 logger；未调用 setup_logging 时沿用 logging 的默认行为
+logger = logging.getLogger("app")
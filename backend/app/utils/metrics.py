@@ -0,0 +1,186 @@
+"""
+运行时指标（Prometheus 文本格式）
+
+指标保存在进程内：每个 worker 各自计数，由 Prometheus 分别抓取后聚合。
+计数与直方图的更新只是列表元素自增，依赖 GIL 保证原子性，不加锁；
+仪表盘类指标（如当前连接数）在抓取时通过回调读取，不在热路径上维护
+"""
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        cell = self._values.get(labels)
+        if cell is None:
+            cell = self._values.setdefault(labels, [0])
+        cell[0] += amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, cell in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(cell[0])}"
+
+
+class Histogram:
+    """累积分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.bounds = tuple(sorted(buckets))
+        # labels -> [各分桶计数..., +Inf 分桶计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        cell = self._values.get(labels)
+        if cell is None:
+            cell = self._values.setdefault(labels, [0] * (len(self.bounds) + 2))
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, cell in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), cell):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}"
+            suffix = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{suffix} {_format_value(cell[-1])}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class CallbackMetric:
+    """抓取时通过回调读取的指标（仪表盘或由其他对象维护的计数）"""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> Iterable[str]:
+        yield f"{self.name} {_format_value(self.callback())}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        """注册指标，同名指标已存在时返回已有的"""
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, **kwargs))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"):
+        """注册回调指标，同名时替换回调"""
+        metric = CallbackMetric(name, documentation, callback, kind)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP请求数", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（秒）", ("method", "route")
+)
+db_statement_duration = registry.histogram(
+    "db_statement_duration_seconds", "SQL语句执行耗时（秒）", ("operation",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+ws_fanout_duration = registry.histogram(
+    "ws_broadcast_fanout_seconds", "WebSocket推送入队耗时（秒）", ("kind",),
+    buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+
+
+def _operation(statement: str) -> str:
+    """SQL语句类型（SELECT / INSERT / UPDATE / DELETE / 其他）"""
+    head = statement.lstrip()[:6].upper()
+    return head if head in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_start")
+    if starts:
+        db_statement_duration.observe(time.perf_counter() - starts.pop(), _operation(statement))
+
+
+def _handle_error(context):
+    # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+    conn = context.connection
+    if conn is not None and conn.info.get("metrics_start"):
+        conn.info["metrics_start"].pop()
+
+
+def install_sql_metrics(target=Engine) -> None:
+    """在引擎（默认所有引擎）上挂载 SQL 计时钩子"""
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
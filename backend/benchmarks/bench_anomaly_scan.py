@@ -0,0 +1,87 @@
+"""
+异常扫描基准测试
+
+在合成数据库（见 seed.py，首次运行时生成并缓存）上测量全量扫描的吞吐，
+再追加 --new-rows 条记录测量增量扫描的耗时，结束后删除追加的记录
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_anomaly_scan
+    python -m benchmarks.bench_anomaly_scan --rows 10000000 --chunk-size 200000 --json result.json
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import delete, func, insert, select
+
+from app.database.base import create_db_engine
+from app.database.dataset import generate_rows
+from app.models.game import Game
+from app.models.game_flag import GameFlag
+from app.services.anomaly_scan import AnomalyScanner
+
+from .seed import ensure_database, restore_database
+
+
+def run(rows: int, chunk_size: int, new_rows: int, db_dir: str) -> dict:
+    path = ensure_database(db_dir, rows)
+    engine = create_db_engine(f"sqlite:///{path}")
+    scanner = AnomalyScanner(chunk_size=chunk_size)
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        full = scanner.scan(engine, full=True)
+        full_s = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        with engine.begin() as conn:
+            max_id = conn.scalar(select(func.max(Game.id)))
+            for chunk in generate_rows(new_rows, seed=rows + 1, chunk_size=new_rows or 1):
+                conn.execute(insert(Game), chunk)
+        start = time.perf_counter()
+        incremental = scanner.scan(engine)
+        incremental_s = time.perf_counter() - start
+        with engine.begin() as conn:
+            conn.execute(delete(GameFlag).where(GameFlag.game_id > max_id))
+    finally:
+        engine.dispose()
+    restore_database(path, max_id)
+
+    return {
+        "rows": full.rows,
+        "chunk_size": chunk_size,
+        "full_seconds": round(full_s, 3),
+        "full_rows_per_s": round(full.rows / full_s),
+        "full_peak_mb": round(peak / 2 ** 20, 1),
+        "flagged": full.flagged,
+        "reasons": full.reasons,
+        "incremental_rows": incremental.rows,
+        "incremental_ms": round(incremental_s * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="异常扫描基准测试")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--new-rows", type=int, default=1000, help="增量扫描前追加的记录数")
+    parser.add_argument("--db-dir", default="benchmarks/data")
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    result = run(args.rows, args.chunk_size, args.new_rows, args.db_dir)
+
+    print(f"全量扫描 {result['rows']} 条: {result['full_seconds']}s "
+          f"({result['full_rows_per_s']:,} 条/秒，Python 内存峰值 {result['full_peak_mb']} MB)")
+    print(f"  标记 {result['flagged']} 条: {result['reasons']}")
+    print(f"增量扫描 {result['incremental_rows']} 条新记录: {result['incremental_ms']} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+API 负载与延迟基准测试
+
+通过 ASGITransport 在进程内驱动 FastAPI 应用（不经过网络），在预先生成的
+1万 / 100万 / 1000万 条记录的数据库上测量各场景的吞吐量与 p50/p99 延迟：
+
+- leaderboard          GET /api/leaderboard?limit=10
+- leaderboard_players  GET /api/leaderboard?distinct_players=true&limit=10（player_stats 最高分记录）
+- leaderboard_week     GET /api/leaderboard?period=week&limit=10（周期汇总表）
+- leaderboard_frozen   GET /api/leaderboard?period=month&at=<数据起始月份>&limit=10（已结束周期的快照）
+- score_distribution   GET /api/stats/distribution（分数分布汇总，整体与各等级）
+- game_percentile      GET /api/games/{id}/percentile
+- history_shallow      GET /api/games?limit=20
+- history_deep_offset  GET /api/games?skip=<一半行数>&limit=20
+- history_deep_cursor  GET /api/games?after=<一半行数处的游标>&limit=20
+- player_stats         GET /api/players/{name}/stats
+- single_save          POST /api/games（串行）
+- concurrent_save      POST /api/games（--concurrency 个并发）
+- ws_fanout            排行榜变化推送到 --ws-clients 个 WebSocket 客户端（与数据库无关，单独运行一次）
+
+写入的记录在每个数据库测完后删除，生成的数据库缓存在 --db-dir 下供下次复用。
+结果写入 JSON，--compare 与之前的结果对比 p50/p99 的变化
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_api --rows 10000 --json result.json
+    python -m benchmarks.bench_api --rows 10000 1000000 10000000 --requests 500 --json result.json
+    python -m benchmarks.bench_api --rows 10000 --compare result.json
+"""
+import os
+
+# 基准测试在短时间内大量请求同一接口，关闭速率限制
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api import websocket
+from app.database.base import create_async_db_engine, get_async_db
+from app.main import app
+from app.models.game import Game
+from app.models.player_stats import PlayerStats
+from app.services.async_game_service import async_game_service
+from app.services.game_service import encode_history_cursor
+from app.services.leaderboard_index import LeaderboardRow, leaderboard_indexes
+from app.utils import json_codec
+
+from .seed import ensure_database, restore_database
+
+# 默认回归判定阈值：p50 或 p99 变慢超过该比例时标记
+REGRESSION_THRESHOLD = 0.2
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """最近秩法求分位数"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(q * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies: List[float], wall: float, errors: int = 0) -> dict:
+    """汇总延迟样本（秒），输出毫秒"""
+    samples = sorted(latencies)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3) if samples else 0.0,
+    }
+
+
+async def measure(make_request: Callable[[int], Awaitable], requests: int, concurrency: int) -> dict:
+    """以 concurrency 个并发协程发出共 requests 个请求"""
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    result = summarize(latencies, time.perf_counter() - start, errors)
+    result["concurrency"] = concurrency
+    return result
+
+
+def _new_game(i: int) -> dict:
+    return {
+        "player_name": f"基准玩家{i % 100}",
+        "score": (i * 7919) % 1_000_000,
+        "level": i % 20 + 1,
+        "lines": i % 500,
+        "play_time": 60 + i % 600,
+    }
+
+
+async def run_database(path: str, rows: int, args) -> List[dict]:
+    """在一个数据库上运行全部 HTTP 场景"""
+    engine = create_async_db_engine(f"sqlite:///{path}")
+    factory = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with factory() as session:
+            yield session
+
+    async with factory() as db:
+        max_id = await db.scalar(select(func.max(Game.id))) or 0
+        names = list((await db.scalars(select(PlayerStats.player_name).limit(1000))).all())
+        deep = rows // 2
+        middle = (await db.scalars(
+            select(Game).order_by(desc(Game.created_at), desc(Game.id)).offset(deep).limit(1)
+        )).first()
+        cursor = encode_history_cursor(middle) if middle else None
+
+        # 排行榜内存索引在首个请求前加载，单独计时
+        start = time.perf_counter()
+        await async_game_service.load_leaderboard_index(db)
+        index_load = time.perf_counter() - start
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    saves = itertools.count()
+    results = [{"rows": rows, "scenario": "index_load", "seconds": round(index_load, 3)}]
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            scenarios = [
+                ("leaderboard", lambda i: client.get("/api/leaderboard?limit=10"), args.requests, args.concurrency),
+                ("leaderboard_players", lambda i: client.get("/api/leaderboard?distinct_players=true&limit=10"),
+                 args.requests, args.concurrency),
+                ("leaderboard_week", lambda i: client.get("/api/leaderboard?period=week&limit=10"),
+                 args.requests, args.concurrency),
+                ("leaderboard_frozen", lambda i: client.get("/api/leaderboard?period=month&at=2026-01-15&limit=10"),
+                 args.requests, args.concurrency),
+                ("score_distribution", lambda i: client.get("/api/stats/distribution"),
+                 args.requests, args.concurrency),
+                ("game_percentile", lambda i: client.get(f"/api/games/{i % max_id + 1}/percentile"),
+                 args.requests if max_id else 0, args.concurrency),
+                ("history_shallow", lambda i: client.get("/api/games?limit=20"), args.requests, args.concurrency),
+                ("history_deep_offset", lambda i: client.get(f"/api/games?skip={deep}&limit=20"),
+                 min(args.requests, args.deep_requests), args.concurrency),
+                ("history_deep_cursor", lambda i: client.get("/api/games", params={"after": cursor, "limit": 20}),
+                 args.requests if cursor else 0, args.concurrency),
+                ("player_stats", lambda i: client.get(f"/api/players/{names[i % len(names)]}/stats"),
+                 args.requests if names else 0, args.concurrency),
+                ("single_save", lambda i: client.post("/api/games", json=_new_game(next(saves))),
+                 args.requests, 1),
+                ("concurrent_save", lambda i: client.post("/api/games", json=_new_game(next(saves))),
+                 args.requests, args.concurrency),
+            ]
+            for name, make_request, requests, concurrency in scenarios:
+                if not requests:
+                    continue
+                # 预热，避免首次请求的连接与编译开销计入
+                await make_request(0)
+                result = await measure(make_request, requests, concurrency)
+                results.append({"rows": rows, "scenario": name, **result})
+                print(f"  {name:<22} {result['throughput_rps']:>10} req/s  "
+                      f"p50 {result['p50_ms']:>9} ms  p99 {result['p99_ms']:>9} ms"
+                      + (f"  errors {result['errors']}" if result["errors"] else ""))
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        leaderboard_indexes.reset(engine.sync_engine)
+        await engine.dispose()
+        restore_database(path, max_id)
+    return results
+
+
+class TimingWebSocket:
+    """记录每一帧送达时间的WebSocket"""
+
+    def __init__(self, stamps: List[float]):
+        self.stamps = stamps
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        self.stamps.append(time.perf_counter())
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run_ws_fanout(clients: int, rounds: int, limit: int = 10) -> dict:
+    """
+    WebSocket 推送扇出
+
+    每轮发布一条进入 Top N 的新记录，测量从 notify_leaderboard_update 调用到
+    各客户端写协程发出帧的延迟（单个客户端的 p50/p99 与最后一个客户端的完成时间）
+    """
+    manager = websocket.manager
+    stamps: List[float] = []
+    sockets = [TimingWebSocket(stamps) for _ in range(clients)]
+    for ws in sockets:
+        await manager.connect(ws)
+        manager.subscribe(ws, limit)
+
+    created = datetime(2026, 1, 1)
+    top = [
+        LeaderboardRow(i, f"玩家{i}", 1000 - i, 1, 0, 60, created)
+        for i in range(limit)
+    ]
+    manager.published_top = list(top)
+
+    deliveries: List[float] = []
+    completions: List[float] = []
+    try:
+        for r in range(rounds):
+            row = LeaderboardRow(10_000 + r, "基准玩家", 10_000 + r, 1, 0, 60, created + timedelta(seconds=r))
+            top = [row] + top[:limit - 1]
+            stamps.clear()
+            start = time.perf_counter()
+            await websocket.notify_leaderboard_update({"id": row.id, "score": row.score}, top)
+            while len(stamps) < clients:
+                await asyncio.sleep(0)
+            deliveries.extend(stamp - start for stamp in stamps)
+            completions.append(max(stamps) - start)
+    finally:
+        for ws in sockets:
+            manager.disconnect(ws)
+        manager.reset_leaderboard()
+        await asyncio.sleep(0)
+
+    delivery = summarize(deliveries, 0)
+    completion = summarize(completions, 0)
+    return {
+        "scenario": "ws_fanout",
+        "clients": clients,
+        "rounds": rounds,
+        "delivery_p50_ms": delivery["p50_ms"],
+        "delivery_p99_ms": delivery["p99_ms"],
+        "completion_p50_ms": completion["p50_ms"],
+        "completion_p99_ms": completion["p99_ms"],
+    }
+
+
+def compare(previous: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """对比两次运行的 p50/p99，返回变慢超过阈值的场景"""
+    def keyed(run):
+        return {(r.get("rows"), r["scenario"]): r for r in run["results"]}
+
+    old, regressions = keyed(previous), []
+    print(f"\n{'行数':>10} {'场景':<22} {'p50 变化':>10} {'p99 变化':>10}")
+    for key, result in keyed(current).items():
+        base = old.get(key)
+        if base is None or "p50_ms" not in result:
+            continue
+        changes = []
+        for field in ("p50_ms", "p99_ms"):
+            changes.append((result[field] - base[field]) / base[field] if base[field] else 0.0)
+        flag = " ⚠" if any(change > threshold for change in changes) else ""
+        print(f"{key[0]:>12} {key[1]:<22} {changes[0]:>+10.1%} {changes[1]:>+10.1%}{flag}")
+        if flag:
+            regressions.append(f"{key[0]}/{key[1]}")
+    return regressions
+
+
+async def run(args) -> dict:
+    results = []
+    for rows in args.rows:
+        start = time.perf_counter()
+        path = ensure_database(args.db_dir, rows, args.seed)
+        print(f"数据库 {rows} 条记录: {path}（准备 {time.perf_counter() - start:.1f}s）")
+        results.extend(await run_database(path, rows, args))
+    if args.ws_clients:
+        fanout = await run_ws_fanout(args.ws_clients, args.ws_rounds)
+        print(f"WebSocket 扇出 {fanout['clients']} 个客户端: 单客户端 p50 {fanout['delivery_p50_ms']} ms / "
+              f"p99 {fanout['delivery_p99_ms']} ms，全部送达 p99 {fanout['completion_p99_ms']} ms")
+        results.append(fanout)
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "encoder": json_codec.encoder_name,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="API 负载与延迟基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000],
+                        help="数据库记录数，可指定多个（如 10000 1000000 10000000）")
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--deep-requests", type=int, default=20, help="深分页 offset 场景的请求数上限")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发场景的并发数")
+    parser.add_argument("--ws-clients", type=int, default=1000, help="WebSocket 扇出的客户端数（0 跳过）")
+    parser.add_argument("--ws-rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0, help="数据生成的随机种子")
+    parser.add_argument("--db-dir", default="benchmarks/data", help="生成的数据库的缓存目录")
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    parser.add_argument("--compare", help="与之前的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="对比时判定为回退的变慢比例")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            raise SystemExit(f"性能回退: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
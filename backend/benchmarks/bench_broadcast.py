@@ -0,0 +1,120 @@
+"""
+WebSocket广播基准测试
+
+对比每个连接各自编码消息（旧实现 send_json）与只编码一次共享文本帧（当前实现）
+在 1k / 10k / 50k 连接下单次广播的 CPU 耗时
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_broadcast
+    python -m benchmarks.bench_broadcast --connections 1000 10000 --rounds 20 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.api.websocket import ConnectionManager
+from app.utils import json_codec
+
+MESSAGE = {
+    "type": "leaderboard_update",
+    "data": {
+        "id": 123456,
+        "player_name": "玩家_benchmark",
+        "score": 987654,
+        "level": 15,
+        "lines": 321,
+        "created_at": "2026-01-22T10:00:00.123456",
+    },
+}
+
+
+class NullWebSocket:
+    """丢弃所有消息的WebSocket"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def _drain(manager: ConnectionManager):
+    """等待所有写协程把队列发送完"""
+    while any(client.queue for client in manager.active_connections.values()):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+async def bench_per_connection_encode(connections: int, rounds: int) -> float:
+    """旧实现：每个连接各自 json 编码（send_json 的行为），返回单次广播 CPU 毫秒数"""
+    sockets = [NullWebSocket() for _ in range(connections)]
+    start = time.process_time()
+    for _ in range(rounds):
+        for ws in sockets:
+            await ws.send_text(json.dumps(MESSAGE, separators=(",", ":"), ensure_ascii=False))
+    return (time.process_time() - start) * 1000 / rounds
+
+
+async def bench_encode_once(connections: int, rounds: int) -> dict:
+    """当前实现：编码一次后入队，返回发布方耗时与含写协程发送在内的总 CPU 毫秒数"""
+    manager = ConnectionManager(max_queue=rounds + 1)
+    for _ in range(connections):
+        await manager.connect(NullWebSocket())
+
+    publish = 0.0
+    start = time.process_time()
+    for _ in range(rounds):
+        t0 = time.process_time()
+        await manager.broadcast(MESSAGE)
+        publish += time.process_time() - t0
+        await _drain(manager)
+    total = time.process_time() - start
+
+    for websocket in list(manager.active_connections):
+        manager.disconnect(websocket)
+    await asyncio.sleep(0)
+    return {"publish_ms": publish * 1000 / rounds, "total_ms": total * 1000 / rounds}
+
+
+async def run(connection_counts, rounds: int) -> list:
+    results = []
+    for connections in connection_counts:
+        baseline = await bench_per_connection_encode(connections, rounds)
+        current = await bench_encode_once(connections, rounds)
+        results.append({
+            "connections": connections,
+            "encoder": json_codec.encoder_name,
+            "per_connection_encode_ms": round(baseline, 3),
+            "encode_once_publish_ms": round(current["publish_ms"], 3),
+            "encode_once_total_ms": round(current["total_ms"], 3),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebSocket广播基准测试")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--encoder", choices=["auto", "orjson", "json"], default="auto")
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    json_codec.set_encoder(args.encoder)
+    results = asyncio.run(run(args.connections, args.rounds))
+
+    print(f"{'连接数':>8} {'编码器':>7} {'逐连接编码(ms)':>16} {'编码一次-发布(ms)':>18} {'编码一次-总计(ms)':>18}")
+    for r in results:
+        print(f"{r['connections']:>10} {r['encoder']:>9} {r['per_connection_encode_ms']:>18} "
+              f"{r['encode_once_publish_ms']:>20} {r['encode_once_total_ms']:>20}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
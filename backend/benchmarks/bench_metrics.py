@@ -0,0 +1,78 @@
+"""
+指标采集基准测试
+
+直接调用 ASGI 应用，对比安装请求指标中间件前后单个请求的耗时，
+并测量单次直方图记录与 /metrics 渲染的耗时
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_metrics
+    python -m benchmarks.bench_metrics --requests 200000 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.middleware import MetricsMiddleware
+from app.utils.metrics import MetricsRegistry
+
+from .bench_rate_limit import bench, endpoint
+
+
+class _Route:
+    path = "/api/games"
+
+
+async def routed(scope, receive, send):
+    """模拟路由匹配后写入 scope["route"]"""
+    scope["route"] = _Route
+    await endpoint(scope, receive, send)
+
+
+def bench_observe(observations: int) -> float:
+    """单次直方图记录耗时（纳秒）"""
+    histogram = MetricsRegistry().histogram("bench_seconds", "基准")
+    start = time.perf_counter()
+    for i in range(observations):
+        histogram.observe(i % 1000 / 10000, "GET", "/api/leaderboard")
+    return (time.perf_counter() - start) * 1e9 / observations
+
+
+async def run(requests: int) -> dict:
+    baseline = await bench(routed, requests, 1)
+    instrumented = await bench(MetricsMiddleware(routed), requests, 1)
+    from app.utils.metrics import registry
+    start = time.perf_counter()
+    registry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    return {
+        "requests": requests,
+        "baseline_us": round(baseline, 3),
+        "instrumented_us": round(instrumented, 3),
+        "overhead_us": round(instrumented - baseline, 3),
+        "histogram_observe_ns": round(bench_observe(requests), 1),
+        "render_ms": round(render_ms, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="指标采集基准测试")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.requests))
+
+    print(f"请求数 {result['requests']}")
+    print(f"  无中间件:     {result['baseline_us']:>8} μs/请求")
+    print(f"  指标中间件:   {result['instrumented_us']:>8} μs/请求 (+{result['overhead_us']})")
+    print(f"  直方图记录:   {result['histogram_observe_ns']:>8} ns/次")
+    print(f"  渲染 /metrics: {result['render_ms']:>7} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+速率限制基准测试
+
+直接调用 ASGI 应用（不经过网络与路由），对比安装速率限制中间件前后单个请求的耗时，
+得到中间件带来的额外开销；存储分别使用进程内字典与共享内存
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_rate_limit
+    python -m benchmarks.bench_rate_limit --requests 200000 --clients 10000 --json result.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.middleware import MemoryBucketStore, RateLimitMiddleware, SharedMemoryBucketStore
+
+BODY = {"type": "http.response.body", "body": b"{}"}
+START = {"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]}
+
+
+async def endpoint(scope, receive, send):
+    """最小的 ASGI 应用，只返回空 JSON"""
+    await send(START)
+    await send(BODY)
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def bench(app, requests: int, clients: int) -> float:
+    """返回单个请求的平均耗时（微秒）"""
+    scopes = [
+        {"type": "http", "method": "POST", "path": "/api/games", "client": (f"10.0.{i // 256}.{i % 256}", 50000)}
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % clients], _receive, _send)
+    return (time.perf_counter() - start) * 1e6 / requests
+
+
+async def run(requests: int, clients: int) -> dict:
+    # 限制足够宽松，测得的是放行路径的开销
+    routes = {"POST /api/games": f"{requests}/minute"}
+    baseline = await bench(endpoint, requests, clients)
+    memory = await bench(
+        RateLimitMiddleware(endpoint, routes=routes, store=MemoryBucketStore(clients), enabled=True),
+        requests, clients,
+    )
+    shared_store = SharedMemoryBucketStore(f"bench-rate-limit-{os.getpid()}", clients * 2)
+    try:
+        shared = await bench(
+            RateLimitMiddleware(endpoint, routes=routes, store=shared_store, enabled=True),
+            requests, clients,
+        )
+    finally:
+        shared_store.close()
+        os.unlink(shared_store.path)
+
+    return {
+        "requests": requests,
+        "clients": clients,
+        "baseline_us": round(baseline, 3),
+        "memory_us": round(memory, 3),
+        "memory_overhead_us": round(memory - baseline, 3),
+        "shared_memory_us": round(shared, 3),
+        "shared_memory_overhead_us": round(shared - baseline, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="速率限制基准测试")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.requests, args.clients))
+
+    print(f"请求数 {result['requests']}，客户端数 {result['clients']}")
+    print(f"  无中间件:       {result['baseline_us']:>8} μs/请求")
+    print(f"  进程内存储:     {result['memory_us']:>8} μs/请求 (+{result['memory_overhead_us']})")
+    print(f"  共享内存存储:   {result['shared_memory_us']:>8} μs/请求 (+{result['shared_memory_overhead_us']})")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+回放引擎基准测试
+
+用 autoplay 生成若干局对局，分别测量单进程重放吞吐与进程池（ReplayVerifier 使用的方式）
+批量重放吞吐，单位为局/秒与操作/秒；另用 autoplay_timed 按真人节奏生成带时间戳的对局，
+统计回放存储格式每分钟游戏时长的平均字节数
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_replay
+    python -m benchmarks.bench_replay --games 200 --pieces 300 --workers 4 --json result.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.services.replay import autoplay, autoplay_timed, replay
+from app.services.replay_format import encode_replay
+
+
+def _replay_all(games: list) -> int:
+    """在当前进程中依次重放，返回总操作数（进程池任务）"""
+    return sum(replay(seed, actions).actions for seed, actions in games)
+
+
+def bench_single(games: list, rounds: int) -> float:
+    """单进程平均耗时（秒/轮）"""
+    _replay_all(games)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        _replay_all(games)
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_pool(games: list, rounds: int, workers: int) -> float:
+    """进程池平均耗时（秒/轮），任务按 worker 数均分"""
+    chunks = [games[i::workers] for i in range(workers)]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(_replay_all, chunks))  # 预热：启动子进程并导入模块
+        start = time.perf_counter()
+        for _ in range(rounds):
+            list(pool.map(_replay_all, chunks))
+        return (time.perf_counter() - start) / rounds
+
+
+def storage_size(games: int, pieces: int) -> dict:
+    """回放编码后的平均大小"""
+    total_bytes = total_ms = total_actions = 0
+    for seed in range(games):
+        actions, timestamps = autoplay_timed(seed, pieces)
+        total_bytes += len(encode_replay(seed, actions, timestamps))
+        total_ms += timestamps[-1] if timestamps else 0
+        total_actions += len(actions)
+    minutes = total_ms / 60000
+    return {
+        "bytes_per_minute": round(total_bytes / minutes, 1) if minutes else 0,
+        "bytes_per_action": round(total_bytes / total_actions, 3) if total_actions else 0,
+        "actions_per_minute": round(total_actions / minutes, 1) if minutes else 0,
+    }
+
+
+def run(games: int, pieces: int, rounds: int, workers: int) -> dict:
+    replays = [(seed, autoplay(seed, pieces)) for seed in range(games)]
+    actions = sum(len(a) for _, a in replays)
+    single = bench_single(replays, rounds)
+    pooled = bench_pool(replays, rounds, workers)
+    return {
+        "games": games,
+        "pieces_per_game": pieces,
+        "actions": actions,
+        "workers": workers,
+        "single_replays_per_s": round(games / single, 1),
+        "single_actions_per_s": round(actions / single),
+        "single_us_per_replay": round(single * 1e6 / games, 1),
+        "pool_replays_per_s": round(games / pooled, 1),
+        "pool_actions_per_s": round(actions / pooled),
+        "storage": storage_size(min(games, 20), pieces),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放引擎基准测试")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--pieces", type=int, default=150, help="每局方块数")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    result = run(args.games, args.pieces, args.rounds, args.workers)
+
+    print(f"{result['games']} 局，每局 {result['pieces_per_game']} 个方块，共 {result['actions']} 个操作")
+    print(f"  单进程:         {result['single_replays_per_s']:>10} 局/秒  "
+          f"{result['single_actions_per_s']:>10} 操作/秒  ({result['single_us_per_replay']} μs/局)")
+    print(f"  进程池({result['workers']}):     {result['pool_replays_per_s']:>10} 局/秒  "
+          f"{result['pool_actions_per_s']:>10} 操作/秒")
+    storage = result["storage"]
+    print(f"  存储:           {storage['bytes_per_minute']:>10} 字节/分钟  "
+          f"{storage['bytes_per_action']:>10} 字节/操作  ({storage['actions_per_minute']} 操作/分钟)")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
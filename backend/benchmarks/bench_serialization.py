@@ -0,0 +1,94 @@
+"""
+列表序列化基准测试
+
+对比 GET /api/games 的两种读取与编码方式（同一个内存数据库，各查询 limit 条）：
+- ORM 对象 + 逐行 Pydantic 校验与序列化（原实现：response_model=list[GameResponse]）
+- Core 列元组直接编码为 JSON（当前实现：json_codec.dumps_records）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --limits 20 100 --rounds 2000 --json result.json
+"""
+import argparse
+import json
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session
+
+from app.database.base import create_db_engine
+from app.database.dataset import load_games
+from app.models.game import Game
+from app.schemas.game import GAME_RESPONSE_FIELDS, GameResponse
+from app.utils import json_codec
+
+_adapter = TypeAdapter(list[GameResponse])
+_columns = [getattr(Game, name) for name in GAME_RESPONSE_FIELDS]
+
+
+def orm_pydantic(db: Session, limit: int) -> bytes:
+    games = db.query(Game).order_by(desc(Game.created_at), desc(Game.id)).limit(limit).all()
+    body = _adapter.dump_json(_adapter.validate_python(games, from_attributes=True))
+    db.expunge_all()
+    return body
+
+
+def core_direct(db: Session, limit: int) -> bytes:
+    rows = db.execute(select(*_columns).order_by(desc(Game.created_at), desc(Game.id)).limit(limit)).all()
+    return json_codec.dumps_records(GAME_RESPONSE_FIELDS, rows)
+
+
+def bench(func, db: Session, limit: int, rounds: int) -> float:
+    """单次查询加编码的平均耗时（微秒）"""
+    func(db, limit)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(db, limit)
+    return (time.perf_counter() - start) * 1e6 / rounds
+
+
+def run(limits, rounds: int) -> list:
+    engine = create_db_engine("sqlite://")
+    load_games(engine, max(limits) * 10, seed=0)
+    results = []
+    try:
+        with Session(engine) as db:
+            assert json.loads(orm_pydantic(db, 5)) == json.loads(core_direct(db, 5))
+            for limit in limits:
+                baseline = bench(orm_pydantic, db, limit, rounds)
+                current = bench(core_direct, db, limit, rounds)
+                results.append({
+                    "limit": limit,
+                    "encoder": json_codec.encoder_name,
+                    "orm_pydantic_us": round(baseline, 1),
+                    "core_direct_us": round(current, 1),
+                    "speedup": round(baseline / current, 2),
+                })
+    finally:
+        engine.dispose()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="列表序列化基准测试")
+    parser.add_argument("--limits", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--encoder", choices=["auto", "orjson", "json"], default="auto")
+    parser.add_argument("--json", dest="json_path", help="结果写入的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    json_codec.set_encoder(args.encoder)
+    results = run(args.limits, args.rounds)
+
+    print(f"{'条数':>6} {'编码器':>7} {'ORM+Pydantic(μs)':>18} {'Core直接编码(μs)':>18} {'加速比':>8}")
+    for r in results:
+        print(f"{r['limit']:>8} {r['encoder']:>9} {r['orm_pydantic_us']:>18} {r['core_direct_us']:>20} {r['speedup']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
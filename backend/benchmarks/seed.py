@@ -0,0 +1,66 @@
+"""
+基准测试数据库
+
+按行数和随机种子生成合成数据（app.database.dataset）的 SQLite 数据库文件，
+缓存在 --db-dir 下，重复运行时直接复用
+"""
+import os
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database.base import create_db_engine
+from app.database.dataset import DATASET_VERSION, load_games
+from app.database.init_db import backfill_summaries, create_schema
+from app.models.game import Game
+from app.services.game_service import game_service
+
+
+def seed_database(path: str, rows: int, seed: int = 0) -> None:
+    """生成包含 rows 条合成游戏记录的数据库"""
+    engine = create_db_engine(f"sqlite:///{path}")
+    try:
+        load_games(engine, rows, seed=seed)
+    finally:
+        engine.dispose()
+
+
+def ensure_database(db_dir: str, rows: int, seed: int = 0) -> str:
+    """
+    返回对应行数的数据库路径，不存在或行数不符时重新生成
+
+    复用的数据库按当前模型补建新增的表、列和索引，并回填新建的汇总表
+    """
+    os.makedirs(db_dir, exist_ok=True)
+    path = os.path.join(db_dir, f"games_v{DATASET_VERSION}_{rows}_{seed}.db")
+    if os.path.exists(path):
+        engine = create_db_engine(f"sqlite:///{path}")
+        try:
+            with engine.begin() as conn:
+                current = conn.scalar(select(func.count()).select_from(Game)) == rows
+                created = create_schema(conn) if current else set()
+            if current:
+                if created:
+                    with Session(engine) as db:
+                        backfill_summaries(db, created)
+                return path
+        finally:
+            engine.dispose()
+        os.remove(path)
+    seed_database(path, rows, seed)
+    return path
+
+
+def restore_database(path: str, max_id: int) -> None:
+    """删除基准测试写入的记录（id > max_id），使数据库可被下次运行复用"""
+    engine = create_db_engine(f"sqlite:///{path}")
+    try:
+        with Session(engine) as db:
+            deleted = db.query(Game).filter(Game.id > max_id).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                game_service.rebuild_player_stats(db)
+                game_service.rebuild_period_leaderboards(db)
+                game_service.rebuild_score_histogram(db)
+    finally:
+        engine.dispose()
@@ -4,11 +4,17 @@
 import pytest
 import tempfile
 import os
+
+# 测试会在短时间内大量请求同一接口，速率限制由 test_rate_limit 单独测试
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# 回放在测试进程内执行，进程池由 test_replay 单独测试
+os.environ.setdefault("REPLAY_WORKERS", "0")
 from typing import Generator, Callable
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import NullPool
 
-from app.database.base import Base
+from app.database.base import Base, create_db_engine, create_async_db_engine
 from app.models.game import Game
 from app.config import settings
 from app.main import app
@@ -21,10 +27,7 @@ def db_session() -> Generator[Session, None, None]:
     fd, path = tempfile.mkstemp(suffix='.db')
     os.close(fd)
 
-    test_engine = create_engine(
-        f"sqlite:///{path}",
-        connect_args={"check_same_thread": False}
-    )
+    test_engine = create_db_engine(f"sqlite:///{path}")
 
     # 创建所有表
     Base.metadata.create_all(bind=test_engine)
@@ -38,7 +41,10 @@ def db_session() -> Generator[Session, None, None]:
     # 清理
     session.close()
     Base.metadata.drop_all(bind=test_engine)
-    os.unlink(path)
+    test_engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.unlink(path + suffix)
 
 
 @pytest.fixture
@@ -64,7 +70,18 @@ def multiple_game_records():
 
 
 @pytest.fixture
-def client(db_session: Session) -> Generator:
+def async_session_factory(db_session: Session) -> async_sessionmaker:
+    """创建指向同一测试数据库文件的异步会话工厂"""
+    path = db_session.get_bind().url.database
+    # NullPool: 连接随会话关闭，无需在测试结束时跨事件循环释放连接池
+    async_engine = create_async_db_engine(f"sqlite:///{path}", poolclass=NullPool)
+    return async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+@pytest.fixture
+def client(db_session: Session, async_session_factory: async_sessionmaker) -> Generator:
     """创建测试客户端，使用测试数据库会话"""
 
     def override_get_db():
@@ -73,10 +90,15 @@ def client(db_session: Session) -> Generator:
         finally:
             pass
 
-    from app.database.base import get_db
+    async def override_get_async_db():
+        async with async_session_factory() as session:
+            yield session
+
+    from app.database.base import get_db, get_async_db
     from fastapi.testclient import TestClient
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
 
     with TestClient(app) as test_client:
         yield test_client
@@ -0,0 +1,135 @@
+"""
+异常扫描测试
+"""
+import pytest
+from sqlalchemy import insert, select
+
+from app.config import settings
+from app.database.base import create_db_engine
+from app.models.game import Game
+from app.models.game_flag import AnomalyScan, GameFlag
+
+np = pytest.importorskip("numpy")
+
+from app.services.anomaly_scan import (  # noqa: E402
+    FLAG_LEVEL, FLAG_LINE_RATE, FLAG_PLAYER_JUMP, FLAG_SCORE_LINES, FLAG_SCORE_RATE,
+    AnomalyScanner, level_weighted_lines,
+)
+
+
+def _game(player="玩家", score=1000, level=1, lines=10, play_time=100) -> dict:
+    return {"player_name": player, "score": score, "level": level, "lines": lines, "play_time": play_time}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'scan.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _insert(engine, rows):
+    from app.database.init_db import create_schema
+
+    with engine.begin() as conn:
+        create_schema(conn)
+        conn.execute(insert(Game), rows)
+
+
+def _flags(engine) -> dict:
+    with engine.connect() as conn:
+        return dict(conn.execute(select(GameFlag.game_id, GameFlag.reasons)).all())
+
+
+def test_level_weighted_lines_matches_scoring():
+    """测试每行等级之和：第 1-20 行为 1 级，第 21-40 行为 2 级，20 级封顶"""
+    lines = np.array([0, 1, 20, 21, 40, 380, 400])
+    assert level_weighted_lines(lines).tolist() == [0, 1, 20, 22, 60, 3800, 4200]
+
+
+def test_rule_flags():
+    """测试逐行规则"""
+    rows = [
+        _game(score=1000, level=1, lines=10),                 # 正常：10 行单消
+        _game(score=1000, level=3, lines=10),                 # 等级与行数不符
+        _game(score=2100, level=1, lines=10),                 # 超过全部四行消除的得分
+        _game(score=950, level=1, lines=10),                  # 不是 100 的整数倍
+        _game(score=0, level=1, lines=0, play_time=0),        # 正常：未消行
+        _game(score=100, level=1, lines=1, play_time=0),      # 零时长消行
+        _game(score=4000, level=2, lines=30, play_time=5),    # 消行过快
+    ]
+    scanner = AnomalyScanner()
+    columns = {key: np.array([row[key] for row in rows]) for key in ("score", "level", "lines", "play_time")}
+    flags = scanner.rule_flags(columns["score"], columns["level"], columns["lines"], columns["play_time"])
+    assert flags.tolist() == [
+        0, FLAG_LEVEL, FLAG_SCORE_LINES, FLAG_SCORE_LINES, 0,
+        FLAG_LINE_RATE | FLAG_SCORE_RATE, FLAG_LINE_RATE | FLAG_SCORE_RATE,
+    ]
+
+
+def test_player_jump_across_chunks(engine):
+    """测试分数突增：按ID顺序与玩家此前最高分比较，结果与分块大小无关"""
+    rows = []
+    for i in range(6):
+        rows.append(_game("稳定", score=2000, level=1, lines=10, play_time=200))
+        rows.append(_game("新手", score=100, level=1, lines=1, play_time=30))
+    # 稳定玩家 6 局后突然 20 倍；新手对局数足够但分数低于 ANOMALY_JUMP_MIN_SCORE
+    rows.append(_game("稳定", score=40000, level=6, lines=100, play_time=1000))
+    rows.append(_game("新手", score=2000, level=1, lines=10, play_time=100))
+    _insert(engine, rows)
+
+    result = AnomalyScanner(chunk_size=5).scan(engine, full=True)
+    assert result.rows == len(rows)
+    assert _flags(engine) == {13: FLAG_PLAYER_JUMP}
+    assert result.reasons["player_jump"] == 1
+
+    assert AnomalyScanner(chunk_size=1000).scan(engine, full=True).flagged == 1
+    assert _flags(engine) == {13: FLAG_PLAYER_JUMP}
+
+
+def test_incremental_scan(engine):
+    """测试增量扫描只处理新增记录，并沿用此前记录的玩家状态"""
+    _insert(engine, [_game("老玩家", score=1000, lines=10)] * 6)
+    first = AnomalyScanner().scan(engine)
+    assert (first.rows, first.flagged, first.last_game_id) == (6, 0, 6)
+
+    _insert(engine, [
+        _game("老玩家", score=40000, level=6, lines=100, play_time=1000),
+        _game("老玩家", score=999, lines=10),
+    ])
+    second = AnomalyScanner().scan(engine)
+    assert (second.rows, second.flagged, second.last_game_id) == (2, 2, 8)
+    assert _flags(engine) == {7: FLAG_PLAYER_JUMP, 8: FLAG_SCORE_LINES}
+
+    assert AnomalyScanner().scan(engine).rows == 0
+    with engine.connect() as conn:
+        scans = conn.execute(select(AnomalyScan.last_game_id, AnomalyScan.finished_at)).all()
+    assert [last for last, _ in scans] == [6, 8, 8]
+    assert all(finished is not None for _, finished in scans)
+
+
+def test_generated_dataset_is_clean(engine):
+    """测试合成数据满足全部逐行规则"""
+    from app.database.dataset import load_games
+
+    load_games(engine, 3000, seed=3)
+    result = AnomalyScanner(chunk_size=700).scan(engine, full=True)
+    assert result.rows == 3000
+    assert all(count == 0 for name, count in result.reasons.items() if name != "player_jump")
+
+
+def test_flagged_games_endpoint(client, db_session, monkeypatch):
+    """测试管理接口列出被标记的记录，删除记录时一并删除标记"""
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    normal = client.post("/api/games", json=_game(score=1000, lines=10)).json()
+    forged = client.post("/api/games", json=_game(score=123400, level=1, lines=10)).json()
+
+    AnomalyScanner().scan(db_session.get_bind())
+    flagged = client.get("/api/admin/flagged-games", headers=headers).json()
+    assert [(row["id"], row["reasons"]) for row in flagged] == [(forged["id"], ["score_lines", "score_rate"])]
+    assert client.get(f"/api/admin/flagged-games?before={forged['id']}", headers=headers).json() == []
+    assert normal["id"] not in {row["id"] for row in flagged}
+
+    assert client.delete(f"/api/games/{forged['id']}").status_code == 204
+    assert client.get("/api/admin/flagged-games", headers=headers).json() == []
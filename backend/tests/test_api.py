@@ -150,6 +150,27 @@ def test_leaderboard_limit_max(client, multiple_game_records):
     assert response.status_code == 400  # 参数验证失败
 
 
+def test_leaderboard_distinct_players(client, multiple_game_records):
+    """测试每名玩家只出现一次的排行榜"""
+    for record in multiple_game_records:
+        client.post("/api/games", json=record)
+    client.post("/api/games", json={**multiple_game_records[2], "score": 6000})
+
+    response = client.get("/api/leaderboard?limit=10")
+    assert [g["score"] for g in response.json()] == [7000, 6000, 5000, 3000]
+
+    response = client.get("/api/leaderboard?limit=10&distinct_players=true")
+    assert response.status_code == 200
+    assert [(g["player_name"], g["score"]) for g in response.json()] == [
+        ("玩家3", 7000), ("玩家1", 5000), ("玩家2", 3000)
+    ]
+    cached = client.get("/api/leaderboard?limit=10&distinct_players=true",
+                        headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+    assert client.get("/api/leaderboard?distinct_players=true&period=week").status_code == 400
+
+
 def test_get_game_by_id_found(db_session: Session, client, sample_game_data):
     """测试根据ID获取游戏记录 - 找到记录"""
     # 先创建记录
@@ -164,6 +185,78 @@ def test_get_game_by_id_found(db_session: Session, client, sample_game_data):
     assert data["player_name"] == sample_game_data["player_name"]
 
 
+def test_leaderboard_etag(client, multiple_game_records):
+    """测试排行榜 ETag：未变化时返回304，前 N 名变化后 ETag 更新"""
+    for record in multiple_game_records:
+        client.post("/api/games", json=record)
+
+    response = client.get("/api/leaderboard?limit=10")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+    assert [g["score"] for g in response.json()] == [7000, 5000, 3000]
+
+    cached = client.get("/api/leaderboard?limit=10", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    client.post("/api/games", json={**multiple_game_records[0], "score": 9000})
+    response = client.get("/api/leaderboard?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["score"] == 9000
+
+
+def test_leaderboard_etag_shared_across_workers(client, multiple_game_records):
+    """测试排行榜 ETag 只由内容决定：索引重建（模拟另一个 worker）后相同内容的 ETag 不变"""
+    from app.services.leaderboard_index import leaderboard_indexes
+    from app.services.response_cache import response_cache
+
+    for record in multiple_game_records:
+        client.post("/api/games", json=record)
+    etag = client.get("/api/leaderboard?limit=10").headers["etag"]
+
+    leaderboard_indexes._indexes.clear()
+    response_cache.clear()
+    response = client.get("/api/leaderboard?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_get_game_etag(client, sample_game_data):
+    """测试单条记录 ETag：更新后缓存失效"""
+    game_id = client.post("/api/games", json=sample_game_data).json()["id"]
+
+    response = client.get(f"/api/games/{game_id}")
+    etag = response.headers["etag"]
+    assert client.get(f"/api/games/{game_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/api/games/{game_id}", json={"score": 4321})
+    response = client.get(f"/api/games/{game_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["score"] == 4321
+    assert response.headers["etag"] != etag
+
+
+def _insert_unindexed(db_session: Session, game_data: dict) -> Game:
+    """绕过服务层写入记录，模拟其他 worker 的写入事件尚未送达本进程"""
+    from app.services.leaderboard_index import leaderboard_indexes
+
+    leaderboard_indexes.get(db_session)
+    game = Game(**game_data)
+    db_session.add(game)
+    db_session.commit()
+    return game
+
+
+def test_get_game_not_in_index(db_session: Session, client, sample_game_data):
+    """测试索引中没有的记录从数据库读取"""
+    game = _insert_unindexed(db_session, sample_game_data)
+
+    response = client.get(f"/api/games/{game.id}")
+    assert response.status_code == 200
+    assert response.json()["score"] == sample_game_data["score"]
+
+
 def test_get_game_by_id_not_found(client):
     """测试根据ID获取游戏记录 - 记录不存在"""
     response = client.get("/api/games/99999")
@@ -242,3 +335,261 @@ def test_game_validation_player_name_too_long(client):
     response = client.post("/api/games", json=invalid_data)
 
     assert response.status_code == 422
+
+
+def test_admin_leaderboard_index(client, monkeypatch):
+    """测试排行榜索引一致性检查接口"""
+    from app.config import settings
+
+    # 未配置令牌时接口不可用
+    response = client.get("/api/admin/leaderboard-index")
+    assert response.status_code == 404
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    response = client.get("/api/admin/leaderboard-index", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403
+
+    client.post("/api/games", json={
+        "player_name": "玩家", "score": 100, "level": 1, "lines": 0, "play_time": 10
+    })
+    response = client.get("/api/admin/leaderboard-index", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["consistent"] is True
+    assert data["stored"] == 1
+
+
+def test_get_game_rank(db_session: Session, client, multiple_game_records):
+    """测试名次查询接口"""
+    games = [
+        game_service.save_game_record(db_session, GameCreate(**game_data))
+        for game_data in multiple_game_records
+    ]
+
+    response = client.get(f"/api/games/{games[0].id}/rank")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rank"] == 2
+    assert data["total"] == 3
+
+    response = client.get("/api/games/99999/rank")
+    assert response.status_code == 404
+
+    # 其他 worker 写入、本进程索引中还没有的记录
+    game = _insert_unindexed(db_session, {**multiple_game_records[0], "score": 6000})
+    response = client.get(f"/api/games/{game.id}/rank")
+    assert response.status_code == 200
+    assert response.json()["rank"] == 2
+    assert response.json()["total"] == 4
+    response = client.get(f"/api/leaderboard/around/{game.id}?radius=1")
+    assert [e["score"] for e in response.json()["entries"]] == [7000, 6000, 5000]
+
+
+def test_leaderboard_around(db_session: Session, client, multiple_game_records):
+    """测试名次附近排行榜接口"""
+    games = [
+        game_service.save_game_record(db_session, GameCreate(**game_data))
+        for game_data in multiple_game_records
+    ]
+
+    response = client.get(f"/api/leaderboard/around/{games[1].id}?radius=1")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rank"] == 3
+    assert [e["score"] for e in data["entries"]] == [5000, 3000]
+    assert [e["rank"] for e in data["entries"]] == [2, 3]
+
+    response = client.get(f"/api/leaderboard/around/{games[1].id}?radius=100")
+    assert response.status_code == 400
+
+
+def test_get_games_cursor(db_session: Session, client, multiple_game_records):
+    """测试历史记录游标分页"""
+    for game_data in multiple_game_records:
+        game_service.save_game_record(db_session, GameCreate(**game_data))
+
+    response = client.get("/api/games?limit=2")
+    assert response.status_code == 200
+    assert [g["score"] for g in response.json()] == [7000, 3000]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/api/games?limit=2&after={cursor}")
+    assert response.status_code == 200
+    assert [g["score"] for g in response.json()] == [5000]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get(f"/api/games?skip=1&after={cursor}")
+    assert response.status_code == 400
+
+    response = client.get("/api/games?after=invalid")
+    assert response.status_code == 400
+
+
+def test_save_games_batch(client, monkeypatch, multiple_game_records):
+    """测试批量保存接口只推送一次"""
+    from app.api import websocket
+
+    broadcasts = []
+
+    def fake_publish(top, message):
+        broadcasts.append(message)
+        return 0
+
+    monkeypatch.setattr(websocket.manager, "publish_leaderboard", fake_publish)
+
+    response = client.post("/api/games/batch", json=multiple_game_records)
+
+    assert response.status_code == 201
+    data = response.json()
+    assert [g["score"] for g in data] == [5000, 3000, 7000]
+    assert all("id" in g for g in data)
+    assert len(broadcasts) == 1
+    assert broadcasts[0]["data"]["score"] == 7000
+    assert broadcasts[0]["count"] == 3
+
+    response = client.get("/api/leaderboard")
+    assert [g["score"] for g in response.json()] == [7000, 5000, 3000]
+
+
+def test_save_games_batch_invalid(client, multiple_game_records):
+    """测试批量保存时任一记录无效则整批拒绝"""
+    invalid = multiple_game_records + [{"player_name": "测试", "score": -1}]
+    response = client.post("/api/games/batch", json=invalid)
+    assert response.status_code == 422
+
+    response = client.post("/api/games/batch", json=[])
+    assert response.status_code == 400
+
+    response = client.get("/api/games")
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_do_not_block_event_loop(db_session: Session, async_session_factory):
+    """测试慢查询不阻塞事件循环：并发请求的总耗时接近单个请求"""
+    import asyncio
+    import time
+    from httpx import AsyncClient, ASGITransport
+    from sqlalchemy import event
+    from app.database.base import get_async_db
+
+    delay = 0.2
+
+    def slow_select(sql):
+        # 在驱动的工作线程中执行，模拟耗时的查询
+        if sql.lstrip().upper().startswith("SELECT"):
+            time.sleep(delay)
+
+    @event.listens_for(async_session_factory.kw["bind"].sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(lambda conn: conn.set_trace_callback(slow_select))
+
+    async def override_get_async_db():
+        async with async_session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            # 慢查询进行期间，其他请求仍能立即得到响应
+            slow_request = asyncio.create_task(ac.get("/api/players/玩家/stats"))
+            await asyncio.sleep(delay / 4)
+            start = time.perf_counter()
+            health = await ac.get("/api/health")
+            health_latency = time.perf_counter() - start
+            await slow_request
+
+            # 并发的慢查询相互重叠，而不是串行执行
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                ac.get("/api/players/玩家/stats") for _ in range(5)
+            ])
+            elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+
+    assert health.status_code == 200
+    assert health_latency < delay / 2
+    assert all(r.status_code == 200 for r in responses)
+    assert delay <= elapsed < delay * 5 / 2
+
+
+@pytest.mark.asyncio
+async def test_group_commit(db_session: Session, async_session_factory):
+    """测试组提交：并发保存合并为一个事务，每个请求拿到各自的ID"""
+    import asyncio
+    from httpx import AsyncClient, ASGITransport
+    from sqlalchemy import event
+    from app.database.base import get_async_db
+    from app.services.write_buffer import GameWriteBuffer
+    from app.api import games as games_api
+
+    commits = []
+    event.listen(async_session_factory.kw["bind"].sync_engine, "commit", lambda conn: commits.append(1))
+
+    async def override_get_async_db():
+        async with async_session_factory() as session:
+            yield session
+
+    buffer = GameWriteBuffer(max_delay_ms=50, max_batch=100)
+    buffer.start(async_session_factory)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    original = games_api.game_write_buffer
+    games_api.game_write_buffer = buffer
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            responses = await asyncio.gather(*[
+                ac.post("/api/games", json={
+                    "player_name": f"玩家{i % 3}", "score": 100 * i, "level": 1, "lines": 0, "play_time": 60
+                })
+                for i in range(20)
+            ])
+    finally:
+        games_api.game_write_buffer = original
+        app.dependency_overrides.clear()
+        await buffer.stop()
+
+    assert all(r.status_code == 201 for r in responses)
+    assert [r.json()["score"] for r in responses] == [100 * i for i in range(20)]
+    assert len({r.json()["id"] for r in responses}) == 20
+    assert buffer.batches == 1
+    assert buffer.records == 20
+    assert len(commits) == 1
+    assert game_service.get_player_stats(db_session, "玩家0")["total_games"] == 7
+
+
+def test_metrics_endpoint(client, sample_game_data):
+    """测试 /metrics 输出请求、SQL 与 WebSocket 指标"""
+    client.post("/api/games", json=sample_game_data)
+    client.get("/api/games/99999")
+
+    with client.websocket_connect("/ws/leaderboard"):
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/api/games/{game_id}",status="404"}' in text
+    assert 'http_request_duration_seconds_bucket{method="POST",route="/api/games",le="+Inf"}' in text
+    assert 'db_statement_duration_seconds_count{operation="INSERT"}' in text
+    assert "ws_active_connections 1" in text
+
+
+def test_list_fast_path_matches_schema(client, multiple_game_records):
+    """测试列表接口直接编码的结果与 GameResponse 序列化一致，OpenAPI 文档不变"""
+    from app.schemas.game import GameResponse
+
+    for record in multiple_game_records:
+        client.post("/api/games", json=record)
+    saved = [client.get(f"/api/games/{g['id']}").json() for g in client.get("/api/games").json()]
+
+    for path in ("/api/games", "/api/leaderboard"):
+        data = client.get(path).json()
+        assert [GameResponse.model_validate(g).model_dump(mode="json") for g in data] == data
+        assert sorted(data, key=lambda g: g["id"]) == sorted(saved, key=lambda g: g["id"])
+
+    schema = client.get("/openapi.json").json()
+    for path, model in (("/api/games", "GameResponse"), ("/api/leaderboard", "LeaderBoardEntry")):
+        response_schema = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert response_schema["type"] == "array"
+        assert response_schema["items"] == {"$ref": f"#/components/schemas/{model}"}
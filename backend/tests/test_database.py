@@ -0,0 +1,140 @@
+"""
+数据库引擎配置测试
+"""
+from sqlalchemy.pool import StaticPool
+
+from app.config import settings
+from app.database.base import Base, create_db_engine, is_sqlite_memory, to_async_url
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    """测试文件数据库的每个连接都应用了性能配置"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    try:
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+            assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == settings.SQLITE_CACHE_SIZE
+            assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+        assert engine.pool.size() == settings.DB_POOL_SIZE
+    finally:
+        engine.dispose()
+
+
+def test_readers_not_blocked_by_writer(tmp_path):
+    """测试 WAL 模式下写事务持有排他锁时读取不被阻塞"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    writer = engine.raw_connection()
+    try:
+        writer.driver_connection.isolation_level = None  # 手动控制事务
+        cursor = writer.cursor()
+        cursor.execute("BEGIN EXCLUSIVE")
+        cursor.execute(
+            "INSERT INTO games (player_name, score, level, lines, play_time, created_at) "
+            "VALUES ('玩家', 100, 1, 0, 10, '2026-01-01 00:00:00')"
+        )
+
+        with engine.connect() as reader:
+            reader.exec_driver_sql("PRAGMA busy_timeout = 0")
+            assert reader.exec_driver_sql("SELECT count(*) FROM games").scalar() == 0
+
+        cursor.execute("ROLLBACK")
+    finally:
+        writer.close()
+        engine.dispose()
+
+
+def test_memory_database_shares_connection():
+    """测试内存数据库使用单连接，各会话看到同一个库"""
+    engine = create_db_engine("sqlite://")
+    try:
+        assert isinstance(engine.pool, StaticPool)
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+            conn.exec_driver_sql("INSERT INTO t VALUES (1)")
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT count(*) FROM t").scalar() == 1
+    finally:
+        engine.dispose()
+
+
+def test_url_helpers():
+    """测试数据库 URL 辅助函数"""
+    assert to_async_url("sqlite:///./data.db") == "sqlite+aiosqlite:///./data.db"
+    assert to_async_url("sqlite+aiosqlite:///./data.db") == "sqlite+aiosqlite:///./data.db"
+    assert is_sqlite_memory("sqlite://") is True
+    assert is_sqlite_memory("sqlite:///:memory:") is True
+    assert is_sqlite_memory("sqlite:///./data.db") is False
+
+
+def test_generate_games_deterministic(tmp_path):
+    """测试合成数据：相同种子生成相同数据，写入后索引与玩家统计完整"""
+    from sqlalchemy import func, inspect, select
+    from app.database.dataset import generate_rows, load_games
+    from app.models.game import Game
+    from app.models.player_stats import PlayerStats
+
+    first = [row for chunk in generate_rows(2000, seed=7, chunk_size=300) for row in chunk]
+    second = [row for chunk in generate_rows(2000, seed=7, chunk_size=1000) for row in chunk]
+    assert first == second
+    assert first != [row for chunk in generate_rows(2000, seed=8) for row in chunk]
+    assert all(1 <= row["level"] <= 20 and row["score"] >= 0 and row["play_time"] > 0 for row in first)
+    assert [row["created_at"] for row in first] == sorted(row["created_at"] for row in first)
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    try:
+        assert load_games(engine, 2000, seed=7, chunk_size=300) == 2000
+        with engine.connect() as conn:
+            index_names = {index["name"] for index in inspect(conn).get_indexes("games")}
+            assert {index.name for index in Game.__table__.indexes} <= index_names
+            assert conn.scalar(select(func.sum(PlayerStats.total_games))) == 2000
+            assert conn.scalar(select(func.max(Game.score))) == max(row["score"] for row in first)
+    finally:
+        engine.dispose()
+
+
+def test_create_schema_upgrades_existing_tables(tmp_path):
+    """测试升级已有数据库：补建新增列、删除被取代的索引，并回填汇总表"""
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import Session
+
+    from app.database.init_db import backfill_summaries, create_schema
+    from app.services.game_service import game_service
+
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE TABLE games (id INTEGER PRIMARY KEY, player_name VARCHAR(50) NOT NULL, "
+                "score INTEGER NOT NULL, level INTEGER NOT NULL, lines INTEGER NOT NULL, "
+                "play_time INTEGER NOT NULL, created_at DATETIME NOT NULL)"
+            )
+            conn.exec_driver_sql("CREATE INDEX idx_player_name ON games (player_name)")
+            conn.exec_driver_sql(
+                "CREATE TABLE player_stats (player_name VARCHAR(50) PRIMARY KEY, total_games INTEGER NOT NULL, "
+                "highest_score INTEGER NOT NULL, total_play_time INTEGER NOT NULL, "
+                "level_sum INTEGER NOT NULL, highest_level INTEGER NOT NULL)"
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO games VALUES (1, '玩家', 3000, 1, 0, 60, '2026-01-01 00:00:00.000000')"
+            )
+            conn.exec_driver_sql("INSERT INTO player_stats VALUES ('玩家', 1, 3000, 60, 1, 1)")
+
+        with engine.begin() as conn:
+            created = create_schema(conn)
+        assert created == {"player_stats", "leaderboard_rollups", "score_histogram"}
+        inspector = inspect(engine)
+        assert {"best_game_id", "best_created_at"} <= {c["name"] for c in inspector.get_columns("player_stats")}
+        indexes = {index["name"] for index in inspector.get_indexes("games")}
+        assert "idx_player_score" in indexes and "idx_player_name" not in indexes
+
+        with Session(engine) as db:
+            backfill_summaries(db, created)
+            assert [g.id for g in game_service.get_top_players(db)] == [1]
+            assert game_service.get_game_percentile(db, 1)["total"] == 1
+        with engine.begin() as conn:
+            assert create_schema(conn) == set()
+    finally:
+        engine.dispose()
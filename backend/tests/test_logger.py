@@ -0,0 +1,37 @@
+"""
+日志系统测试
+"""
+import json
+import logging
+
+from app.utils.logger import SamplingFilter, get_logger, setup_logging, shutdown_logging
+
+
+def test_queue_logging_json_lines(tmp_path):
+    """测试队列日志：后台线程写出 JSON Lines，按 logger 采样"""
+    setup_logging(log_dir=str(tmp_path), json_lines=True, rotation="size", sampling={"app.sampled": 0.25})
+    try:
+        log = get_logger("sampled")
+        for i in range(8):
+            log.info("事件 %d", i)
+        log.warning("告警不采样")
+        get_logger("other").error("失败: %s", "原因")
+    finally:
+        # 停止时队列中的日志全部写出
+        shutdown_logging()
+
+    lines = [json.loads(line) for line in (tmp_path / "app.log").read_text(encoding="utf-8").splitlines()]
+    assert [(e["logger"], e["level"], e["message"]) for e in lines] == [
+        ("app.sampled", "INFO", "事件 0"),
+        ("app.sampled", "INFO", "事件 4"),
+        ("app.sampled", "WARNING", "告警不采样"),
+        ("app.other", "ERROR", "失败: 原因"),
+    ]
+    assert not logging.getLogger("app.sampled").filters
+
+
+def test_sampling_filter_rates():
+    """测试采样率边界"""
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "msg", None, None)
+    assert all(SamplingFilter(1.0).filter(record) for _ in range(5))
+    assert not any(SamplingFilter(0).filter(record) for _ in range(5))
@@ -0,0 +1,216 @@
+"""
+周期排行榜测试
+"""
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.models.game import Game
+from app.models.leaderboard_rollup import LeaderboardRollup, LeaderboardSnapshot
+from app.schemas.game import GameCreate, GameUpdate
+from app.services.game_service import game_service
+from app.services.leaderboard_index import TRACKED_TOP_N
+from app.services.period_leaderboard import (
+    PERIODS, is_expired, local_date, period_bounds, period_leaderboards,
+)
+
+
+def _save(db, score, player="玩家"):
+    return game_service.save_game_record(db, GameCreate(
+        player_name=player, score=score, level=1, lines=0, play_time=60
+    ))
+
+
+def _add_old(db, score, created_at):
+    """绕过服务层写入一条过去的记录"""
+    game = Game(player_name="老玩家", score=score, level=1, lines=0, play_time=60, created_at=created_at)
+    db.add(game)
+    db.commit()
+    return game
+
+
+def _rollup_ids(db, period):
+    today = local_date(datetime.now(timezone.utc))
+    start, _ = period_bounds(period, today)
+    return set(db.scalars(select(LeaderboardRollup.game_id).where(
+        LeaderboardRollup.period == period, LeaderboardRollup.period_start == start
+    )))
+
+
+def test_period_bounds(monkeypatch):
+    """测试周期边界：周从周一开始，赛季按配置的月数划分"""
+    day = date(2026, 11, 18)  # 周三
+    assert period_bounds("day", day) == (day, date(2026, 11, 19))
+    assert period_bounds("week", day) == (date(2026, 11, 16), date(2026, 11, 23))
+    assert period_bounds("month", date(2026, 12, 31)) == (date(2026, 12, 1), date(2027, 1, 1))
+    assert period_bounds("season", day) == (date(2026, 10, 1), date(2027, 1, 1))
+
+    monkeypatch.setattr(settings, "LEADERBOARD_SEASON_MONTHS", 6)
+    assert period_bounds("season", day) == (date(2026, 7, 1), date(2027, 1, 1))
+
+
+def test_timezone_boundaries(monkeypatch):
+    """测试周期按配置时区的本地日期划分"""
+    moment = datetime(2026, 3, 1, 20, 0)  # UTC
+    assert local_date(moment) == date(2026, 3, 1)
+
+    monkeypatch.setattr(settings, "LEADERBOARD_TIMEZONE", "Asia/Shanghai")
+    assert local_date(moment) == date(2026, 3, 2)
+    # 上海的 3 月 2 日从 UTC 3 月 1 日 16:00 开始
+    assert is_expired(date(2026, 3, 2), now=datetime(2026, 3, 1, 16, 0))
+    assert not is_expired(date(2026, 3, 2), now=datetime(2026, 3, 1, 15, 59))
+
+
+def test_rollups_keep_top_n(db_session):
+    """测试写入时各周期只保留前 N 名，查询结果与全局排行榜排序一致"""
+    for score in range(TRACKED_TOP_N + 10):
+        _save(db_session, score * 10)
+    game_service.save_game_records(db_session, [
+        GameCreate(player_name="批量", score=score, level=1, lines=0, play_time=60) for score in (5, 10000)
+    ])
+
+    top = game_service.get_top_scores(db_session, limit=TRACKED_TOP_N)
+    for period in PERIODS:
+        assert _rollup_ids(db_session, period) == {g.id for g in top}
+        board = game_service.get_period_leaderboard(
+            db_session, period, local_date(datetime.now(timezone.utc)), limit=10
+        )
+        assert board.frozen is False
+        assert [e["id"] for e in board.entries] == [g.id for g in top[:10]]
+
+
+def test_rollups_follow_update_and_delete(db_session):
+    """测试修改、删除记录后汇总从 games 表补足名次"""
+    period_leaderboards.top_n, top_n = 3, period_leaderboards.top_n
+    try:
+        games = [_save(db_session, score) for score in (100, 200, 300, 400)]
+        assert _rollup_ids(db_session, "day") == {games[1].id, games[2].id, games[3].id}
+
+        game_service.delete_game_record(db_session, games[3].id)
+        assert _rollup_ids(db_session, "day") == {games[0].id, games[1].id, games[2].id}
+
+        game_service.update_game_record(db_session, games[2].id, GameUpdate(score=50))
+        assert _rollup_ids(db_session, "week") == {games[0].id, games[1].id, games[2].id}
+        game_service.update_game_record(db_session, games[0].id, GameUpdate(score=10))
+        board = game_service.get_period_leaderboard(
+            db_session, "week", local_date(datetime.now(timezone.utc)), limit=3
+        )
+        assert [e["score"] for e in board.entries] == [200, 50, 10]
+    finally:
+        period_leaderboards.top_n = top_n
+
+
+def test_rollups_incremental_match_games(db_session):
+    """测试随机修改、删除后增量维护的汇总与从 games 表重新计算的结果一致"""
+    import random
+
+    period_leaderboards.top_n, top_n = 3, period_leaderboards.top_n
+    try:
+        rng = random.Random(7)
+        games = [_save(db_session, rng.randrange(10) * 100) for _ in range(12)]
+        start = period_bounds("day", local_date(datetime.now(timezone.utc)))[0]
+        for step in range(30):
+            game = rng.choice(games)
+            if step % 3 == 2 and len(games) > 4:
+                game_service.delete_game_record(db_session, game.id)
+                games.remove(game)
+            else:
+                game_service.update_game_record(db_session, game.id, GameUpdate(score=rng.randrange(10) * 100))
+            expected = period_leaderboards._top_from_games(db_session, "day", start, (Game.id,))
+            assert _rollup_ids(db_session, "day") == {game_id for (game_id,) in expected}
+    finally:
+        period_leaderboards.top_n = top_n
+
+
+def test_expired_period_read_only_until_frozen(db_session):
+    """测试查询尚未冻结的已结束周期只读计算、不写入快照；冻结后不再变化"""
+    old = [_add_old(db_session, score, datetime(2025, 5, 6, 12, 0)) for score in (100, 300, 200)]
+
+    for _ in range(3):
+        board = game_service.get_period_leaderboard(db_session, "month", date(2025, 5, 20), limit=2)
+    assert board.frozen is False
+    assert (board.start, board.end) == (date(2025, 5, 1), date(2025, 6, 1))
+    assert [e["score"] for e in board.entries] == [300, 200]
+    assert db_session.scalars(select(LeaderboardSnapshot)).all() == []
+
+    game_service.delete_game_record(db_session, old[1].id)
+    period_leaderboards.add(db_session, [old[0], old[2]])
+    db_session.commit()
+    _save(db_session, 100)  # 新周期的第一条记录冻结 2025 年 5 月
+    board = game_service.get_period_leaderboard(db_session, "month", date(2025, 5, 20), limit=10)
+    assert board.frozen is True
+    assert [e["score"] for e in board.entries] == [200, 100]
+
+    game_service.delete_game_record(db_session, old[2].id)
+    board = game_service.get_period_leaderboard(db_session, "month", date(2025, 5, 20), limit=10)
+    assert [e["score"] for e in board.entries] == [200, 100]
+
+
+def test_new_period_freezes_previous(db_session):
+    """测试新周期写入第一条记录时，冻结同类型中已结束的周期并删除其汇总行"""
+    old = _add_old(db_session, 500, datetime(2025, 5, 6, 12, 0))
+    period_leaderboards.add(db_session, [old])
+    db_session.commit()
+
+    _save(db_session, 100)
+    rows = db_session.scalars(select(LeaderboardRollup).where(LeaderboardRollup.game_id == old.id)).all()
+    assert rows == []
+    snapshots = {s.period: s for s in db_session.scalars(select(LeaderboardSnapshot))}
+    assert set(snapshots) == set(PERIODS)
+    assert snapshots["day"].period_start == date(2025, 5, 6)
+
+    board = game_service.get_period_leaderboard(db_session, "day", date(2025, 5, 6), limit=10)
+    assert [e["id"] for e in board.entries] == [old.id]
+
+
+def test_rebuild_period_leaderboards(db_session):
+    """测试根据 games 表重建当前周期的汇总"""
+    games = [_save(db_session, score) for score in (100, 200)]
+    _add_old(db_session, 900, datetime(2025, 5, 6, 12, 0))
+    db_session.query(LeaderboardRollup).delete()
+    db_session.commit()
+
+    assert game_service.rebuild_period_leaderboards(db_session) == 2 * len(PERIODS)
+    assert _rollup_ids(db_session, "season") == {g.id for g in games}
+
+
+def test_period_leaderboard_api(client):
+    """测试周期排行榜接口：参数校验、周期响应头与已结束周期的缓存"""
+    for score in (100, 300):
+        client.post("/api/games", json={
+            "player_name": "玩家", "score": score, "level": 1, "lines": 0, "play_time": 60
+        })
+
+    response = client.get("/api/leaderboard?period=week&limit=5")
+    assert response.status_code == 200
+    assert [e["score"] for e in response.json()] == [300, 100]
+    start, end = period_bounds("week", local_date(datetime.now(timezone.utc)))
+    assert response.headers["X-Period-Start"] == start.isoformat()
+    assert response.headers["X-Period-End"] == end.isoformat()
+    assert response.headers["Cache-Control"] == "no-cache"
+    cached = client.get("/api/leaderboard?period=week&limit=5",
+                        headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+    past = (start - timedelta(days=1)).isoformat()
+    assert client.get("/api/leaderboard?period=year").status_code == 400
+    assert client.get(f"/api/leaderboard?at={past}").status_code == 400
+    # 早于最早一条记录所在的周期或晚于今天的日期被拒绝，不会写入快照
+    for period in PERIODS:
+        for at in ("9999-12-31", "0001-01-01", past if period == "day" else "2000-01-01"):
+            response = client.get(f"/api/leaderboard?period={period}&at={at}")
+            assert response.status_code == 400, (period, at)
+
+
+def test_ended_period_api_does_not_write(client, db_session):
+    """测试查询已结束但尚未冻结的周期不写入快照，响应可被新写入失效"""
+    _add_old(db_session, 500, datetime(2025, 5, 6, 12, 0))
+
+    for _ in range(10):
+        response = client.get("/api/leaderboard?period=day&at=2025-05-06")
+        assert response.status_code == 200
+    assert [e["score"] for e in response.json()] == [500]
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert client.get("/api/leaderboard?period=day&at=2025-05-07").json() == []
+    assert db_session.scalars(select(LeaderboardSnapshot)).all() == []
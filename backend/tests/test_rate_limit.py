@@ -0,0 +1,127 @@
+"""
+速率限制中间件测试
+"""
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.main import app as main_app
+from app.middleware import (
+    MemoryBucketStore, RateLimitMiddleware, SharedMemoryBucketStore, parse_rate,
+)
+
+
+def _limited_app(store=None) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/api/games")
+    async def save():
+        return {"ok": True}
+
+    @app.get("/api/leaderboard")
+    async def leaderboard():
+        return {"ok": True}
+
+    app.add_middleware(
+        RateLimitMiddleware, routes={"POST /api/games": "2/minute"}, default="5/minute",
+        store=store or MemoryBucketStore(), enabled=True,
+    )
+    return TestClient(app)
+
+
+def test_parse_rate():
+    """测试限制字符串解析"""
+    assert parse_rate("30/minute") == (30, 0.5)
+    assert parse_rate("5/10seconds") == (5, 0.5)
+    with pytest.raises(ValueError):
+        parse_rate("30 per minute")
+
+
+def test_route_limit_returns_429():
+    """测试按路由限制：超出后返回429，其他路由使用默认限制"""
+    client = _limited_app()
+
+    assert [client.post("/api/games").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post("/api/games")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.json()["retry_after"] >= 1
+
+    assert [client.get("/api/leaderboard").status_code for _ in range(6)] == [200] * 5 + [429]
+
+
+def test_bucket_refills_over_time():
+    """测试令牌按时间补充"""
+    store = MemoryBucketStore()
+    limit = parse_rate("2/second")
+    assert store.hit("k", limit, 0.0) == (True, 0.0)
+    assert store.hit("k", limit, 0.0) == (True, 0.0)
+    allowed, retry_after = store.hit("k", limit, 0.0)
+    assert allowed is False
+    assert retry_after == pytest.approx(0.5)
+    assert store.hit("k", limit, 0.5)[0] is True
+
+
+def test_memory_store_evicts_idle_keys():
+    """测试键数量有上限，已补满的空闲桶被清理"""
+    store = MemoryBucketStore(max_keys=3)
+    limit = parse_rate("1/second")
+    for i in range(10):
+        store.hit(f"client{i}", limit, 0.0)
+    assert len(store) == 3
+
+    # 空闲桶补满后，新键到来时被顺带清理
+    store.hit("late", limit, 10.0)
+    assert len(store) == 1
+
+
+def test_shared_memory_store_across_instances(tmp_path):
+    """测试共享内存存储：同一名称的两个实例（模拟两个 worker）共用令牌桶"""
+    name = f"test-rate-limit-{tmp_path.name}"
+    first, second = SharedMemoryBucketStore(name, 64), SharedMemoryBucketStore(name, 64)
+    try:
+        first.clear()
+        limit = parse_rate("2/minute")
+        assert first.hit("k", limit, 0.0)[0] is True
+        assert second.hit("k", limit, 0.0)[0] is True
+        assert first.hit("k", limit, 0.0)[0] is False
+        assert second.hit("other", limit, 0.0)[0] is True
+
+        client = _limited_app(store=second)
+        assert client.post("/api/games").status_code == 200
+    finally:
+        first.close()
+        second.close()
+        os.unlink(first.path)
+
+
+def test_shared_memory_store_lock_contention(tmp_path):
+    """测试文件锁被其他进程占用时等待释放后再检查，不会绕过限制"""
+    import fcntl
+    import threading
+
+    store = SharedMemoryBucketStore(f"test-rate-limit-{tmp_path.name}", 64)
+    holder = os.open(store.path, os.O_RDWR)
+    try:
+        limit = parse_rate("1/minute")
+        assert store.hit("k", limit, 0.0)[0] is True
+
+        fcntl.flock(holder, fcntl.LOCK_EX)
+        release = threading.Timer(0.05, fcntl.flock, (holder, fcntl.LOCK_UN))
+        release.start()
+        start = time.monotonic()
+        assert store.hit("k", limit, 0.0)[0] is False
+        assert time.monotonic() - start >= 0.04
+        release.join()
+    finally:
+        os.close(holder)
+        store.close()
+        os.unlink(store.path)
+
+
+def test_main_app_installs_rate_limit():
+    """测试应用已安装速率限制中间件"""
+    assert any(m.cls is RateLimitMiddleware for m in main_app.user_middleware)
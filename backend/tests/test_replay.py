@@ -0,0 +1,353 @@
+"""
+回放引擎与回放校验测试
+"""
+import random
+import sqlite3
+from itertools import islice
+
+import pytest
+
+from app.config import settings
+from app.services.replay import (
+    _SHAPES, _TABLE, COLS, LINE_SCORES, PIECE_TYPES, _lock, autoplay, autoplay_timed,
+    mulberry32, piece_sequence, replay,
+)
+from app.services.replay_format import CONTENT_TYPE as REPLAY_CONTENT_TYPE, decode_replay, encode_replay
+from app.services.replay_store import open_sqlite_blob, sqlite_file_path
+from app.services.replay_verifier import ReplayVerifier
+
+
+def _replay_payload(seed: int, pieces: int = 120, **overrides) -> dict:
+    """按回放结果构造一条提交记录"""
+    actions = autoplay(seed, pieces)
+    result = replay(seed, actions)
+    payload = {
+        "player_name": "回放玩家", "score": result.score, "level": result.level,
+        "lines": result.lines, "play_time": 60,
+        "replay": {"seed": seed, "actions": actions},
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_mulberry32_matches_javascript():
+    """测试随机数与 JS 版 mulberry32 逐位一致（期望值由 Node.js 计算）"""
+    assert list(islice(mulberry32(0), 5)) == [
+        1144304738, 1416247, 958946056, 627933444, 2007157716,
+    ]
+    assert list(islice(mulberry32(42), 3)) == [2581720956, 1925393290, 3661312704]
+
+
+def test_piece_sequence_uses_seven_bag():
+    """测试方块序列：与 JS 实现一致，且每袋 7 种各一个"""
+    sequence = "".join(PIECE_TYPES[kind] for kind in islice(piece_sequence(12345), 21))
+    assert sequence == "LOTSJIZIZJSOTLLJSIOZT"
+    for start in range(0, 21, 7):
+        assert sorted(sequence[start:start + 7]) == sorted(PIECE_TYPES)
+
+
+class _ReferenceGame:
+    """逐格照搬前端 GameEngine 的二维数组实现，用于对照位棋盘回放"""
+
+    def __init__(self, seed: int):
+        self.board = [[0] * COLS for _ in range(20)]
+        self.pieces = piece_sequence(seed)
+        self.score, self.lines, self.level, self.count = 0, 0, 1, 0
+        self.over = False
+        self.spawn()
+
+    def collides(self, shape, x, y) -> bool:
+        for py, row in enumerate(shape):
+            for px, cell in enumerate(row):
+                if cell:
+                    bx, by = x + px, y + py
+                    if bx < 0 or bx >= COLS or by >= 20:
+                        return True
+                    if by >= 0 and self.board[by][bx]:
+                        return True
+        return False
+
+    def spawn(self):
+        self.kind = next(self.pieces)
+        self.rotation, self.shape = 0, _SHAPES[self.kind][0]
+        self.x, self.y = (COLS - len(self.shape[0])) // 2, 0
+        self.count += 1
+        if self.collides(self.shape, self.x, self.y):
+            self.over = True
+
+    def move_down(self) -> bool:
+        if not self.collides(self.shape, self.x, self.y + 1):
+            self.y += 1
+            return True
+        for py, row in enumerate(self.shape):
+            for px, cell in enumerate(row):
+                if cell:
+                    self.board[self.y + py][self.x + px] = 1
+        full = [i for i, row in enumerate(self.board) if all(row)]
+        if full:
+            self.board = [[0] * COLS for _ in full] + [
+                row for i, row in enumerate(self.board) if i not in full
+            ]
+            self.score += LINE_SCORES[min(len(full), 4)] * self.level
+            self.lines += len(full)
+            new_level = self.lines // settings.LINES_PER_LEVEL + 1
+            if self.level < new_level <= 20:
+                self.level = new_level
+        self.spawn()
+        return False
+
+    def apply(self, action: str):
+        if self.over:
+            return
+        if action in "LR":
+            dx = -1 if action == "L" else 1
+            if not self.collides(self.shape, self.x + dx, self.y):
+                self.x += dx
+        elif action == "D":
+            self.move_down()
+        elif action == "H":
+            while not self.over and self.move_down():
+                pass
+        elif action == "U":
+            rotation = (self.rotation + 1) % 4
+            shape = _SHAPES[self.kind][rotation]
+            for kick in (0, -1, 1, -2, 2):
+                if not self.collides(shape, self.x + kick, self.y):
+                    self.rotation, self.shape = rotation, shape
+                    self.x += kick
+                    return
+
+
+def test_matches_reference_engine():
+    """测试位棋盘回放与逐格实现的结果一致（随机操作与自动对局）"""
+    rng = random.Random(2024)
+    cases = [(seed, autoplay(seed, 150)) for seed in range(5)]
+    cases += [
+        (rng.getrandbits(32), "".join(rng.choice("LLRRUUDDDH") for _ in range(rng.randint(0, 2000))))
+        for _ in range(30)
+    ]
+    for seed, actions in cases:
+        game = _ReferenceGame(seed)
+        for action in actions:
+            game.apply(action)
+        result = replay(seed, actions)
+        assert (result.score, result.lines, result.level, result.pieces, result.game_over) == (
+            game.score, game.lines, game.level, game.count, game.over
+        )
+
+
+def test_lock_clears_full_rows():
+    """测试锁定后消除满行，上方的行整体下移"""
+    full = (1 << COLS) - 1
+    i_piece = _TABLE[0][0]  # 横放的 I 占 4 列
+    rows = [0] * 20
+    rows[19] = full & ~(0b1111 << 5)
+    rows[18] = 0b1
+    board = sum(row << (index * COLS) for index, row in enumerate(rows))
+
+    board, cleared = _lock(board, i_piece, 5, 19)
+    assert cleared == 1
+    assert board == 0b1 << (19 * COLS)
+
+
+def test_replay_stops_at_game_over():
+    """测试堆到顶后游戏结束，之后的操作被忽略"""
+    result = replay(1, "H" * 200)
+    assert result.game_over
+    assert result.actions < 200
+    assert result.pieces == result.actions + 1
+    assert replay(1, "H" * 200 + "LRU") == result
+
+
+def test_replay_is_deterministic():
+    """测试同一种子与操作序列的回放结果不变"""
+    actions = autoplay(3, 150)
+    assert replay(3, actions) == replay(3, actions.encode())
+    assert replay(3, actions) != replay(4, actions)
+
+
+def test_replay_rejects_unknown_action():
+    """测试未知操作"""
+    with pytest.raises(ValueError):
+        replay(1, "LRX")
+
+
+def test_level_follows_lines():
+    """测试等级随消除行数提升"""
+    result = replay(11, autoplay(11, 400))
+    assert result.lines >= settings.LINES_PER_LEVEL
+    assert result.level == min(result.lines // settings.LINES_PER_LEVEL + 1, 20)
+
+
+def test_process_pool_verifier():
+    """测试进程池中重放的结果与进程内一致"""
+    import asyncio
+    from app.schemas.game import GameCreate
+
+    verifier = ReplayVerifier(workers=1)
+    verifier.start()
+    try:
+        payload = _replay_payload(5)
+        assert asyncio.run(verifier.verify(GameCreate(**payload))) is None
+        payload["score"] += 100
+        assert "score" in asyncio.run(verifier.verify(GameCreate(**payload)))
+        result = asyncio.run(verifier.replay(5, payload["replay"]["actions"]))
+        assert result == replay(5, payload["replay"]["actions"])
+    finally:
+        verifier.stop()
+    assert not verifier.running
+
+
+def test_save_game_with_valid_replay(client):
+    """测试附带回放的记录校验通过后保存"""
+    response = client.post("/api/games", json=_replay_payload(9))
+    assert response.status_code == 201
+    assert "replay" not in response.json()
+
+
+def test_save_game_with_forged_score(client):
+    """测试分数与回放不一致时返回422"""
+    payload = _replay_payload(9)
+    payload["score"] += 1000
+    response = client.post("/api/games", json=payload)
+    assert response.status_code == 422
+    assert "回放校验失败" in response.json()["detail"]
+    assert client.get("/api/games").json() == []
+
+
+def test_batch_rejects_forged_replay(client):
+    """测试批量提交中任一回放不一致时整批拒绝"""
+    forged = _replay_payload(2, lines=0)
+    response = client.post("/api/games/batch", json=[_replay_payload(1), forged])
+    assert response.status_code == 422
+
+
+def test_replay_required(client, sample_game_data, monkeypatch):
+    """测试 REPLAY_VERIFICATION=required 时拒绝未附带回放的记录"""
+    monkeypatch.setattr(settings, "REPLAY_VERIFICATION", "required")
+    assert client.post("/api/games", json=sample_game_data).status_code == 422
+    assert client.post("/api/games", json=_replay_payload(4)).status_code == 201
+
+
+def test_replay_required_blocks_score_update(client, monkeypatch):
+    """测试 REPLAY_VERIFICATION=required 时不能通过更新接口修改分数"""
+    game_id = client.post("/api/games", json=_replay_payload(4)).json()["id"]
+    monkeypatch.setattr(settings, "REPLAY_VERIFICATION", "required")
+    for field, value in (("score", 999999), ("lines", 100), ("level", 20)):
+        response = client.put(f"/api/games/{game_id}", json={field: value})
+        assert response.status_code == 422
+        assert field in response.json()["detail"]
+    assert client.get(f"/api/games/{game_id}").json()["score"] == _replay_payload(4)["score"]
+    assert client.put(f"/api/games/{game_id}", json={"player_name": "改名"}).status_code == 200
+
+
+def test_invalid_replay_actions(client, sample_game_data):
+    """测试操作序列格式校验"""
+    payload = dict(sample_game_data, replay={"seed": 1, "actions": "LRX"})
+    assert client.post("/api/games", json=payload).status_code == 422
+
+
+def test_replay_format_roundtrip():
+    """测试回放编码与解码"""
+    actions, timestamps = autoplay_timed(6, 120)
+    data = encode_replay(6, actions, timestamps)
+    assert data.startswith(b"TRP")
+    assert decode_replay(data) == (6, actions, timestamps)
+    assert decode_replay(encode_replay(1, "LRDHU" * 3)) == (1, "LRDHU" * 3, None)
+    assert decode_replay(encode_replay(0, "")) == (0, "", None)
+    with pytest.raises(ValueError):
+        decode_replay(b"TRP\x01garbage")
+
+
+def test_replay_size_budget():
+    """测试按真人节奏生成的回放平均每分钟远小于 1 KB"""
+    total_bytes = total_ms = 0
+    for seed in range(5):
+        actions, timestamps = autoplay_timed(seed, 200)
+        total_bytes += len(encode_replay(seed, actions, timestamps))
+        total_ms += timestamps[-1]
+    assert total_bytes / (total_ms / 60000) < 800
+
+
+def test_replay_stored_and_streamed(client):
+    """测试回放随记录保存，并可下载"""
+    actions, timestamps = autoplay_timed(8, 150)
+    payload = _replay_payload(8)
+    payload["replay"] = {"seed": 8, "actions": actions, "timestamps": timestamps}
+    result = replay(8, actions)
+    payload.update(score=result.score, lines=result.lines, level=result.level)
+    game_id = client.post("/api/games", json=payload).json()["id"]
+
+    response = client.get(f"/api/games/{game_id}/replay")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == REPLAY_CONTENT_TYPE
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert decode_replay(response.content) == (8, actions, timestamps)
+
+    # 不带回放的记录与不存在的记录都返回404
+    plain = client.post("/api/games", json={k: v for k, v in payload.items() if k != "replay"})
+    assert client.get(f"/api/games/{plain.json()['id']}/replay").status_code == 404
+    assert client.get("/api/games/99999/replay").status_code == 404
+
+    # 删除记录时一并删除回放
+    assert client.delete(f"/api/games/{game_id}").status_code == 204
+    assert client.get(f"/api/games/{game_id}/replay").status_code == 404
+
+
+def test_batch_stores_replays(client):
+    """测试批量保存时回放一并写入"""
+    saved = client.post("/api/games/batch", json=[_replay_payload(1, 40), _replay_payload(2, 40)]).json()
+    for seed, game in zip((1, 2), saved):
+        decoded = decode_replay(client.get(f"/api/games/{game['id']}/replay").content)
+        assert decoded.seed == seed and decoded.timestamps is None
+
+
+def test_replay_timestamps_validation(client):
+    """测试时间戳数量或顺序不正确时返回422"""
+    payload = _replay_payload(3, 10)
+    count = len(payload["replay"]["actions"])
+    payload["replay"]["timestamps"] = list(range(count - 1))
+    assert client.post("/api/games", json=payload).status_code == 422
+    payload["replay"]["timestamps"] = list(range(count, 0, -1))
+    assert client.post("/api/games", json=payload).status_code == 422
+
+
+@pytest.mark.parametrize("blobopen", [True, False])
+def test_sqlite_blob_stream_chunks(db_session, monkeypatch, blobopen):
+    """测试按块增量读取 BLOB（blobopen 与 Python 3.10 的 substr 分块读取）"""
+    from app.models.game import Game
+    from app.models.game_replay import GameReplayBlob
+
+    game = Game(player_name="p", score=1, level=1, lines=0, play_time=1)
+    db_session.add(game)
+    db_session.flush()
+    data = bytes(range(256)) * 100
+    db_session.add(GameReplayBlob(game_id=game.id, data=data))
+    db_session.commit()
+
+    path = sqlite_file_path(db_session.get_bind())
+    if not blobopen:
+        connect = sqlite3.connect
+        monkeypatch.setattr(sqlite3, "connect", lambda *a, **kw: _NoBlobConnection(connect(*a, **kw)))
+    blob = open_sqlite_blob(path, game.id, chunk_size=4096)
+    assert blob.size == len(data)
+    # 打开之后回放被删除，仍读到打开时的完整内容
+    db_session.delete(db_session.get(GameReplayBlob, game.id))
+    db_session.commit()
+    chunks = list(blob)
+    assert b"".join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) == 4096
+
+    assert open_sqlite_blob(path, game.id) is None
+
+
+class _NoBlobConnection:
+    """没有 blobopen 的连接（Python 3.10）"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if name == "blobopen":
+            raise AttributeError(name)
+        return getattr(self._conn, name)
@@ -0,0 +1,166 @@
+"""
+分数分布与百分位测试
+"""
+import random
+
+from sqlalchemy import select
+
+from app.models.score_histogram import ScoreHistogram
+from app.schemas.game import GameCreate, GameUpdate
+from app.services.game_service import game_service
+from app.services.score_sketch import ScoreSketch, bin_width, bucket_bounds, bucket_of, merge_sketches
+
+
+def _save(db, score, level=1):
+    return game_service.save_game_record(db, GameCreate(
+        player_name="玩家", score=score, level=level, lines=0, play_time=60
+    ))
+
+
+def _histogram_rows(db):
+    return set(db.execute(select(ScoreHistogram.level, ScoreHistogram.bucket, ScoreHistogram.count)).all())
+
+
+def test_buckets_cover_scores_in_order():
+    """测试分桶连续、单调，桶宽不超过桶内分数的 1/64"""
+    previous = -1
+    for score in list(range(5000)) + [10 ** 6, 2 ** 31 - 1]:
+        bucket = bucket_of(score)
+        low, high = bucket_bounds(bucket)
+        assert low <= score <= high
+        assert bucket >= previous
+        assert high - low + 1 <= max(low / 64, 1)
+        previous = bucket
+
+
+def test_sketch_quantiles_within_one_percent():
+    """测试分位数与精确值的相对误差不超过1%，百分位与精确比例接近"""
+    rng = random.Random(7)
+    scores = [int(rng.lognormvariate(9, 1.2)) * 100 for _ in range(20000)]
+    sketch = ScoreSketch()
+    for score in scores:
+        sketch.add(score)
+
+    ordered = sorted(scores)
+    for q in (0.5, 0.9, 0.99, 1.0):
+        exact = ordered[max(int(q * len(ordered) + 0.999999), 1) - 1]
+        assert abs(sketch.quantile(q) - exact) <= exact / 100
+    below = sum(score < ordered[15000] for score in scores) / len(scores)
+    assert abs(sketch.fraction_below(ordered[15000]) - below) < 0.01
+    assert ScoreSketch().quantile(0.5) is None
+
+
+def test_sketch_merge_and_remove():
+    """测试分布可合并，扣除记录后与未加入时一致"""
+    left, right = ScoreSketch(), ScoreSketch()
+    for score in (100, 2500, 90000):
+        left.add(score)
+    for score in (100, 300):
+        right.add(score)
+
+    merged = merge_sketches([left, right])
+    assert merged.total == 5
+    assert merged.counts[bucket_of(100)] == 2
+
+    merged.add(300, -1)
+    merged.add(100, -1)
+    merged.add(100, -1)
+    assert merged.counts == {b: c for b, c in left.counts.items() if b != bucket_of(100)}
+
+
+def test_bin_width():
+    """测试直方图分组宽度取整为 1、2、5 × 10^k 且覆盖最高分"""
+    assert bin_width(0, 20) == 1
+    assert bin_width(99, 10) == 10
+    assert bin_width(1007, 4) == 500
+    assert bin_width(3178495, 20) == 200000
+
+
+def test_histogram_follows_writes(db_session):
+    """测试分数分布汇总随保存、批量保存、修改、删除增量维护，与全量重建结果一致"""
+    games = [_save(db_session, score, level) for score, level in ((100, 1), (5000, 2), (5000, 2), (123456, 3))]
+    game_service.save_game_records(db_session, [
+        GameCreate(player_name="批量", score=score, level=2, lines=0, play_time=60) for score in (5000, 700)
+    ])
+    game_service.update_game_record(db_session, games[0].id, GameUpdate(score=200))
+    game_service.update_game_record(db_session, games[1].id, GameUpdate(level=4))
+    game_service.delete_game_record(db_session, games[3].id)
+
+    incremental = _histogram_rows(db_session)
+    assert (2, bucket_of(5000), 2) in incremental
+    assert all(level != 3 for level, _, _ in incremental)
+
+    game_service.rebuild_score_histogram(db_session)
+    assert _histogram_rows(db_session) == incremental
+
+
+def test_distribution_and_percentile(db_session):
+    """测试整体及各等级的分布、分位数与单条记录的百分位"""
+    games = [_save(db_session, score, level) for score, level in ((100, 1), (200, 1), (300, 1), (1000, 2))]
+
+    distribution = game_service.get_score_distribution(db_session, [50, 99.9], bins=4)
+    assert distribution["total"] == 4
+    # 分位数为所在分桶的中点：200 所在的桶为 [200, 201]，1000 所在的桶为 [1000, 1007]
+    assert distribution["percentiles"] == {"p50": 200, "p99.9": 1003}
+    assert sum(b["count"] for b in distribution["histogram"]) == 4
+    assert distribution["histogram"][0]["start"] == 0
+    assert [d["level"] for d in distribution["levels"]] == [1, 2]
+    assert distribution["levels"][0]["percentiles"]["p50"] == 200
+    assert [b["start"] for b in distribution["levels"][1]["histogram"]] == \
+        [b["start"] for b in distribution["histogram"]]
+
+    percentile = game_service.get_game_percentile(db_session, games[2].id)
+    assert percentile["total"] == 4 and percentile["level_total"] == 3
+    assert percentile["percentile"] == 50.0
+    assert round(percentile["level_percentile"], 2) == 66.67
+    assert game_service.get_game_percentile(db_session, 99999) is None
+
+
+def test_distribution_api(client):
+    """测试分布与百分位接口：参数校验、ETag 与不存在的记录"""
+    ids = [
+        client.post("/api/games", json={
+            "player_name": "玩家", "score": score, "level": 1, "lines": 0, "play_time": 60
+        }).json()["id"]
+        for score in (100, 300)
+    ]
+
+    response = client.get("/api/stats/distribution?percentiles=50,90&bins=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert data["percentiles"] == {"p50": 100, "p90": 301}
+    assert [(b["start"], b["count"]) for b in data["histogram"]] == [(0, 0), (100, 1), (200, 0), (300, 1)]
+    cached = client.get("/api/stats/distribution?percentiles=50,90&bins=5",
+                        headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+    client.post("/api/games", json={"player_name": "玩家", "score": 500, "level": 2, "lines": 0, "play_time": 60})
+    data = client.get("/api/stats/distribution?percentiles=50,90&bins=5").json()
+    assert data["total"] == 3
+    assert [d["level"] for d in data["levels"]] == [1, 2]
+
+    assert client.get("/api/stats/distribution?percentiles=101").status_code == 400
+    assert client.get("/api/stats/distribution?percentiles=abc").status_code == 400
+    assert client.get("/api/stats/distribution?bins=0").status_code == 400
+
+    response = client.get(f"/api/games/{ids[1]}/percentile")
+    assert response.status_code == 200
+    assert response.json()["percentile"] == 33.33
+    assert response.json()["level_percentile"] == 50.0
+    assert client.get("/api/games/99999/percentile").status_code == 404
+
+
+def test_percentile_not_in_index(db_session, client):
+    """测试索引中没有的记录（其他 worker 写入）从数据库读取分数"""
+    from app.models.game import Game
+    from app.services.leaderboard_index import leaderboard_indexes
+
+    _save(db_session, 100)
+    leaderboard_indexes.get(db_session)
+    game = Game(player_name="其他", score=900, level=1, lines=0, play_time=60)
+    db_session.add(game)
+    db_session.commit()
+
+    response = client.get(f"/api/games/{game.id}/percentile")
+    assert response.status_code == 200
+    assert response.json()["percentile"] == 100.0
@@ -267,3 +267,341 @@ class TestGameService:
         assert stats["total_games"] == 0
         assert stats["highest_score"] == 0
         assert stats["total_play_time"] == 0
+
+    def test_top_scores_served_from_index(self, db_session):
+        """测试排行榜读取不访问数据库"""
+        from sqlalchemy import event
+
+        for score in [3000, 1000, 2000]:
+            game_service.save_game_record(db_session, GameCreate(
+                player_name="玩家", score=score, level=1, lines=0, play_time=60
+            ))
+
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda *args, **kwargs: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            top_scores = game_service.get_top_scores(db_session, limit=2)
+            is_high = game_service.is_high_score(db_session, 1500)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert [g.score for g in top_scores] == [3000, 2000]
+        assert is_high is True
+        assert statements == []
+
+    def test_leaderboard_index_tracks_writes(self, db_session):
+        """测试保存、更新、删除后索引与数据库保持一致"""
+        from app.schemas.game import GameUpdate
+
+        games = [
+            game_service.save_game_record(db_session, GameCreate(
+                player_name=f"玩家{i}", score=100 * i, level=1, lines=0, play_time=60
+            ))
+            for i in range(1, 6)
+        ]
+        game_service.update_game_record(db_session, games[0].id, GameUpdate(score=9000))
+        game_service.delete_game_record(db_session, games[4].id)
+
+        top_scores = game_service.get_top_scores(db_session, limit=10)
+        assert [g.score for g in top_scores] == [9000, 400, 300, 200]
+        assert game_service.check_leaderboard_index(db_session)["consistent"] is True
+
+    def test_top_version_tracks_visible_top(self, db_session):
+        """测试只有前 N 名变化时 top_version 才递增"""
+        from app.services.leaderboard_index import TRACKED_TOP_N, leaderboard_indexes
+
+        for i in range(TRACKED_TOP_N):
+            game_service.save_game_record(db_session, GameCreate(
+                player_name="玩家", score=1000 + i, level=1, lines=0, play_time=60
+            ))
+        index = leaderboard_indexes.get(db_session)
+        version = index.top_version
+
+        low = game_service.save_game_record(db_session, GameCreate(
+            player_name="玩家", score=10, level=1, lines=0, play_time=60
+        ))
+        game_service.delete_game_record(db_session, low.id)
+        assert index.top_version == version
+
+        game_service.save_game_record(db_session, GameCreate(
+            player_name="玩家", score=5000, level=1, lines=0, play_time=60
+        ))
+        assert index.top_version > version
+
+    def test_leaderboard_index_caches_top_rows(self, db_session, monkeypatch):
+        """测试索引只缓存前列记录，其余记录从数据库读取，删除前列记录后补齐缓存"""
+        from app.services import leaderboard_index
+        from app.services.leaderboard_index import leaderboard_indexes
+
+        monkeypatch.setattr(leaderboard_index, "TOP_CACHE_SIZE", 4)
+        games = [
+            game_service.save_game_record(db_session, GameCreate(
+                player_name=f"玩家{i}", score=100 * i, level=1, lines=0, play_time=60
+            ))
+            for i in range(1, 11)
+        ]
+        index = leaderboard_indexes.get(db_session)
+        index.load(db_session)
+        assert index.get(games[9].id).score == 1000
+        assert index.get(games[0].id) is None
+        assert [r.score for r in index.range(1, 10)] == [1000, 900, 800, 700]
+        assert [r.score for r in index.range(1, 10, db_session)] == [100 * i for i in range(10, 0, -1)]
+        assert game_service.get_game_rank(db_session, games[0].id)["rank"] == 10
+
+        for game in games[7:]:
+            game_service.delete_game_record(db_session, game.id)
+        assert index.needs_refill
+        assert [g.score for g in game_service.get_top_scores(db_session, limit=4)] == [700, 600, 500, 400]
+        assert not index.needs_refill
+
+        # 前列新增的记录进入缓存，超过 2 * TOP_CACHE_SIZE 名时截断
+        for i in range(5):
+            game_service.save_game_record(db_session, GameCreate(
+                player_name="玩家", score=2000 + i, level=1, lines=0, play_time=60
+            ))
+        assert len(index._cached) == 4
+        assert [g.score for g in game_service.get_top_scores(db_session, limit=4)] == [2004, 2003, 2002, 2001]
+        assert game_service.check_leaderboard_index(db_session)["consistent"] is True
+
+    def test_check_leaderboard_index_repair(self, db_session):
+        """测试绕过服务层写入后的一致性检查与修复"""
+        game_service.save_game_record(db_session, GameCreate(
+            player_name="玩家", score=1000, level=1, lines=0, play_time=60
+        ))
+        db_session.add(Game(player_name="外部写入", score=5000, level=1, lines=0, play_time=60))
+        db_session.commit()
+
+        report = game_service.check_leaderboard_index(db_session, repair=True)
+        assert report["consistent"] is False
+        assert len(report["missing"]) == 1
+        assert report["repaired"] is True
+
+        assert game_service.check_leaderboard_index(db_session)["consistent"] is True
+        assert game_service.get_top_scores(db_session, limit=1)[0].score == 5000
+
+    def test_get_game_rank(self, db_session):
+        """测试名次查询"""
+        games = [
+            game_service.save_game_record(db_session, GameCreate(
+                player_name="玩家", score=score, level=1, lines=0, play_time=60
+            ))
+            for score in [500, 900, 100, 700]
+        ]
+
+        rank = game_service.get_game_rank(db_session, games[0].id)
+        assert rank == {"game_id": games[0].id, "score": 500, "rank": 3, "total": 4}
+        assert game_service.get_game_rank(db_session, 99999) is None
+
+    def test_get_leaderboard_around(self, db_session):
+        """测试名次附近的排行榜窗口"""
+        games = [
+            game_service.save_game_record(db_session, GameCreate(
+                player_name=f"玩家{i}", score=100 * i, level=1, lines=0, play_time=60
+            ))
+            for i in range(1, 11)
+        ]
+
+        window = game_service.get_leaderboard_around(db_session, games[1].id, radius=2)
+        assert window["rank"] == 9
+        assert [e["rank"] for e in window["entries"]] == [7, 8, 9, 10]
+        assert [e["score"] for e in window["entries"]] == [400, 300, 200, 100]
+
+        window = game_service.get_leaderboard_around(db_session, games[9].id, radius=1)
+        assert [e["score"] for e in window["entries"]] == [1000, 900]
+
+
+class TestSortedKeyList:
+    """顺序统计结构测试类"""
+
+    def test_matches_sorted_list(self):
+        """测试随机插入删除后与普通有序列表结果一致"""
+        import random
+        from app.services.leaderboard_index import SortedKeyList
+
+        rng = random.Random(42)
+        keys = SortedKeyList(load=4)
+        expected = []
+        for i in range(2000):
+            if expected and rng.random() < 0.4:
+                key = expected.pop(rng.randrange(len(expected)))
+                assert keys.remove(key) is True
+            else:
+                key = (rng.randrange(100), i, i)
+                keys.add(key)
+                expected.append(key)
+            expected.sort()
+
+        assert len(keys) == len(expected)
+        assert list(keys) == expected
+        for pos in range(0, len(expected), 7):
+            assert keys.index(expected[pos]) == pos
+            assert keys.slice(pos, pos + 5) == expected[pos:pos + 5]
+        assert keys.remove((1000, 0, 0)) is False
+
+
+class TestGameHistoryCursor:
+    """历史记录游标分页测试类"""
+
+    def test_cursor_pagination(self, db_session):
+        """测试游标分页遍历全部记录且不重复"""
+        from app.services.game_service import encode_history_cursor
+
+        for i in range(7):
+            game_service.save_game_record(db_session, GameCreate(
+                player_name=f"玩家{i}", score=100 * i, level=1, lines=0, play_time=60
+            ))
+
+        seen = []
+        after = None
+        while True:
+            page = game_service.get_game_history(db_session, limit=3, after=after)
+            seen.extend(g.score for g in page)
+            if len(page) < 3:
+                break
+            after = encode_history_cursor(page[-1])
+
+        assert seen == [600, 500, 400, 300, 200, 100, 0]
+
+    def test_invalid_cursor(self, db_session):
+        """测试无效游标"""
+        with pytest.raises(ValueError):
+            game_service.get_game_history(db_session, after="not-a-cursor")
+
+    def test_cursor_query_uses_index(self, db_session):
+        """测试游标查询走 (created_at, id) 索引"""
+        from sqlalchemy import text
+
+        plan = db_session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM games "
+            "WHERE (created_at, id) < ('2026-01-01 00:00:00', 10) "
+            "ORDER BY created_at DESC, id DESC LIMIT 20"
+        )).all()
+        detail = " ".join(row[-1] for row in plan)
+        assert "idx_created_id" in detail
+        assert "TEMP B-TREE" not in detail
+
+
+class TestPlayerStatsRollup:
+    """玩家统计汇总测试类"""
+
+    def _save(self, db_session, name, score, level, play_time):
+        return game_service.save_game_record(db_session, GameCreate(
+            player_name=name, score=score, level=level, lines=0, play_time=play_time
+        ))
+
+    def test_stats_read_is_single_lookup(self, db_session):
+        """测试统计查询只执行一次主键查找"""
+        from sqlalchemy import event
+
+        for score in [1000, 2000, 1500]:
+            self._save(db_session, "玩家A", score, 5, 100)
+
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda *args, **kwargs: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            stats = game_service.get_player_stats(db_session, "玩家A")
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert stats["total_games"] == 3
+        assert len(statements) == 1
+        assert "FROM player_stats" in statements[0]
+
+    def test_stats_follow_update_and_delete(self, db_session):
+        """测试修改和删除后汇总随之更新"""
+        from app.schemas.game import GameUpdate
+
+        low = self._save(db_session, "玩家A", 1000, 5, 100)
+        high = self._save(db_session, "玩家A", 3000, 12, 200)
+
+        game_service.delete_game_record(db_session, high.id)
+        stats = game_service.get_player_stats(db_session, "玩家A")
+        assert stats == {
+            "total_games": 1, "highest_score": 1000, "total_play_time": 100,
+            "average_level": 5, "highest_level": 5
+        }
+
+        # 修改玩家名称时，记录从原玩家移到新玩家
+        game_service.update_game_record(db_session, low.id, GameUpdate(player_name="玩家B", score=500))
+        assert game_service.get_player_stats(db_session, "玩家A")["total_games"] == 0
+        stats = game_service.get_player_stats(db_session, "玩家B")
+        assert stats["total_games"] == 1
+        assert stats["highest_score"] == 500
+
+    def test_rebuild_player_stats(self, db_session):
+        """测试根据 games 表重建汇总"""
+        from app.models.player_stats import PlayerStats
+
+        self._save(db_session, "玩家A", 1000, 5, 100)
+        self._save(db_session, "玩家A", 2000, 10, 200)
+        self._save(db_session, "玩家B", 3000, 12, 300)
+        expected = game_service.get_player_stats(db_session, "玩家A")
+
+        db_session.query(PlayerStats).delete()
+        db_session.commit()
+        assert game_service.get_player_stats(db_session, "玩家A")["total_games"] == 0
+
+        assert game_service.rebuild_player_stats(db_session) == 2
+        assert game_service.get_player_stats(db_session, "玩家A") == expected
+        assert game_service.get_player_stats(db_session, "玩家B")["highest_score"] == 3000
+
+    def test_top_players_one_entry_per_player(self, db_session):
+        """测试每名玩家只出现一次，同分时先达到者靠前，删除与修改后随之更新"""
+        from app.schemas.game import GameUpdate
+
+        a_first = self._save(db_session, "玩家A", 3000, 5, 100)
+        self._save(db_session, "玩家A", 2000, 5, 100)
+        b_best = self._save(db_session, "玩家B", 3000, 5, 100)
+        a_tie = self._save(db_session, "玩家A", 3000, 5, 100)
+        game_service.save_game_records(db_session, [
+            GameCreate(player_name="玩家C", score=score, level=1, lines=0, play_time=60) for score in (500, 900, 900)
+        ])
+
+        top = game_service.get_top_players(db_session, limit=10)
+        assert [(g.player_name, g.id) for g in top[:2]] == [("玩家A", a_first.id), ("玩家B", b_best.id)]
+        assert [g.player_name for g in top] == ["玩家A", "玩家B", "玩家C"]
+        assert top[2].score == 900
+
+        game_service.delete_game_record(db_session, a_first.id)
+        top = game_service.get_top_players(db_session, limit=10)
+        assert [(g.player_name, g.id) for g in top[:2]] == [("玩家B", b_best.id), ("玩家A", a_tie.id)]
+
+        game_service.update_game_record(db_session, b_best.id, GameUpdate(score=100))
+        assert [(g.player_name, g.score) for g in game_service.get_top_players(db_session, limit=2)] == [
+            ("玩家A", 3000), ("玩家C", 900)
+        ]
+
+        # 重建后结果不变
+        expected = game_service.get_top_players(db_session, limit=10)
+        game_service.rebuild_player_stats(db_session)
+        assert game_service.get_top_players(db_session, limit=10) == expected
+
+
+class TestBatchSave:
+    """批量保存测试类"""
+
+    def test_save_game_records(self, db_session):
+        """测试批量保存后记录、排行榜索引和玩家统计一致"""
+        games_data = [
+            GameCreate(player_name="玩家A", score=1000, level=5, lines=10, play_time=100),
+            GameCreate(player_name="玩家B", score=3000, level=9, lines=30, play_time=300),
+            GameCreate(player_name="玩家A", score=2000, level=7, lines=20, play_time=200),
+        ]
+
+        saved = game_service.save_game_records(db_session, games_data)
+
+        assert [g.score for g in saved] == [1000, 3000, 2000]
+        assert saved[0].id < saved[1].id < saved[2].id
+        assert game_service.get_game_by_id(db_session, saved[1].id).player_name == "玩家B"
+        assert [g.score for g in game_service.get_top_scores(db_session, limit=3)] == [3000, 2000, 1000]
+        assert game_service.check_leaderboard_index(db_session)["consistent"] is True
+
+        stats = game_service.get_player_stats(db_session, "玩家A")
+        assert stats["total_games"] == 2
+        assert stats["highest_score"] == 2000
+        assert stats["total_play_time"] == 300
+        assert stats["average_level"] == 6
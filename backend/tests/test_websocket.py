@@ -0,0 +1,400 @@
+"""
+WebSocket推送测试
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.websocket import ConnectionManager, diff_leaderboard
+from app.main import app
+from app.services.leaderboard_index import LeaderboardRow
+
+
+class FakeWebSocket:
+    """模拟WebSocket连接，blocked=True 时发送永远不会完成"""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.blocked = blocked
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        if self.blocked:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_delay_others():
+    """测试慢客户端不影响其他客户端，且发送超时后被断开"""
+    manager = ConnectionManager(max_queue=8, send_timeout=0.05, max_dropped=100)
+    fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(3):
+        await manager.broadcast({"type": "leaderboard_update", "data": i})
+    assert loop.time() - start < 0.01
+
+    await asyncio.sleep(0.01)
+    assert [m["data"] for m in fast.sent] == [0, 1, 2]
+
+    await asyncio.sleep(0.1)
+    assert slow not in manager.active_connections
+    assert fast in manager.active_connections
+    assert slow.close_code == 1013
+    assert manager.evicted_connections == 1
+
+    manager.disconnect(fast)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_backlog_drops_oldest_then_evicts():
+    """测试积压超出队列上限时丢弃最旧消息，连续丢弃过多时断开"""
+    manager = ConnectionManager(max_queue=2, send_timeout=10, max_dropped=3)
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow)
+    client = manager.active_connections[slow]
+
+    # 第一条消息被写协程取出并阻塞在发送中
+    await manager.broadcast({"seq": 0})
+    await asyncio.sleep(0)
+
+    for seq in range(1, 5):
+        await manager.broadcast({"seq": seq})
+    assert [json.loads(frame)["seq"] for _, frame in client.queue] == [3, 4]
+    assert client.dropped == 2
+
+    await manager.broadcast({"seq": 5})
+    await manager.broadcast({"seq": 6})
+    assert slow not in manager.active_connections
+    assert manager.dropped_messages == 4
+    await asyncio.sleep(0)
+
+
+def test_leaderboard_websocket_ping():
+    """测试WebSocket握手与心跳"""
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/leaderboard") as ws:
+            assert ws.receive_json()["type"] == "connected"
+            assert ws.receive_json()["type"] == "leaderboard_snapshot"
+            ws.send_json({"type": "ping", "timestamp": 123})
+            assert ws.receive_json() == {"type": "pong", "timestamp": 123}
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once(monkeypatch):
+    """测试广播消息只编码一次，所有连接共享同一帧"""
+    from app.utils import json_codec
+
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(5)]
+    for ws in sockets:
+        await manager.connect(ws)
+
+    calls = []
+    original = json_codec.dumps
+
+    def counting_dumps(obj):
+        calls.append(obj)
+        return original(obj)
+
+    monkeypatch.setattr(json_codec, "dumps", counting_dumps)
+    await manager.broadcast({"type": "leaderboard_update", "data": {"score": 100}})
+    await asyncio.sleep(0.01)
+
+    assert len(calls) == 1
+    assert all(ws.sent == [{"type": "leaderboard_update", "data": {"score": 100}}] for ws in sockets)
+
+    for ws in sockets:
+        manager.disconnect(ws)
+    await asyncio.sleep(0)
+
+
+def _row(game_id: int, score: int) -> LeaderboardRow:
+    from datetime import datetime
+    return LeaderboardRow(game_id, f"玩家{game_id}", score, 1, 0, 60, datetime(2026, 1, 1))
+
+
+def _apply(entries: list, ops: list) -> list:
+    """按客户端的方式执行增量操作"""
+    entries = list(entries)
+    for op in ops:
+        if op["op"] == "evict":
+            del entries[op["rank"] - 1]
+        else:
+            entries.insert(op["rank"] - 1, op["entry"]["id"])
+    return entries
+
+
+class TestDiffLeaderboard:
+    """排行榜增量计算测试类"""
+
+    def test_no_change(self):
+        top = [_row(1, 300), _row(2, 200)]
+        assert diff_leaderboard(top, list(top)) == []
+
+    def test_insert_into_full_list(self):
+        old = [_row(1, 300), _row(2, 200), _row(3, 100)]
+        new = [_row(1, 300), _row(4, 250), _row(2, 200)]
+        ops = diff_leaderboard(old, new)
+        assert ops[0] == {"op": "evict", "rank": 3}
+        assert ops[1]["op"] == "insert" and ops[1]["rank"] == 2
+        assert _apply([1, 2, 3], ops) == [1, 4, 2]
+
+    def test_removal_and_update(self):
+        old = [_row(1, 300), _row(2, 200), _row(3, 100)]
+        # 记录1被删除，记录3的分数被修改
+        new = [_row(3, 500), _row(2, 200), _row(5, 50)]
+        assert _apply([1, 2, 3], diff_leaderboard(old, new)) == [3, 2, 5]
+
+
+@pytest.mark.asyncio
+async def test_publish_only_to_changed_groups():
+    """测试只有可见 Top N 变化的订阅分组才会收到推送"""
+    manager = ConnectionManager()
+    top3, top1, legacy = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    for ws in (top3, top1, legacy):
+        await manager.connect(ws)
+    manager.subscribe(top3, 3)
+    manager.subscribe(top1, 1)
+
+    manager.published_top = [_row(1, 300), _row(2, 200), _row(3, 100)]
+    pushed = manager.publish_leaderboard(
+        [_row(1, 300), _row(2, 200), _row(4, 150)], {"type": "leaderboard_update", "data": {"id": 4}}
+    )
+    await asyncio.sleep(0.01)
+
+    assert pushed == 2
+    assert top1.sent == []
+    assert top3.sent == [{
+        "type": "leaderboard_delta", "limit": 3,
+        "ops": [
+            {"op": "evict", "rank": 3},
+            {"op": "insert", "rank": 3, "entry": {
+                "id": 4, "player_name": "玩家4", "score": 150, "level": 1,
+                "lines": 0, "play_time": 60, "created_at": "2026-01-01T00:00:00"
+            }},
+        ],
+    }]
+    assert legacy.sent == [{"type": "leaderboard_update", "data": {"id": 4}}]
+
+    # 排名之外的新记录不产生任何推送
+    assert manager.publish_leaderboard(list(manager.published_top), {"type": "leaderboard_update"}) == 0
+
+    for ws in (top3, top1, legacy):
+        manager.disconnect(ws)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_delta_backlog_replaced_by_snapshot():
+    """测试增量客户端积压溢出时改为推送快照，客户端最终的排行榜与服务端一致"""
+    manager = ConnectionManager(max_queue=3, send_timeout=10, max_dropped=100)
+    ws = FakeWebSocket()
+    await manager.connect(ws)
+    manager.subscribe(ws, 3)
+    client = manager.active_connections[ws]
+    client._writer.cancel()  # 模拟发送停滞，消息只积压在队列中
+
+    manager.published_top = [_row(1, 300), _row(2, 200), _row(3, 100)]
+    await manager.broadcast({"type": "notice"})
+    top = list(manager.published_top)
+    for game_id in range(4, 10):
+        top = sorted(top + [_row(game_id, 100 * game_id)], key=lambda r: -r.score)[:3]
+        manager.publish_leaderboard(top, {"type": "leaderboard_update"})
+
+    frames = [json.loads(frame) for _, frame in client.queue]
+    assert len(frames) <= 3
+    assert frames[0] == {"type": "notice"}
+    assert any(frame["type"] == "leaderboard_snapshot" for frame in frames)
+    board = []
+    for frame in frames:
+        if frame["type"] == "leaderboard_snapshot":
+            board = [entry["id"] for entry in frame["entries"]]
+        elif frame["type"] == "leaderboard_delta":
+            board = _apply(board, frame["ops"])
+    assert board == [9, 8, 7]
+    assert ws in manager.active_connections
+
+    manager.disconnect(ws)
+    await asyncio.sleep(0)
+
+
+def test_leaderboard_websocket_delta(client, multiple_game_records):
+    """测试订阅 Top N 后的快照与增量推送"""
+    for game_data in multiple_game_records:
+        client.post("/api/games", json=game_data)
+
+    with client.websocket_connect("/ws/leaderboard?limit=2") as ws:
+        assert ws.receive_json()["type"] == "connected"
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "leaderboard_snapshot"
+        assert [e["score"] for e in snapshot["entries"]] == [7000, 5000]
+
+        # 未进入 Top 2 的记录不推送，下一条消息即为高分记录的增量
+        client.post("/api/games", json={**multiple_game_records[0], "score": 100})
+        client.post("/api/games", json={**multiple_game_records[0], "score": 9000})
+        delta = ws.receive_json()
+        assert delta["type"] == "leaderboard_delta"
+        assert delta["ops"][0] == {"op": "evict", "rank": 2}
+        assert delta["ops"][1]["rank"] == 1
+        assert delta["ops"][1]["entry"]["score"] == 9000
+
+
+@pytest.mark.asyncio
+async def test_sqlite_event_bus_batches_across_processes(tmp_path):
+    """测试 SQLite 事件总线：本地立即投递，其他进程按批收到事件"""
+    from app.services.event_bus import SQLiteEventBus, create_event_bus
+
+    path = str(tmp_path / "events.db")
+    worker_a, worker_b = [], []
+    bus_a = SQLiteEventBus(path, lambda events, remote: worker_a.append((events, remote)),
+                           flush_interval_ms=20, poll_interval_ms=5)
+    bus_b = create_event_bus(f"sqlite:///{path}", poll_interval_ms=5)
+    await bus_a.start()
+    await bus_b.start(lambda events, remote: worker_b.append((events, remote)))
+    try:
+        for i in range(5):
+            bus_a.publish({"type": "test", "seq": i})
+        assert len(worker_a) == 5
+        assert all(remote is False for _, remote in worker_a)
+
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if worker_b:
+                break
+    finally:
+        await bus_a.stop()
+        await bus_b.stop()
+
+    # 5 条事件合并为一个批次发送，其他进程一次收到全部事件
+    assert bus_a.batches_sent == 1
+    assert worker_b == [([{"type": "test", "seq": i} for i in range(5)], True)]
+    assert bus_a.received == 0
+
+    with pytest.raises(ValueError):
+        create_event_bus("redis://localhost:6379")
+
+
+@pytest.mark.asyncio
+async def test_event_bus_retries_failed_batches():
+    """测试发送失败的批次放回队首重试，超过上限时丢弃最旧的事件并插入 resync"""
+    from app.services.event_bus import RESYNC_EVENT, EventBus
+
+    sent, failures = [], [2]
+
+    class FlakyBus(EventBus):
+        async def _send_batch(self, batch):
+            if failures[0]:
+                failures[0] -= 1
+                raise OSError("disk full")
+            sent.extend(batch)
+
+    bus = FlakyBus(flush_interval_ms=1, retry_interval_ms=1)
+    await bus.start()
+    try:
+        for i in range(3):
+            bus.publish({"seq": i})
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if sent:
+                break
+    finally:
+        await bus.stop()
+    assert sent == [{"seq": i} for i in range(3)]
+    assert bus.send_failures == 2
+
+    bus = FlakyBus(max_pending=3)
+    bus._has_pending, bus._full = asyncio.Event(), asyncio.Event()
+    bus._pending = [{"seq": 3}, {"seq": 4}]
+    bus._requeue([{"seq": 0}, {"seq": 1}, {"seq": 2}])
+    assert bus._pending == [RESYNC_EVENT, {"seq": 3}, {"seq": 4}]
+    assert bus.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_sqlite_event_bus_detects_gap(tmp_path):
+    """测试事件日志中的行在读取前被清理时投递 resync 事件"""
+    from app.services.event_bus import RESYNC_EVENT, SQLiteEventBus
+
+    path = str(tmp_path / "events.db")
+    received = []
+    writer = SQLiteEventBus(path, flush_interval_ms=1)
+    # 轮询间隔足够长，由测试手动读取
+    reader = SQLiteEventBus(path, lambda events, remote: received.extend(events), poll_interval_ms=60000)
+    await writer.start()
+    await reader.start()
+    try:
+        # 读取前第一行已被清理
+        for i in range(3):
+            await writer._send_batch([{"seq": i}])
+        writer._writer.execute("DELETE FROM events WHERE id = (SELECT MIN(id) FROM events)")
+        await reader._poll_once()
+    finally:
+        await writer.stop()
+        await reader.stop()
+    assert received == [RESYNC_EVENT, {"seq": 1}, {"seq": 2}]
+
+
+def test_remote_resync_reloads_index(db_session, monkeypatch):
+    """测试收到 resync 事件时丢弃本进程的排行榜索引"""
+    from app.api import websocket
+    from app.services.event_bus import RESYNC_EVENT
+    from app.services.leaderboard_index import leaderboard_indexes
+
+    bind = db_session.get_bind()
+    index = leaderboard_indexes.get(db_session)
+    monkeypatch.setattr(websocket, "_index_bind", bind)
+    websocket.handle_events([RESYNC_EVENT], True)
+    assert leaderboard_indexes.peek(bind) is None
+    assert leaderboard_indexes.get(db_session) is not index
+
+
+def test_remote_event_updates_index(db_session, monkeypatch):
+    """测试其他 worker 的写入事件同步到本进程的排行榜索引"""
+    from app.api import websocket
+    from app.services.leaderboard_index import leaderboard_indexes
+
+    index = leaderboard_indexes.get(db_session)
+    monkeypatch.setattr(websocket, "_index_bind", db_session.get_bind())
+
+    row = _row(42, 900)
+    event = websocket._leaderboard_event({"type": "leaderboard_update"}, [row], changed=[row])
+    websocket.handle_events([json.loads(json.dumps(event))], True)
+    assert index.get(42) == row
+    assert index.top(1) == [row]
+
+    event = websocket._leaderboard_event({"type": "leaderboard_update"}, [], removed=[42])
+    websocket.handle_events([event], True)
+    assert index.get(42) is None
+
+
+def test_remote_event_publishes_local_top(db_session, monkeypatch):
+    """测试其他 worker 的事件按同步后的本地索引推送 Top N（包含本进程较新的写入）"""
+    from app.api import websocket
+    from app.services.leaderboard_index import leaderboard_indexes
+
+    index = leaderboard_indexes.get(db_session)
+    monkeypatch.setattr(websocket, "_index_bind", db_session.get_bind())
+    published = []
+    monkeypatch.setattr(websocket.manager, "publish_leaderboard", lambda top, message: published.append(top) or 0)
+
+    local = _row(7, 1000)
+    index.add(local)
+    remote = _row(42, 900)
+    # 写入方的索引里还没有本进程的记录 7
+    event = websocket._leaderboard_event({"type": "leaderboard_update"}, [remote], changed=[remote])
+    websocket.handle_events([json.loads(json.dumps(event))], True)
+    assert published == [[local, remote]]